@@ -0,0 +1,297 @@
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Any, Optional, Tuple, AsyncIterator, Callable
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from metrics import REGISTRY
+
+# Priority lanes, highest first: live UI requests are admitted before bulk re-scoring
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES: Tuple[str, ...] = (INTERACTIVE, BULK)
+
+# Upper bounds (seconds) for queue wait histograms: 100 µs .. 10 s
+WAIT_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+class Overloaded(Exception):
+    """A request was shed instead of admitted; retry_after is a hint in whole seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server overloaded ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+def parse_admission(priority: Optional[str], deadline_ms: Optional[str], default_lane: str = INTERACTIVE,
+                    default_timeout: Optional[float] = None) -> Tuple[str, Optional[float]]:
+    """
+    The (lane, timeout in seconds) asked for by X-PAD-Priority / X-PAD-Deadline-Ms header values
+
+    Without a deadline, interactive requests get default_timeout and bulk ones none.
+
+    Raises:
+        ValueError: For an unknown lane or a deadline that is not a number
+    """
+    lane = priority or default_lane
+    if lane not in LANES:
+        raise ValueError(f"X-PAD-Priority must be one of {', '.join(LANES)}")
+    if deadline_ms is None:
+        return lane, default_timeout if lane == INTERACTIVE else None
+    try:
+        return lane, max(0.0, float(deadline_ms)) / 1000
+    except ValueError:
+        raise ValueError("X-PAD-Deadline-Ms must be a number")
+
+class AdmissionController:
+    """
+    Bounded concurrency for scoring, with priority lanes and deadline-aware shedding
+
+    At most max_in_flight requests run at once; the rest wait in a FIFO queue
+    per lane, and a freed slot goes to the oldest waiter of the highest lane.
+    A request is shed (Overloaded) rather than queued when:
+
+    - the queue is full and holds no lower-lane waiter to evict in its place,
+    - its deadline is earlier than the estimated queue wait plus service time,
+      estimated from the requests ahead of it and a moving average of the
+      service time, or
+    - its deadline passes while it is still waiting.
+
+    Queueing is thus bounded by what can still be served in time, so latency
+    stays flat past saturation and the excess is rejected early and cheaply.
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, service_time: float = 0.005, smoothing: float = 0.1):
+        """
+        Args:
+            max_in_flight: Requests running at once
+            max_queue: Requests waiting at once, over all lanes
+            service_time: Initial estimate (seconds) of one request's run time
+            smoothing: Weight of each completed request in the service time average
+        """
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be at least 1, got {max_in_flight}")
+        if max_queue < 0:
+            raise ValueError(f"max_queue must be non-negative, got {max_queue}")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.service_time = service_time
+        self.smoothing = smoothing
+
+        self.in_flight = 0
+        # Waiters per lane; futures that are already done (shed or cancelled) are skipped
+        self._queues: Dict[str, Deque["asyncio.Future[float]"]] = {lane: deque() for lane in LANES}
+        self._queued = {lane: 0 for lane in LANES}
+
+        self._wait_seconds = {
+            lane: REGISTRY.histogram("pad_admission_wait_seconds", "Time requests waited for a scoring slot",
+                                     WAIT_BUCKETS, lane=lane)
+            for lane in LANES
+        }
+        self._admitted = {lane: REGISTRY.counter("pad_admission_admitted_total", "Requests admitted", lane=lane)
+                          for lane in LANES}
+        self._shed = {
+            (lane, reason): REGISTRY.counter("pad_admission_shed_total", "Requests rejected with 503",
+                                             lane=lane, reason=reason)
+            for lane in LANES for reason in ("queue_full", "deadline", "evicted")
+        }
+
+    @property
+    def queued(self) -> int:
+        return sum(self._queued.values())
+
+    def estimated_wait(self, lane: str) -> float:
+        """Seconds a request arriving now in this lane would wait for a slot"""
+        if self.in_flight < self.max_in_flight and not self.queued:
+            return 0.0
+        ahead = sum(self._queued[other] for other in LANES[:LANES.index(lane) + 1])
+        return (ahead + 1) * self.service_time / self.max_in_flight
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil((self.queued + self.in_flight) * self.service_time / self.max_in_flight))
+
+    def _reject(self, lane: str, reason: str) -> Overloaded:
+        self._shed[lane, reason].inc()
+        return Overloaded(reason, self._retry_after())
+
+    async def acquire(self, lane: str = INTERACTIVE, timeout: Optional[float] = None) -> float:
+        """
+        Wait for a scoring slot; release() must follow once the request is done
+
+        Args:
+            lane: One of LANES
+            timeout: Seconds the request may take in total (waiting and running); None waits indefinitely
+
+        Returns:
+            time.perf_counter() when the slot was granted, for release()
+
+        Raises:
+            Overloaded: If the request is shed
+        """
+        if lane not in self._queues:
+            raise ValueError(f"lane must be one of {', '.join(LANES)}, got {lane}")
+        start = time.perf_counter()
+        if self.in_flight < self.max_in_flight and not self.queued:
+            self.in_flight += 1
+            return self._admit(lane, start, start)
+
+        if timeout is not None and self.estimated_wait(lane) + self.service_time > timeout:
+            raise self._reject(lane, "deadline")
+        if self.queued >= self.max_queue and not self._evict_below(lane):
+            raise self._reject(lane, "queue_full")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queues[lane].append(future)
+        self._queued[lane] += 1
+        timer = None
+        if timeout is not None:
+            # Leave room to run: a request granted after this point would miss its deadline anyway
+            timer = loop.call_later(max(0.0, timeout - self.service_time), self._expire, lane, future)
+        try:
+            granted = await future
+        except asyncio.CancelledError:
+            if not future.done() or future.cancelled():
+                self._dequeued(lane, future)
+            elif future.exception() is None:
+                # Granted a slot in the same tick the caller was cancelled
+                self.in_flight -= 1
+                self._grant_next()
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+        return self._admit(lane, start, granted)
+
+    def release(self, granted: float) -> None:
+        """Free a slot taken by acquire(), granting it to the next waiter"""
+        self.service_time += self.smoothing * (time.perf_counter() - granted - self.service_time)
+        self.in_flight -= 1
+        self._grant_next()
+
+    def _grant_next(self) -> None:
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue:
+                future = queue.popleft()
+                if future.done():
+                    continue
+                self._queued[lane] -= 1
+                self.in_flight += 1
+                # The grant time, not when the waiter resumes: on a busy event loop the
+                # slot is already taken in between, which the service time must include
+                future.set_result(time.perf_counter())
+                return
+
+    @asynccontextmanager
+    async def slot(self, lane: str = INTERACTIVE, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """acquire() / release() around a block"""
+        granted = await self.acquire(lane, timeout)
+        try:
+            yield
+        finally:
+            self.release(granted)
+
+    def _admit(self, lane: str, start: float, granted: float) -> float:
+        self._wait_seconds[lane].observe(time.perf_counter() - start)
+        self._admitted[lane].inc()
+        return granted
+
+    def _dequeued(self, lane: str, future: "asyncio.Future[float]") -> None:
+        """Account for a waiter leaving the queue without a slot; its entry is skipped later"""
+        if not future.done():
+            future.cancel()
+        self._queued[lane] -= 1
+
+    def _expire(self, lane: str, future: "asyncio.Future[float]") -> None:
+        if not future.done():
+            self._queued[lane] -= 1
+            future.set_exception(self._reject(lane, "deadline"))
+
+    def _evict_below(self, lane: str) -> bool:
+        """Shed the newest waiter of the lowest lane below this one, if any"""
+        for lower in reversed(LANES[LANES.index(lane) + 1:]):
+            queue = self._queues[lower]
+            while queue:
+                future = queue.pop()
+                if future.done():
+                    continue
+                self._queued[lower] -= 1
+                future.set_exception(self._reject(lower, "evicted"))
+                return True
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": dict(self._queued),
+            "service_time_ms": self.service_time * 1e3,
+            "admitted": {lane: counter.value for lane, counter in self._admitted.items()},
+            "shed": {f"{lane}/{reason}": counter.value for (lane, reason), counter in self._shed.items()},
+        }
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that admits selected requests before their body is read
+
+    Under overload the event loop itself is the bottleneck, so a shed request
+    should cost as little of it as possible: it is answered with 503 +
+    Retry-After from its headers alone, and an admitted one holds its slot
+    until the response is sent, covering body parsing and encoding as well as scoring.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController, admits: Callable[[Scope], bool],
+                 default_timeout: Optional[float] = None):
+        """
+        Args:
+            app: Wrapped application
+            controller: Slots to admit requests into
+            admits: Whether an HTTP request scope goes through admission control
+            default_timeout: Timeout (seconds) of interactive requests without X-PAD-Deadline-Ms
+        """
+        self.app = app
+        self.controller = controller
+        self.admits = admits
+        self.default_timeout = default_timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.admits(scope):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        priority, deadline = headers.get(b"x-pad-priority"), headers.get(b"x-pad-deadline-ms")
+        try:
+            lane, timeout = parse_admission(priority.decode("latin-1") if priority else None,
+                                            deadline.decode("latin-1") if deadline else None,
+                                            default_timeout=self.default_timeout)
+            granted = await self.controller.acquire(lane, timeout)
+        except ValueError as e:
+            await _respond(send, 400, {"detail": str(e)})
+            return
+        except Overloaded as e:
+            await _respond(send, 503, {"detail": str(e)}, [(b"retry-after", str(e.retry_after).encode())])
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(granted)
+
+async def _respond(send: Send, status: int, body: Dict[str, Any], headers: Optional[list] = None) -> None:
+    """Send a JSON response straight through ASGI; shedding should cost the event loop as little as possible"""
+    content = json.dumps(body).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(content)).encode()),
+                    *(headers or [])],
+    })
+    await send({"type": "http.response.body", "body": content})
@@ -1,82 +1,259 @@
 # backend/app.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from pathlib import Path
-import random, json, logging
-from typing import List, Any, Dict, Optional
+import random, json, logging, codecs, os, asyncio
+from collections import deque
+from typing import List, Any, Dict, Optional, AsyncIterator
 
 # import your core implementation
-from core import PADCoreEngine, PADDelta
+from core import PADCoreEngine, PADDelta, PADAnalysisResult, RawPADScore, ValidationError, NormalizationMethod
+from questionnaire_store import QuestionnaireStore, QuestionnaireSnapshot
+from result_cache import ResultCache
+from metrics import REGISTRY
+from sessions import SessionStore, ScoringSession
+from coalescing import RequestCoalescer
+from matching import ProfileIndex, INDEX_METRICS
+from question_selection import QuestionChoice, selector_for
+from result_store import ResultStore
+from outcome_distribution import outcome_distribution
+from tenants import EngineRegistry, Tenant, DEFAULT_TENANT
+from admission import AdmissionController, AdmissionMiddleware, Overloaded, parse_admission, BULK
+import serialization
 
+logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("core")
 app = FastAPI()
-engine = PADCoreEngine()
-
 BASE_DIR = Path(__file__).resolve().parent
+COMPILED_DIR = Path(os.environ.get("PAD_COMPILED_DIR", BASE_DIR / "compiled"))
 
+# Emotions returned in "top_emotions"; only these are ranked per request
+TOP_EMOTIONS = 6
 
-def load_json_file(fname: str) -> dict:
-    p = BASE_DIR / fname
-    try:
-        with open(p, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.exception(f"Failed to load {p}: {e}")
-        return {}
+# Repeated profiles are served from an in-memory result cache;
+# PAD_RESULT_CACHE_SIZE=0 disables it, PAD_RESULT_CACHE_TTL_SECONDS bounds entry age
+RESULT_CACHE_SIZE = int(os.environ.get("PAD_RESULT_CACHE_SIZE", "4096"))
+RESULT_CACHE_TTL = float(os.environ.get("PAD_RESULT_CACHE_TTL_SECONDS", "0")) or None
+ENGINE_OPTIONS: Dict[str, Any] = {
+    # Answers are resolved through the pre-validated answer index, so the engine can
+    # skip per-delta validation and build emotion scores lazily
+    "trusted": True,
+    "result_cache": ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL) if RESULT_CACHE_SIZE > 0 else None,
+    # Per-step timings for /metrics
+    "instrumented": True,
+    # PAD_NORMALIZATION=percentile ranks scores against the population seen so far,
+    # starting from (and saved on shutdown to) PAD_POPULATION_SNAPSHOT
+    "normalization_method": NormalizationMethod(os.environ.get("PAD_NORMALIZATION", "question_based")),
+    "population_snapshot": os.environ.get("PAD_POPULATION_SNAPSHOT", str(COMPILED_DIR / "population.json")),
+}
+# PAD_PROXIMITY_BACKEND=lattice answers the top emotions from a table precomputed
+# per emotion catalog (PAD_LATTICE_RESOLUTION cells per axis, cached in the compiled dir)
+PROXIMITY_BACKEND = os.environ.get("PAD_PROXIMITY_BACKEND", "auto")
+ENGINE_OPTIONS["proximity_backend"] = PROXIMITY_BACKEND
+if PROXIMITY_BACKEND == "lattice":
+    ENGINE_OPTIONS["proximity_options"] = {
+        "resolution": int(os.environ.get("PAD_LATTICE_RESOLUTION", "101")),
+        "depth": TOP_EMOTIONS,
+        "cache_dir": str(COMPILED_DIR),
+    }
+engine = PADCoreEngine(**ENGINE_OPTIONS)
+
+# Every /analyze result is appended to a columnar store for the /results aggregate
+# queries; PAD_RESULT_STORE_DIR="" turns this off. Appends only touch memory: a
+# background thread writes rows out every PAD_RESULT_FLUSH_ROWS rows, and at least
+# every PAD_RESULT_FLUSH_SECONDS.
+RESULT_STORE_DIR = os.environ.get("PAD_RESULT_STORE_DIR", str(COMPILED_DIR / "results"))
+result_store = ResultStore(
+    RESULT_STORE_DIR, engine.emotion_names,
+    flush_rows=int(os.environ.get("PAD_RESULT_FLUSH_ROWS", "4096")),
+    flush_seconds=float(os.environ.get("PAD_RESULT_FLUSH_SECONDS", "60")),
+) if RESULT_STORE_DIR else None
+
+# Questionnaire files are compiled, memory-mapped and hot-reloaded by the store.
+# Set PAD_QUESTIONNAIRE_RELOAD_SECONDS to change how often they are checked.
+# PAD_QUESTIONNAIRE_SNAPSHOT serves a prebuilt compiled file instead (from
+# `python questionnaire_store.py`), without reading or watching the sources.
+questionnaires = QuestionnaireStore(
+    BASE_DIR / "question_likert.json",
+    BASE_DIR / "question_scene.json",
+    COMPILED_DIR,
+    check_interval=float(os.environ.get("PAD_QUESTIONNAIRE_RELOAD_SECONDS", "2")),
+    snapshot_path=os.environ.get("PAD_QUESTIONNAIRE_SNAPSHOT") or None,
+)
+QUESTION_SAMPLE_SIZE = 10
+# Most bootstrap resamples one /analyze?confidence=... request may ask for
+MAX_CONFIDENCE_SAMPLES = int(os.environ.get("PAD_MAX_CONFIDENCE_SAMPLES", "10000"))
+
+# Tenants (brands, locales) from PAD_TENANTS_FILE, picked per request by the
+# X-PAD-Tenant header; requests without it use the engine and questionnaire above.
+# Tenants share compiled emotion catalogs and questionnaires by content, so each
+# one only adds its own settings (see EngineRegistry.load for the file format).
+TENANT_HEADER = "x-pad-tenant"
+tenants = EngineRegistry(
+    Tenant(DEFAULT_TENANT, engine, questionnaires),
+    engine_options={key: ENGINE_OPTIONS[key] for key in ("trusted", "result_cache", "instrumented")},
+    compiled_dir=COMPILED_DIR,
+    proximity_backend=PROXIMITY_BACKEND,
+    proximity_options=ENGINE_OPTIONS.get("proximity_options"),
+    check_interval=questionnaires.check_interval,
+)
+if os.environ.get("PAD_TENANTS_FILE"):
+    tenants.load(os.environ["PAD_TENANTS_FILE"])
 
+# Adaptive questioning (POST /sessions?adaptive=true, POST /questions/next) stops
+# once the primary emotion is stable, but never before PAD_ADAPTIVE_MIN_QUESTIONS
+# answers or after PAD_ADAPTIVE_MAX_QUESTIONS; PAD_ADAPTIVE_STABILITY is the share
+# of remaining answer options still allowed to change the primary when stopping
+ADAPTIVE_OPTIONS = {
+    "min_questions": int(os.environ.get("PAD_ADAPTIVE_MIN_QUESTIONS", "3")),
+    "max_questions": int(os.environ.get("PAD_ADAPTIVE_MAX_QUESTIONS", str(QUESTION_SAMPLE_SIZE))),
+    "stability": float(os.environ.get("PAD_ADAPTIVE_STABILITY", "0.03")),
+}
 
-# Load questionnaires (on startup)
-LIKERT = load_json_file("question_likert.json").get("questionnaire", [])
-SCENE = load_json_file("question_scene.json").get("questionnaire", [])
+# Concurrent requests share one questionnaire source check, and concurrent
+# /questions calls with the same seed share one response body
+questionnaire_checks = RequestCoalescer("questionnaire_check")
+question_samples = RequestCoalescer("questions")
 
 
-def standardize_questions() -> List[Dict[str, Any]]:
+def tenant_for(request: Request) -> Tenant:
+    """The tenant named by the request's X-PAD-Tenant header, or the default one"""
+    name = request.headers.get(TENANT_HEADER)
+    try:
+        return tenants.get(name or None)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant: {name}")
+
+
+async def current_questionnaire(tenant: Optional[Tenant] = None) -> QuestionnaireSnapshot:
     """
-    Returns a combined, standardized question list where each question is:
-    {
-      "id": <int>,
-      "type": "likert" | "scene",
-      "text": "...",
-      "options": [{ "id": <string|number>, "text": "..." }]
-    }
+    store.current() for async handlers: the periodic source check (and a
+    recompile after a change) runs on the threadpool, once for all waiting requests.
     """
-    qlist = []
-    for q in LIKERT:
-        qid = q.get("id")
-        mapping = q.get("mapping", [])
-        # options from mapping: use score + emotion as label
-        options = [
-            {
-                "id": item.get("score"),
-                "text": f"{item.get('score')} — {item.get('emotion', '')}",
-            }
-            for item in mapping
-        ]
-        qlist.append(
-            {"id": qid, "type": "likert", "text": q.get("text"), "options": options}
+    store = tenant.questionnaires if tenant is not None else questionnaires
+    if store.check_due():
+        await questionnaire_checks.run(store, lambda: run_in_threadpool(store.check_for_update))
+    return store.snapshot
+
+# Set PAD_SCORING_WORKERS > 0 to score in that many worker processes instead of
+# inline; PAD_SCORING_BATCH_SIZE / PAD_SCORING_BATCH_WAIT_MS tune micro-batching.
+# Workers cannot share a percentile population, so PAD_NORMALIZATION=percentile
+# with workers fails at startup.
+SCORING_WORKERS = int(os.environ.get("PAD_SCORING_WORKERS", "0"))
+scoring_pool = None  # ScoringPool, once started
+
+
+@app.on_event("startup")
+def start_scoring_pool():
+    global scoring_pool
+    if SCORING_WORKERS > 0:
+        # Imported here so inline scoring never loads multiprocessing
+        from scoring_pool import ScoringPool
+        scoring_pool = ScoringPool(
+            SCORING_WORKERS,
+            questionnaires.current().path,
+            engine_kwargs=ENGINE_OPTIONS,
+            top_k=TOP_EMOTIONS,
+            max_batch=int(os.environ.get("PAD_SCORING_BATCH_SIZE", "32")),
+            max_wait=float(os.environ.get("PAD_SCORING_BATCH_WAIT_MS", "2")) / 1000,
         )
 
-    for q in SCENE:
-        qid = q.get("id")
-        opts = []
-        for opt in q.get("options", []):
-            # scene options have id and text
-            opts.append({"id": opt.get("id"), "text": opt.get("text")})
-        qlist.append({"id": qid, "type": "scene", "text": q.get("text"), "options": opts})
-    return qlist
+
+# Admission control for scoring requests (/analyze, PUT /profiles/..., and each
+# /analyze/batch submission): at most PAD_ADMISSION_MAX_IN_FLIGHT run at once and up
+# to PAD_ADMISSION_MAX_QUEUE wait, so a spike is answered with fast 503s +
+# Retry-After instead of slowing every request down. X-PAD-Priority: bulk queues
+# behind interactive traffic (the default, except for /analyze/batch), and
+# X-PAD-Deadline-Ms sets how long a request may take, PAD_ADMISSION_DEADLINE_MS for
+# interactive requests without it; requests that cannot finish in time are shed.
+# With the scoring pool, keep the in-flight limit at least workers x batch size.
+# PAD_ADMISSION_MAX_IN_FLIGHT=0 turns admission control off.
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("PAD_ADMISSION_MAX_IN_FLIGHT", "16"))
+ADMISSION_DEADLINE = float(os.environ.get("PAD_ADMISSION_DEADLINE_MS", "1000")) / 1000
+admission = AdmissionController(
+    ADMISSION_MAX_IN_FLIGHT, int(os.environ.get("PAD_ADMISSION_MAX_QUEUE", "64"))
+) if ADMISSION_MAX_IN_FLIGHT > 0 else None
+
+
+def admitted_route(scope) -> bool:
+    """Single-submission scoring routes, admitted by AdmissionMiddleware before their body is read"""
+    return (scope["method"] == "POST" and scope["path"] == "/analyze") or (
+        scope["method"] == "PUT" and scope["path"].startswith("/profiles/"))
+
+
+if admission is not None:
+    app.add_middleware(AdmissionMiddleware, controller=admission, admits=admitted_route,
+                       default_timeout=ADMISSION_DEADLINE)
+
+
+# The first threadpool call imports anyio's worker thread support and the first
+# analysis touches cold numpy paths; PAD_WARMUP=0 leaves both to the first request
+WARMUP = os.environ.get("PAD_WARMUP", "1") != "0"
+
+
+def warm_up() -> None:
+    """Score and encode one neutral profile; nothing is recorded in the population or result store"""
+    result = engine.analyze_raw_pad_scores(RawPADScore(0.0, 0.0, 0.0, 1), top_k=TOP_EMOTIONS, observe=False)
+    serialization.encode(format_result(result), "application/json")
+
+
+@app.on_event("startup")
+async def warm_up_scoring():
+    if WARMUP:
+        await run_in_threadpool(warm_up)
+
+
+@app.on_event("shutdown")
+async def stop_scoring_pool():
+    if scoring_pool is not None:
+        await scoring_pool.close()
+
+
+@app.on_event("shutdown")
+def flush_results():
+    if result_store is not None:
+        result_store.close()
+
+
+@app.on_event("shutdown")
+def save_population():
+    if engine.population is not None:
+        engine.population.save(Path(ENGINE_OPTIONS["population_snapshot"]))
+    tenants.save_populations()
+
+
+def sample_indices(questionnaire: QuestionnaireSnapshot, seed: Optional[str]) -> List[int]:
+    """Positions of up to QUESTION_SAMPLE_SIZE questions in questionnaire.encoded_questions"""
+    count = min(QUESTION_SAMPLE_SIZE, len(questionnaire.encoded_questions))
+    rng = random if seed is None else random.Random(seed)
+    return rng.sample(range(len(questionnaire.encoded_questions)), count)
+
+
+def sample_questions(questionnaire: QuestionnaireSnapshot, seed: Optional[str]) -> bytes:
+    """JSON array of up to QUESTION_SAMPLE_SIZE pre-encoded questions"""
+    encoded = questionnaire.encoded_questions
+    return b"[" + b",".join([encoded[i] for i in sample_indices(questionnaire, seed)]) + b"]"
 
 
 @app.get("/questions")
-def get_questions():
+async def get_questions(request: Request, seed: Optional[str] = None):
     """
     Return a random sample of up to 10 questions from both files (standardized).
+    Pass ?seed=<value> to get the same sample for the same seed (e.g. per client, for debugging).
+    Questions are served as the pre-encoded JSON of the current questionnaire version.
     """
-    all_q = standardize_questions()
-    if not all_q:
+    questionnaire = await current_questionnaire(tenant_for(request))
+    if not questionnaire.encoded_questions:
         raise HTTPException(status_code=500, detail="No questions available")
-    count = min(10, len(all_q))
-    sampled = random.sample(all_q, count)
-    return sampled
+    if seed is None:
+        body = sample_questions(questionnaire, None)
+    else:
+        async def build() -> bytes:
+            return sample_questions(questionnaire, seed)
+        body = await question_samples.run((questionnaire.version, seed), build)
+    return Response(content=body, media_type="application/json")
 
 
 # Request body models
@@ -91,95 +268,530 @@ class AnalyzeRequest(BaseModel):
     answers: List[AnswerItem]
 
 
+def format_choice(choice: QuestionChoice) -> Dict[str, Any]:
+    """
+    Shape a QuestionChoice into the "next_question" / "done" response fields.
+    """
+    return {
+        "next_question": choice.question,
+        "done": choice.done,
+        "stop_reason": choice.reason if choice.done else None,
+        "primary_emotion": choice.primary_emotion,
+    }
+
+
+def map_answers(answers: List[AnswerItem], questionnaire: QuestionnaireSnapshot) -> List[PADDelta]:
+    """
+    Map answer items -> PAD deltas, using a zero delta for unanswered or unknown answers.
+    """
+    return questionnaire.map_answers((ans.question_id, ans.answer) for ans in answers)
+
+
+def score_answers(answers: List[AnswerItem], tenant: Optional[Tenant] = None,
+                  confidence_samples: int = 0) -> PADAnalysisResult:
+    """
+    Map and score one submission against a single questionnaire version,
+    recording that version in the result metadata.
+    """
+    tenant = tenant or tenants.default
+    questionnaire = tenant.questionnaires.current()
+    result = tenant.engine.analyze_pad_profile(map_answers(answers, questionnaire), top_k=TOP_EMOTIONS,
+                                               confidence_samples=confidence_samples)
+    result.metadata["questionnaire_version"] = questionnaire.version
+    return result
+
+
+async def score_answers_async(answers: List[AnswerItem], tenant: Optional[Tenant] = None,
+                              confidence_samples: int = 0) -> PADAnalysisResult:
+    """
+    score_answers without blocking the event loop: in the scoring pool when it
+    is enabled, otherwise on the threadpool. The result is added to the result store.
+    Other tenants than the default one are always scored on the threadpool and
+    not stored, since the pool workers and the result store use the default catalog.
+    Confidence estimates are likewise always computed on the threadpool.
+    """
+    if tenant is not None and tenant is not tenants.default:
+        result = await run_in_threadpool(score_answers, answers, tenant, confidence_samples)
+        result.metadata["tenant"] = tenant.name
+        return result
+    if scoring_pool is None or confidence_samples > 0:
+        result = await run_in_threadpool(score_answers, answers, None, confidence_samples)
+    else:
+        result = await scoring_pool.score(
+            await current_questionnaire(), [(ans.question_id, ans.answer) for ans in answers]
+        )
+    if result_store is not None:
+        result_store.append(result, engine.prevalence_vector(result.core_triad))
+    return result
+
+
+def format_result(result: PADAnalysisResult) -> Dict[str, Any]:
+    """
+    Shape a PADAnalysisResult into the /analyze response body.
+    """
+    return serialization.result_payload(result, TOP_EMOTIONS)
+
+
 @app.post("/analyze")
-def analyze(req: AnalyzeRequest):
+async def analyze(req: AnalyzeRequest, request: Request, confidence: int = 0):
     """
     Map answers -> PAD deltas using your JSON files, then run PADCoreEngine.
     Expected body:
     { "answers": [ { "question_id": 21, "answer": 4 }, { "question_id": 3, "answer": "3b" } ] }
+    With ?confidence=<samples> (e.g. 2000, at most MAX_CONFIDENCE_SAMPLES) the
+    response also has a "confidence" object: how often each emotion ranks first
+    over that many bootstrap resamples of the answers, intervals on the core
+    triad, and which single answers would change the primary emotion.
+    The response is JSON, or MessagePack when the Accept header prefers
+    application/msgpack (and msgpack is installed). Under overload the request
+    may be shed with a 503 and a Retry-After header.
+    """
+    logger.debug("📥 Received %d answers", len(req.answers))
+
+    # Map answers and run analysis
+    result = await score_answers_async(req.answers, tenant_for(request),
+                                       max(0, min(confidence, MAX_CONFIDENCE_SAMPLES)))
+
+    # Encode the response body directly; FastAPI would re-encode a returned dict
+    media_type = serialization.negotiate(request.headers.get("accept"))
+    return Response(content=serialization.encode(format_result(result), media_type), media_type=media_type)
+
+
+def next_question(answers: List[AnswerItem], questionnaire: QuestionnaireSnapshot, tenant: Tenant) -> Dict[str, Any]:
+    deltas = map_answers(answers, questionnaire)
+    raw = (sum(d.pleasure for d in deltas), sum(d.arousal for d in deltas), sum(d.dominance for d in deltas))
+    choice = selector_for(questionnaire, **ADAPTIVE_OPTIONS).choose(
+        tenant.engine, raw, len(deltas), {ans.question_id for ans in answers}
+    )
+    return format_choice(choice)
+
+
+@app.post("/questions/next")
+async def choose_next_question(req: AnalyzeRequest, request: Request):
+    """
+    Adaptive questioning without a session: given the answers so far (same body
+    as /analyze), return the question that best separates the current primary
+    emotion from its rivals, or "done": true with a "stop_reason" of "stable",
+    "max_questions" or "exhausted".
+    """
+    tenant = tenant_for(request)
+    return await run_in_threadpool(next_question, req.answers, await current_questionnaire(tenant), tenant)
+
+
+class OutcomeRequest(BaseModel):
+    # The question set: explicit ids, or the set GET /questions?seed=... serves
+    question_ids: Optional[List[int]] = None
+    seed: Optional[str] = None
+    include_unanswered: bool = False
+
+
+def question_set_outcomes(req: OutcomeRequest, questionnaire: QuestionnaireSnapshot, tenant: Tenant) -> Dict[str, Any]:
+    question_ids = req.question_ids
+    if question_ids is None:
+        encoded = questionnaire.encoded_questions
+        question_ids = [json.loads(bytes(encoded[i]))["id"] for i in sample_indices(questionnaire, req.seed)]
+    summary = outcome_distribution(tenant.engine, questionnaire, question_ids, req.include_unanswered).summary()
+    summary["questionnaire_version"] = questionnaire.version
+    return summary
+
+
+@app.post("/questions/outcomes")
+async def questions_outcomes(req: OutcomeRequest, request: Request):
+    """
+    For calibration: over every combination of answers to a question set, which
+    primary emotions are reachable, how likely each is when every option is
+    equally likely, and the best prevalence each emotion can reach.
+    Body: { "question_ids": [21, 3, ...] } or { "seed": "abc" }, optionally
+    with "include_unanswered": true.
+    """
+    if req.question_ids is None and req.seed is None:
+        raise HTTPException(status_code=400, detail="Give question_ids or a seed")
+    tenant = tenant_for(request)
+    try:
+        return await run_in_threadpool(question_set_outcomes, req, await current_questionnaire(tenant), tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/scoring/stats")
+async def scoring_stats():
+    """
+    Scoring pool queue depth and worker utilization, for sizing PAD_SCORING_WORKERS,
+    plus result cache counters and admission control state. Reports "workers": 0
+    when scoring runs inline.
+    """
+    if scoring_pool is None:
+        cache = engine.result_cache
+        stats = {"workers": 0, "result_cache": cache.stats() if cache is not None else None}
+    else:
+        stats = scoring_pool.stats()
+    stats["admission"] = admission.stats() if admission is not None else None
+    return stats
+
+
+@app.get("/tenants")
+async def tenant_stats():
+    """
+    Configured tenants and how much they share: engines built so far, and
+    distinct compiled emotion catalogs and questionnaires behind them.
+    """
+    return {"names": tenants.names(), **tenants.stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text exposition: per-step analysis timings, answer mapping time and
+    zero-delta fallback counts (including those recorded in scoring pool workers).
+    """
+    worker_metrics = scoring_pool.worker_metrics() if scoring_pool is not None else []
+    text = await run_in_threadpool(REGISTRY.render, *worker_metrics)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
+def get_result_store() -> ResultStore:
+    if result_store is None:
+        raise HTTPException(status_code=404, detail="The result store is disabled")
+    return result_store
+
+
+async def query_results(query, *args: Any) -> Any:
+    """Run a result store scan on the threadpool; invalid arguments are a 400"""
+    try:
+        return await run_in_threadpool(query, *args)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+MAX_HISTOGRAM_BINS = 1000
+
+# Aggregates over stored results. start / end are epoch seconds and version a
+# questionnaire version; all three are optional filters.
+@app.get("/results/emotions")
+async def results_emotions(start: Optional[float] = None, end: Optional[float] = None, version: Optional[str] = None):
+    """Number of results per primary emotion"""
+    return {"primary_emotions": await query_results(get_result_store().primary_distribution, start, end, version)}
+
+
+@app.get("/results/triad")
+async def results_triad(window: float = 3600, start: Optional[float] = None, end: Optional[float] = None,
+                        version: Optional[str] = None):
+    """Mean core triad per window of `window` seconds"""
+    return {"window": window,
+            "windows": await query_results(get_result_store().mean_triad, window, start, end, version)}
+
+
+@app.get("/results/histogram")
+async def results_histogram(dimension: str, bins: int = 20, start: Optional[float] = None,
+                            end: Optional[float] = None, version: Optional[str] = None):
+    """Histogram of pleasure, arousal or dominance, or of one emotion's prevalence"""
+    body = await query_results(get_result_store().histogram, dimension, min(bins, MAX_HISTOGRAM_BINS), start, end, version)
+    body["dimension"] = dimension
+    return body
+
+
+@app.get("/results/stats")
+async def results_stats():
+    return get_result_store().stats()
+
+
+# Live scoring sessions; PAD_SESSION_IDLE_SECONDS / PAD_MAX_SESSIONS bound their memory
+sessions = SessionStore(
+    max_sessions=int(os.environ.get("PAD_MAX_SESSIONS", "10000")),
+    idle_timeout=float(os.environ.get("PAD_SESSION_IDLE_SECONDS", "900")),
+)
+
+
+class SessionAnswer(BaseModel):
+    answer: Optional[Any] = None
+
+
+def get_session(session_id: str) -> ScoringSession:
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return session
+
+
+def session_preview(session: ScoringSession) -> Dict[str, Any]:
     """
-    # Debug log to check input
-    logger.info("📥 Received answers: %s", req.dict())
-
-    # helper lookups
-    likert_map = {q["id"]: q for q in LIKERT}
-    scene_map = {q["id"]: q for q in SCENE}
-
-    pad_deltas = []
-    for ans in req.answers:
-        qid = ans.question_id
-        a = ans.answer
-
-        if a is None:  # ✅ skip unanswered
-            logger.warning(f"Skipping unanswered question {qid}")
-            pad_deltas.append(PADDelta(0.0, 0.0, 0.0, question_id=str(qid)))
-            continue
-
-        # Likert question mapping
-        if qid in likert_map:
-            found = None
-            for m in likert_map[qid].get("mapping", []):
-                try:
-                    if m.get("score") == int(a):
-                        found = m
-                        break
-                except Exception:
-                    pass
-            if found:
-                pad_deltas.append(
-                    PADDelta(
-                        float(found.get("dP", 0.0)),
-                        float(found.get("dA", 0.0)),
-                        float(found.get("dD", 0.0)),
-                        question_id=str(qid),
-                    )
-                )
-                continue
-
-        # Scene question mapping
-        if qid in scene_map:
-            found = None
-            for opt in scene_map[qid].get("options", []):
-                if (
-                    opt.get("id") == a
-                    or opt.get("id") == str(a)
-                    or opt.get("text") == a
-                ):
-                    found = opt
-                    break
-            if found:
-                pad_deltas.append(
-                    PADDelta(
-                        float(found.get("dP", 0.0)),
-                        float(found.get("dA", 0.0)),
-                        float(found.get("dD", 0.0)),
-                        question_id=str(qid),
-                    )
-                )
-                continue
-
-        # If we couldn't map, append zero delta (safe fallback)
-        logger.warning(
-            f"No mapping found for question {qid} answer {a}; using zero delta"
+    The /analyze response for the session's answers so far, plus "session_id"
+    and "answered"; before the first answer only those two fields are set.
+    Adaptive sessions also get the /questions/next fields.
+    """
+    session_engine = tenants.get(session.tenant).engine
+    result = session.analyze(session_engine, top_k=TOP_EMOTIONS)
+    body = format_result(result) if result is not None else {}
+    body["session_id"] = session.session_id
+    body["answered"] = len(session.deltas)
+    if session.adaptive:
+        raw, answered = session.progress()
+        choice = selector_for(session.questionnaire, **ADAPTIVE_OPTIONS).choose(
+            session_engine, raw.to_tuple(), raw.num_questions, answered
         )
-        pad_deltas.append(PADDelta(0.0, 0.0, 0.0, question_id=str(qid)))
-
-    # Run analysis
-    result = engine.analyze_pad_profile(pad_deltas)
-
-    # Format response
-    resp = {
-        "primary_emotion": result.primary_emotion,
-        "secondary_emotion": result.secondary_emotion,
-        "core_triad": {
-            "pleasure": result.core_triad.pleasure,
-            "arousal": result.core_triad.arousal,
-            "dominance": result.core_triad.dominance,
-        },
-        "top_emotions": [
-            {"name": s.emotion_name, "score": s.prevalence_score}
-            for s in result.emotion_scores[:6]
-        ],
-        "metadata": result.metadata,
+        body.update(format_choice(choice))
+    return body
+
+
+def answer_and_preview(session: ScoringSession, question_id: int, answer: Any) -> Dict[str, Any]:
+    delta = session.questionnaire.map_answers([(question_id, answer)])[0]
+    session.set_answer(question_id, delta)
+    return session_preview(session)
+
+
+@app.post("/sessions")
+async def create_session(request: Request, adaptive: bool = False):
+    """
+    Start a live scoring session. Post each answer to
+    PUT /sessions/{session_id}/answers/{question_id} as it is given; every call
+    returns the updated preview without re-analyzing earlier answers.
+    With ?adaptive=true every preview also names the next question to ask
+    and says when to stop. The session keeps the tenant (X-PAD-Tenant) it was
+    started for; later calls on it use that tenant's questionnaire and engine.
+    """
+    tenant = tenant_for(request)
+    session = sessions.create(await current_questionnaire(tenant), adaptive,
+                              tenant.name if tenant is not tenants.default else None)
+    return await run_in_threadpool(session_preview, session)
+
+
+# Previews run the scoring pipeline, so they are kept off the event loop
+@app.get("/sessions/{session_id}")
+async def read_session(session_id: str):
+    return await run_in_threadpool(session_preview, get_session(session_id))
+
+
+@app.put("/sessions/{session_id}/answers/{question_id}")
+async def set_session_answer(session_id: str, question_id: int, body: SessionAnswer):
+    """Record or change one answer. Body: { "answer": 4 } or { "answer": "3b" }"""
+    return await run_in_threadpool(answer_and_preview, get_session(session_id), question_id, body.answer)
+
+
+@app.delete("/sessions/{session_id}/answers/{question_id}")
+async def retract_session_answer(session_id: str, question_id: int):
+    """Retract one answer"""
+    session = get_session(session_id)
+    if not session.retract_answer(question_id):
+        raise HTTPException(status_code=404, detail=f"Question {question_id} has not been answered")
+    return await run_in_threadpool(session_preview, session)
+
+
+@app.delete("/sessions/{session_id}")
+async def close_session(session_id: str):
+    if not sessions.close(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return {"session_id": session_id, "closed": True}
+
+
+# Partner matching: every scored profile is indexed by core triad and emotion
+# prevalence vector, memory-mapped from PAD_PROFILE_INDEX_DIR at startup and saved
+# there on shutdown, and every PAD_PROFILE_SAVE_SECONDS while it has unsaved changes
+# so a crash loses at most that much (0 saves on shutdown only)
+PROFILE_INDEX_DIR = Path(os.environ.get("PAD_PROFILE_INDEX_DIR", COMPILED_DIR / "profiles"))
+PROFILE_SAVE_INTERVAL = float(os.environ.get("PAD_PROFILE_SAVE_SECONDS", "60"))
+if (PROFILE_INDEX_DIR / "profiles.json").exists():
+    profiles = ProfileIndex.load(PROFILE_INDEX_DIR)
+else:
+    profiles = ProfileIndex(vector_dims=len(engine.emotion_names))
+MAX_MATCHES = 100
+profile_saver: Optional[asyncio.Task] = None
+
+
+async def save_profiles_periodically() -> None:
+    while True:
+        await asyncio.sleep(PROFILE_SAVE_INTERVAL)
+        if profiles.dirty:
+            try:
+                await run_in_threadpool(profiles.save, PROFILE_INDEX_DIR)
+            except Exception:
+                logger.exception("Saving the profile index to %s failed", PROFILE_INDEX_DIR)
+
+
+@app.on_event("startup")
+async def start_profile_saver():
+    global profile_saver
+    if PROFILE_SAVE_INTERVAL > 0:
+        profile_saver = asyncio.get_running_loop().create_task(save_profiles_periodically())
+
+
+@app.on_event("shutdown")
+async def save_profiles():
+    if profile_saver is not None:
+        profile_saver.cancel()
+    await run_in_threadpool(profiles.save, PROFILE_INDEX_DIR)
+
+
+def require_default_tenant(request: Request) -> None:
+    """
+    Profiles are indexed by the default emotion catalog's prevalence vectors,
+    so profile routes reject requests for any other tenant.
+    """
+    if tenant_for(request) is not tenants.default:
+        raise HTTPException(status_code=400, detail="Profiles are only kept for the default tenant")
+
+
+@app.put("/profiles/{user_id}")
+async def put_profile(user_id: str, req: AnalyzeRequest, request: Request):
+    """
+    Score a user's answers (like /analyze) and store the result as their matching
+    profile, replacing any earlier one. Returns the /analyze body plus "user_id".
+    """
+    require_default_tenant(request)
+    result = await score_answers_async(req.answers)
+    vector = engine.prevalence_vector(result.core_triad)
+    await run_in_threadpool(profiles.add, user_id, result.core_triad.to_tuple(), vector)
+    body = format_result(result)
+    body["user_id"] = user_id
+    return body
+
+
+@app.delete("/profiles/{user_id}")
+async def delete_profile(user_id: str, request: Request):
+    require_default_tenant(request)
+    if not await run_in_threadpool(profiles.remove, user_id):
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    return {"user_id": user_id, "deleted": True}
+
+
+@app.get("/profiles/{user_id}/matches")
+async def profile_matches(user_id: str, request: Request, k: int = 10, metric: str = "euclidean"):
+    """
+    The k most compatible users: nearest core triads ("euclidean", in PAD space)
+    or most similar emotion prevalence vectors ("cosine", distance = 1 - cosine).
+    """
+    require_default_tenant(request)
+    if metric not in INDEX_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(INDEX_METRICS)}")
+    matches = await run_in_threadpool(profiles.similar_to, user_id, max(1, min(k, MAX_MATCHES)), metric)
+    if matches is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    return {
+        "user_id": user_id,
+        "metric": metric,
+        "matches": [{"user_id": match_id, "distance": distance} for match_id, distance in matches],
     }
-    return resp
+
+
+@app.get("/profiles/stats")
+async def profile_stats():
+    return profiles.stats()
+
+
+# Largest single payload we buffer while waiting for it to complete
+MAX_BATCH_ITEM_BYTES = 1_000_000
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that can be sent while the request body is still being read.
+
+    The stock class may watch receive() for client disconnects, which would swallow
+    upload chunks the handler has not consumed yet; here a disconnect surfaces
+    through request.stream() instead.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_json_documents(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    Incrementally decode JSON documents from a byte stream.
+
+    Accepts either a JSON array of objects or NDJSON (one object per line); the
+    array brackets and separators are skipped, so only the document currently
+    being received is ever held in memory.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    async for chunk in chunks:
+        buf += utf8.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,[]":
+                pos += 1
+            if pos >= len(buf):
+                break
+            try:
+                doc, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # incomplete document, wait for more bytes
+            yield doc
+        buf = buf[pos:]
+        if len(buf) > MAX_BATCH_ITEM_BYTES:
+            raise ValueError(f"Batch item exceeds {MAX_BATCH_ITEM_BYTES} bytes or is malformed")
+
+    buf += utf8.decode(b"", final=True)
+    if buf.strip(" \t\r\n,[]"):
+        raise ValueError("Malformed JSON at end of batch body")
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request):
+    """
+    Analyze many submissions over one connection.
+    Body: a JSON array of AnalyzeRequest objects, or NDJSON with one per line.
+    Response: NDJSON, one line per submission in input order, streamed as each
+    result is computed. Each line carries its "index"; a submission that fails
+    validation yields { "index": i, "error": "..." } instead of a result.
+    Submissions are admitted in the bulk lane unless X-PAD-Priority says
+    otherwise; a shed one yields an error line with "retry_after" (seconds).
+    """
+
+    tenant = tenant_for(request)
+    try:
+        lane, timeout = parse_admission(request.headers.get("x-pad-priority"), request.headers.get("x-pad-deadline-ms"),
+                                        BULK, ADMISSION_DEADLINE)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def score_submission(answers: List[AnswerItem]) -> PADAnalysisResult:
+        if admission is None:
+            return await score_answers_async(answers, tenant)
+        async with admission.slot(lane, timeout):
+            return await score_answers_async(answers, tenant)
+
+    async def score_line(index: int, payload: Any) -> Dict[str, Any]:
+        try:
+            if not isinstance(payload, dict):
+                raise ValueError("Each batch item must be a JSON object")
+            req = AnalyzeRequest(**payload)
+            line = format_result(await score_submission(req.answers))
+            line["index"] = index
+        except (ValueError, TypeError, ValidationError) as e:
+            line = {"index": index, "error": str(e)}
+        except Overloaded as e:
+            line = {"index": index, "error": str(e), "retry_after": e.retry_after}
+        return line
+
+    def encode_line(line: Dict[str, Any]) -> bytes:
+        return serialization.dumps_json(line) + b"\n"
+
+    async def results() -> AsyncIterator[bytes]:
+        # With the scoring pool, keep enough submissions in flight to fill every
+        # worker's batch; lines are still written in input order
+        window = scoring_pool.workers * scoring_pool.max_batch if scoring_pool is not None else 1
+        in_flight = deque()
+        index = 0
+        try:
+            async for payload in iter_json_documents(request.stream()):
+                in_flight.append(asyncio.ensure_future(score_line(index, payload)))
+                index += 1
+                if len(in_flight) >= window:
+                    yield encode_line(await in_flight.popleft())
+            while in_flight:
+                yield encode_line(await in_flight.popleft())
+        except ValueError as e:
+            # Undecodable body: report what was already read, then end the stream
+            while in_flight:
+                yield encode_line(await in_flight.popleft())
+            yield encode_line({"index": index, "error": str(e)})
+        finally:
+            # Client went away mid-stream
+            for task in in_flight:
+                task.cancel()
+
+    return DuplexStreamingResponse(results(), media_type="application/x-ndjson")
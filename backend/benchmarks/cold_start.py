@@ -0,0 +1,158 @@
+"""
+Measure backend cold start: import time, time to first response and first-request latency.
+
+Each run starts a fresh interpreter the way an autoscaled worker does and
+records, per sample:
+
+    import_ms          python -c "import app" in a new process
+    first_response_ms  process start until uvicorn answers the first POST /analyze
+    first_request_ms   latency of that first POST /analyze
+    second_request_ms  latency of the request right after it
+
+The app is configured from the environment as usual, so set e.g.
+PAD_QUESTIONNAIRE_SNAPSHOT to measure a startup snapshot. With --budget-ms
+the exit status is 1 when the median time to first response is over budget,
+so the benchmark can gate a deploy. Results can be written as JSON and
+compared against an earlier run.
+
+Run from the backend directory:
+    python benchmarks/cold_start.py [--samples 10] [--budget-ms 1500] [--output cold.json]
+    python benchmarks/cold_start.py --compare cold.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from pipeline import percentile  # noqa: E402
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+RESULT_FORMAT = 1
+METRICS = ("import_ms", "first_response_ms", "first_request_ms", "second_request_ms")
+BODY = {"answers": [{"question_id": 21, "answer": 4}, {"question_id": 3, "answer": "3b"}]}
+
+IMPORT_PROBE = "import time; start = time.perf_counter(); import app; print((time.perf_counter() - start) * 1e3)"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import() -> float:
+    """Milliseconds to import app in a fresh interpreter"""
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=BASE_DIR, check=True,
+                         capture_output=True, text=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def measure_server(timeout: float) -> Dict[str, float]:
+    """Start uvicorn and time the first two /analyze requests"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/analyze"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--log-level", "warning", "--no-access-log",
+         "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BASE_DIR, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError("uvicorn exited during startup")
+                if time.perf_counter() - start > timeout:
+                    raise RuntimeError(f"uvicorn did not answer within {timeout}s")
+                try:
+                    sent = time.perf_counter()
+                    response = client.post(url, json=BODY)
+                except httpx.TransportError:
+                    time.sleep(0.005)
+                    continue
+                done = time.perf_counter()
+                response.raise_for_status()
+                break
+            second_start = time.perf_counter()
+            client.post(url, json=BODY).raise_for_status()
+            second = time.perf_counter() - second_start
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "first_response_ms": (done - start) * 1e3,
+        "first_request_ms": (done - sent) * 1e3,
+        "second_request_ms": second * 1e3,
+    }
+
+
+def summarize(samples: List[Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for metric in METRICS:
+        values = sorted(sample[metric] for sample in samples)
+        summary[metric] = {"p50": percentile(values, 50), "p90": percentile(values, 90), "max": values[-1]}
+    return summary
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print current vs baseline medians"""
+    print(f"\n{'metric':<20} {'p50 base':>10} {'p50 now':>10} {'ratio':>7}")
+    for metric, row in current["summary"].items():
+        base = baseline.get("summary", {}).get(metric)
+        if base is None:
+            continue
+        print(f"{metric:<20} {base['p50']:>10.1f} {row['p50']:>10.1f} {row['p50'] / base['p50']:>7.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", type=int, default=10, help="Fresh processes per measurement")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for the server")
+    parser.add_argument("--budget-ms", type=float, help="Fail if the median time to first response exceeds this")
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="Earlier --output file to compare against")
+    args = parser.parse_args()
+
+    # One unmeasured run, so the first sample does not pay for cold disk caches or .pyc writes
+    measure_import()
+    samples = [{"import_ms": measure_import(), **measure_server(args.timeout)} for _ in range(args.samples)]
+
+    results = {
+        "format": RESULT_FORMAT,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"samples": args.samples,
+                   "env": {k: v for k, v in sorted(os.environ.items()) if k.startswith("PAD_")}},
+        "summary": summarize(samples),
+        "samples": samples,
+    }
+
+    print(f"{'metric':<20} {'p50 ms':>8} {'p90 ms':>8} {'max ms':>8}")
+    for metric, row in results["summary"].items():
+        print(f"{metric:<20} {row['p50']:>8.1f} {row['p90']:>8.1f} {row['max']:>8.1f}")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text()))
+
+    if args.budget_ms is not None:
+        median = results["summary"]["first_response_ms"]["p50"]
+        if median > args.budget_ms:
+            print(f"\nOver budget: median time to first response {median:.1f} ms > {args.budget_ms:.1f} ms")
+            sys.exit(1)
+        print(f"\nWithin budget: median time to first response {median:.1f} ms <= {args.budget_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
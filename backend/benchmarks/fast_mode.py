@@ -0,0 +1,81 @@
+"""
+Compare PADCoreEngine's validated pipeline with trusted fast mode.
+
+Reports, per analyze_pad_profile call, the wall time, the number of memory
+blocks still held by the result, and the peak transient memory.
+
+Run from the backend directory:
+    python benchmarks/fast_mode.py [--calls 2000] [--questions 10]
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core import PADCoreEngine  # noqa: E402
+
+
+def make_inputs(calls: int, questions: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        [tuple(round(rng.uniform(-0.6, 0.6), 1) for _ in range(3)) for _ in range(questions)]
+        for _ in range(calls)
+    ]
+
+
+def measure(engine: PADCoreEngine, inputs, top_k=None) -> dict:
+    # Wall time with tracing off
+    start = time.perf_counter()
+    for deltas in inputs:
+        engine.analyze_pad_profile(deltas, top_k)
+    elapsed = time.perf_counter() - start
+
+    # Allocations: keep every result alive so their blocks show up in the snapshot
+    results = []
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    for deltas in inputs:
+        results.append(engine.analyze_pad_profile(deltas, top_k))
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats)
+    calls = len(inputs)
+    return {
+        "us_per_call": elapsed / calls * 1e6,
+        "blocks_per_call": blocks / calls,
+        "peak_bytes_per_call": peak / calls,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=None)
+    args = parser.parse_args()
+
+    # Production log level: INFO lines are filtered, not formatted
+    logging.disable(logging.INFO)
+
+    inputs = make_inputs(args.calls, args.questions)
+    rows = {
+        "validated": measure(PADCoreEngine(), inputs, args.top_k),
+        "trusted": measure(PADCoreEngine(trusted=True), inputs, args.top_k),
+    }
+
+    print(f"{'mode':<10} {'us/call':>10} {'blocks/call':>12} {'peak B/call':>12}")
+    for mode, row in rows.items():
+        print(f"{mode:<10} {row['us_per_call']:>10.1f} {row['blocks_per_call']:>12.1f} {row['peak_bytes_per_call']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
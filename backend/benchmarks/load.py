@@ -0,0 +1,200 @@
+"""
+Load-test the backend over real sockets at high concurrency.
+
+Starts uvicorn with the app as configured from the environment, then drives
+GET /questions and POST /analyze with many concurrent clients over each proxy
+transport:
+
+    tcp-new        a new TCP connection per request (the old proxy behaviour)
+    tcp-keepalive  a pool of kept-alive TCP connections
+    uds-keepalive  kept-alive connections over a Unix domain socket
+
+Each run reports latency percentiles and requests/s per endpoint and transport.
+Results can be written as JSON and compared against an earlier run, e.g. one
+taken before a change.
+
+Run from the backend directory:
+    python benchmarks/load.py [--concurrency 64] [--requests 4000] [--output load.json]
+    python benchmarks/load.py --compare load.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from pipeline import make_answer_sets, percentile  # noqa: E402
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+RESULT_FORMAT = 1
+TRANSPORTS = ("tcp-new", "tcp-keepalive", "uds-keepalive")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(bind: List[str]) -> subprocess.Popen:
+    """uvicorn app:app with the given bind arguments, once it answers /questions"""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--log-level", "warning", "--no-access-log", *bind],
+        cwd=BASE_DIR,
+    )
+    transport = httpx.HTTPTransport(uds=bind[1]) if bind[0] == "--uds" else None
+    base_url = "http://pad" if transport else f"http://127.0.0.1:{bind[3]}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            with httpx.Client(transport=transport, base_url=base_url) as client:
+                if client.get("/questions").status_code == 200:
+                    return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start within 30s")
+
+
+async def drive(client: httpx.AsyncClient, send: Callable[[httpx.AsyncClient, int], Any],
+                requests: int, concurrency: int) -> Dict[str, float]:
+    """Run requests calls of send from concurrency workers; latency and throughput"""
+    latencies: List[float] = []
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            start = time.perf_counter()
+            response = await send(client, index)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p90_ms": percentile(latencies, 90) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+        "max_ms": latencies[-1] * 1e3,
+        "requests_per_s": requests / elapsed,
+    }
+
+
+async def bench_transport(name: str, target: Dict[str, Any], bodies: List[Dict[str, Any]],
+                          requests: int, concurrency: int) -> Dict[str, Dict[str, float]]:
+    keepalive = name != "tcp-new"
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency if keepalive else 0)
+    transport = httpx.AsyncHTTPTransport(uds=target.get("uds"), limits=limits)
+    headers = {} if keepalive else {"Connection": "close"}
+
+    async def get_questions(client, _):
+        return await client.get("/questions")
+
+    async def post_analyze(client, index):
+        return await client.post("/analyze", json=bodies[index % len(bodies)])
+
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url=target["base_url"], headers=headers, timeout=60) as client:
+        for endpoint, send in (("GET /questions", get_questions), ("POST /analyze", post_analyze)):
+            await drive(client, send, min(requests, 200), concurrency)  # warm-up
+            results[endpoint] = await drive(client, send, requests, concurrency)
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print current vs baseline p99 and throughput per endpoint and transport"""
+    print(f"\n{'transport / endpoint':<34} {'p99 base':>10} {'p99 now':>10} {'ratio':>7} {'req/s ratio':>12}")
+    for transport, endpoints in current["results"].items():
+        for endpoint, row in endpoints.items():
+            base = baseline.get("results", {}).get(transport, {}).get(endpoint)
+            if base is None:
+                continue
+            print(f"{transport + ' ' + endpoint:<34} {base['p99_ms']:>10.2f} {row['p99_ms']:>10.2f} "
+                  f"{row['p99_ms'] / base['p99_ms']:>7.2f} {row['requests_per_s'] / base['requests_per_s']:>12.2f}")
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    print(f"{'transport / endpoint':<34} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'req/s':>9}")
+    for transport, endpoints in results["results"].items():
+        for endpoint, row in endpoints.items():
+            print(f"{transport + ' ' + endpoint:<34} {row['p50_ms']:>8.2f} {row['p90_ms']:>8.2f} "
+                  f"{row['p99_ms']:>8.2f} {row['max_ms']:>8.2f} {row['requests_per_s']:>9.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent client requests")
+    parser.add_argument("--requests", type=int, default=4000, help="Requests per endpoint and transport")
+    parser.add_argument("--questions", type=int, default=10, help="Answers per /analyze body")
+    parser.add_argument("--transports", nargs="+", choices=TRANSPORTS, default=list(TRANSPORTS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="Earlier --output file to compare against")
+    args = parser.parse_args()
+
+    # Keep the client's own per-request log lines out of the measurement
+    logging.disable(logging.INFO)
+
+    bodies = [
+        {"answers": [{"question_id": qid, "answer": answer} for qid, answer, _ in answers]}
+        for answers in make_answer_sets(500, args.questions, args.seed)
+    ]
+    results: Dict[str, Any] = {
+        "format": RESULT_FORMAT,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"concurrency": args.concurrency, "requests": args.requests, "questions": args.questions, "seed": args.seed},
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for transport in args.transports:
+            if transport.startswith("uds"):
+                uds = os.path.join(tmp, "pad.sock")
+                bind, target = ["--uds", uds], {"uds": uds, "base_url": "http://pad"}
+            else:
+                port = free_port()
+                bind, target = ["--host", "127.0.0.1", "--port", str(port)], {"base_url": f"http://127.0.0.1:{port}"}
+            server = start_server(bind)
+            try:
+                results["results"][transport] = asyncio.run(
+                    bench_transport(transport, target, bodies, args.requests, args.concurrency)
+                )
+            finally:
+                server.terminate()
+                server.wait()
+
+    print_report(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline.get("params") != results["params"]:
+            print(f"\nNote: baseline params {baseline.get('params')} differ from this run")
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
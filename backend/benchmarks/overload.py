@@ -0,0 +1,245 @@
+"""
+Load-test POST /analyze past saturation, with and without admission control.
+
+A closed-loop load test (load.py) can never overload the server: each client
+waits for its response before sending the next request. This one is open
+loop: requests arrive at a fixed Poisson rate whatever the server does, the
+way independent users do. It first measures the server's capacity, then
+offers a multiple of it for each --loads factor, against a server started
+with admission control as configured from the environment ("admission") and
+one with PAD_ADMISSION_MAX_IN_FLIGHT=0 ("unlimited").
+
+The client speaks HTTP/1.1 over kept-alive asyncio streams with pre-encoded
+requests rather than using httpx, so that on a small machine generating the
+load takes far less CPU than serving it.
+
+A --bulk share of requests is sent with X-PAD-Priority: bulk. Per run it
+reports the p50 / p99 latency of served interactive and bulk requests, the
+p99 latency of 503 responses, and the share of requests served per lane.
+With admission control the interactive p99 should stay near its value at
+capacity as the load grows, the excess being shed quickly; without it every
+request queues and latency grows for as long as the overload lasts.
+
+Run from the backend directory:
+    python benchmarks/overload.py [--loads 0.5 1 2 4] [--duration 10] [--output overload.json]
+    python benchmarks/overload.py --compare overload.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from pipeline import make_answer_sets, percentile  # noqa: E402
+from load import free_port, start_server  # noqa: E402
+
+RESULT_FORMAT = 1
+MODES = ("admission", "unlimited")
+
+
+def encode_request(port: int, body: Dict[str, Any], lane: str) -> bytes:
+    payload = json.dumps(body).encode()
+    return (f"POST /analyze HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nContent-Type: application/json\r\n"
+            f"X-PAD-Priority: {lane}\r\nContent-Length: {len(payload)}\r\n\r\n").encode() + payload
+
+
+class Client:
+    """Minimal HTTP/1.1 client: a pool of kept-alive connections, one request per connection at a time"""
+
+    def __init__(self, port: int, max_connections: int):
+        self.port = port
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._connections = asyncio.Semaphore(max_connections)
+
+    async def send(self, request: bytes) -> int:
+        """Status code of the response to a pre-encoded request (0 if the connection failed)"""
+        async with self._connections:
+            connection = self._idle.pop() if self._idle else await asyncio.open_connection("127.0.0.1", self.port)
+            reader, writer = connection
+            try:
+                writer.write(request)
+                head = await reader.readuntil(b"\r\n\r\n")
+                status = int(head.split(b" ", 2)[1])
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line[:15].lower() == b"content-length:":
+                        length = int(line[15:])
+                await reader.readexactly(length)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                writer.close()
+                return 0
+            self._idle.append(connection)
+            return status
+
+    def close(self) -> None:
+        for _, writer in self._idle:
+            writer.close()
+
+
+async def measure_capacity(client: Client, requests: List[bytes], count: int, concurrency: int) -> float:
+    """Served /analyze requests per second with a closed loop of concurrency clients"""
+    remaining = count
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await client.send(random.choice(requests))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return count / (time.perf_counter() - start)
+
+
+async def offer(client: Client, requests: Dict[str, List[bytes]], rate: float, duration: float,
+                bulk: float, rng: random.Random) -> Dict[str, Any]:
+    """Send Poisson arrivals at rate per second for duration seconds"""
+    samples: List[Tuple[str, int, float]] = []
+
+    async def send(lane: str) -> None:
+        start = time.perf_counter()
+        status = await client.send(rng.choice(requests[lane]))
+        samples.append((lane, status, time.perf_counter() - start))
+
+    tasks = []
+    start = time.perf_counter()
+    next_arrival = start
+    while next_arrival - start < duration:
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        tasks.append(asyncio.ensure_future(send("bulk" if rng.random() < bulk else "interactive")))
+        next_arrival += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+
+    row: Dict[str, Any] = {"offered_per_s": len(tasks) / duration}
+    for lane in ("interactive", "bulk"):
+        served = sorted(latency for l, status, latency in samples if l == lane and status == 200)
+        sent = sum(1 for l, _, _ in samples if l == lane)
+        row[lane] = {
+            "sent": sent,
+            "served_share": len(served) / sent if sent else None,
+            "p50_ms": percentile(served, 50) * 1e3 if served else None,
+            "p99_ms": percentile(served, 99) * 1e3 if served else None,
+        }
+    shed = sorted(latency for _, status, latency in samples if status == 503)
+    row["shed"] = len(shed)
+    row["shed_p99_ms"] = percentile(shed, 99) * 1e3 if shed else None
+    row["errors"] = sum(1 for _, status, _ in samples if status not in (200, 503))
+    return row
+
+
+async def bench(port: int, bodies: List[Dict[str, Any]], args: argparse.Namespace) -> Dict[str, Any]:
+    requests = {lane: [encode_request(port, body, lane) for body in bodies] for lane in ("interactive", "bulk")}
+    client = Client(port, args.max_connections)
+    try:
+        # Bulk lane without a deadline, so the closed loop is never shed
+        await measure_capacity(client, requests["bulk"], 200, 16)  # warm-up
+        capacity = await measure_capacity(client, requests["bulk"], args.capacity_requests, 16)
+        rng = random.Random(args.seed)
+        runs = {}
+        for load in args.loads:
+            runs[str(load)] = await offer(client, requests, capacity * load, args.duration, args.bulk, rng)
+            # Let the backlog of the previous run drain before the next one
+            await asyncio.sleep(2)
+    finally:
+        client.close()
+    return {"capacity_per_s": capacity, "loads": runs}
+
+
+def fmt(value: Any, spec: str = ".1f") -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    for mode, run in results["results"].items():
+        print(f"{mode}: capacity {run['capacity_per_s']:.0f} requests/s")
+    print(f"{'mode':<10} {'load':>5} {'offered/s':>10} {'int p50':>8} {'int p99':>8} {'int ok':>7} "
+          f"{'bulk p99':>9} {'bulk ok':>8} {'503 p99':>8}")
+    for mode, run in results["results"].items():
+        for load, row in run["loads"].items():
+            interactive, bulk = row["interactive"], row["bulk"]
+            print(f"{mode:<10} {load:>5} {row['offered_per_s']:>10.0f} {fmt(interactive['p50_ms']):>8} "
+                  f"{fmt(interactive['p99_ms']):>8} {fmt(interactive['served_share'], '.0%'):>7} "
+                  f"{fmt(bulk['p99_ms']):>9} {fmt(bulk['served_share'], '.0%'):>8} {fmt(row['shed_p99_ms']):>8}")
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print current vs baseline interactive p99 per mode and load"""
+    print(f"\n{'mode / load':<18} {'int p99 base':>13} {'int p99 now':>12} {'ratio':>7}")
+    for mode, run in current["results"].items():
+        for load, row in run["loads"].items():
+            base = baseline.get("results", {}).get(mode, {}).get("loads", {}).get(load)
+            if base is None or not base["interactive"]["p99_ms"] or row["interactive"]["p99_ms"] is None:
+                continue
+            now, was = row["interactive"]["p99_ms"], base["interactive"]["p99_ms"]
+            print(f"{mode + ' ' + load:<18} {was:>13.1f} {now:>12.1f} {now / was:>7.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--loads", type=float, nargs="+", default=[0.5, 1.0, 2.0, 4.0],
+                        help="Offered load as multiples of the measured capacity")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of arrivals per load")
+    parser.add_argument("--bulk", type=float, default=0.2, help="Share of requests in the bulk lane")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--capacity-requests", type=int, default=1000, help="Requests for the capacity measurement")
+    parser.add_argument("--max-connections", type=int, default=1000, help="Client connection limit")
+    parser.add_argument("--questions", type=int, default=10, help="Answers per /analyze body")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="Earlier --output file to compare against")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    random.seed(args.seed)
+    bodies = [
+        {"answers": [{"question_id": qid, "answer": answer} for qid, answer, _ in answers]}
+        for answers in make_answer_sets(500, args.questions, args.seed)
+    ]
+    results: Dict[str, Any] = {
+        "format": RESULT_FORMAT,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"loads": args.loads, "duration": args.duration, "bulk": args.bulk, "questions": args.questions,
+                   "seed": args.seed, "env": {k: v for k, v in sorted(os.environ.items()) if k.startswith("PAD_")}},
+        "results": {},
+    }
+
+    # Repeated bodies would be answered from the result cache, which is not what is
+    # measured here, and the result store would keep every benchmark result
+    os.environ["PAD_RESULT_CACHE_SIZE"] = "0"
+    os.environ["PAD_RESULT_STORE_DIR"] = ""
+    configured = os.environ.get("PAD_ADMISSION_MAX_IN_FLIGHT")
+    for mode in args.modes:
+        if mode == "unlimited":
+            os.environ["PAD_ADMISSION_MAX_IN_FLIGHT"] = "0"
+        elif configured is None:
+            os.environ.pop("PAD_ADMISSION_MAX_IN_FLIGHT", None)
+        else:
+            os.environ["PAD_ADMISSION_MAX_IN_FLIGHT"] = configured
+        port = free_port()
+        server = start_server(["--host", "127.0.0.1", "--port", str(port), "--backlog", "4096"])
+        try:
+            results["results"][mode] = asyncio.run(bench(port, bodies, args))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print_report(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
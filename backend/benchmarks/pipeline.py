@@ -0,0 +1,222 @@
+"""
+Benchmark the PAD pipeline stages and the HTTP endpoints.
+
+Answer sets are sampled from the real question_likert.json / question_scene.json.
+Engine stages run on a validated PADCoreEngine; the endpoints run in-process
+through FastAPI's TestClient with the app configured from the environment as
+usual (e.g. PAD_RESULT_CACHE_SIZE=0 to measure uncached /analyze).
+
+Each benchmark reports latency percentiles, throughput and allocations per
+call. Results can be written as JSON and compared against an earlier run:
+
+Run from the backend directory:
+    python benchmarks/pipeline.py [--sets 500] [--questions 10] [--output bench.json]
+    python benchmarks/pipeline.py --compare bench.json
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core import PADCoreEngine, PADDelta  # noqa: E402
+from questionnaire_store import load_json_file  # noqa: E402
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+RESULT_FORMAT = 1
+
+
+def load_answer_options() -> List[tuple]:
+    """(question_id, [(answer, (dP, dA, dD)), ...]) for every question in both files"""
+    options = []
+    for q in load_json_file(BASE_DIR / "question_likert.json").get("questionnaire", []):
+        choices = [(m["score"], (m.get("dP", 0.0), m.get("dA", 0.0), m.get("dD", 0.0))) for m in q.get("mapping", [])]
+        options.append((q["id"], choices))
+    for q in load_json_file(BASE_DIR / "question_scene.json").get("questionnaire", []):
+        choices = [(o["id"], (o.get("dP", 0.0), o.get("dA", 0.0), o.get("dD", 0.0))) for o in q.get("options", [])]
+        options.append((q["id"], choices))
+    return [(qid, choices) for qid, choices in options if choices]
+
+
+def make_answer_sets(sets: int, questions: int, seed: int = 0) -> List[List[tuple]]:
+    """Synthetic submissions: (question_id, answer, delta) per sampled question"""
+    rng = random.Random(seed)
+    options = load_answer_options()
+    answer_sets = []
+    for _ in range(sets):
+        picked = rng.sample(options, min(questions, len(options)))
+        answer_sets.append([(qid, *rng.choice(choices)) for qid, choices in picked])
+    return answer_sets
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(fn: Callable[[Any], Any], inputs: List[Any], items_per_call: int = 1) -> Dict[str, float]:
+    """
+    Time fn over inputs one call at a time, then re-run it under tracemalloc,
+    keeping every return value alive so retained bytes include the results
+    """
+    timings = []
+    total_start = time.perf_counter()
+    for arg in inputs:
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+    total = time.perf_counter() - total_start
+
+    kept = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    for arg in inputs:
+        kept.append(fn(arg))
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename") if stat.size_diff > 0)
+
+    timings.sort()
+    calls = len(inputs)
+    return {
+        "calls": calls,
+        "p50_us": percentile(timings, 50) * 1e6,
+        "p90_us": percentile(timings, 90) * 1e6,
+        "p99_us": percentile(timings, 99) * 1e6,
+        "mean_us": total / calls * 1e6,
+        "items_per_s": calls * items_per_call / total if total > 0 else 0.0,
+        "retained_bytes_per_call": allocated / calls,
+        "peak_bytes_per_call": peak / calls,
+    }
+
+
+def bench_engine(answer_sets: List[List[tuple]], batch_size: int) -> Dict[str, Dict[str, float]]:
+    engine = PADCoreEngine()
+    raw_deltas = [[delta for _, _, delta in answers] for answers in answer_sets]
+    validated = [engine.validate_input_deltas(d) for d in raw_deltas]
+    raw_scores = [engine.calculate_raw_pad_scores(d) for d in validated]
+    triads = [engine.normalize_to_core_triad(r) for r in raw_scores]
+    objects = [[PADDelta(*delta, question_id=str(qid)) for qid, _, delta in answers] for answers in answer_sets]
+    trusted = PADCoreEngine(trusted=True)
+
+    # Ragged (M, 3) blocks of batch_size respondents for analyze_many
+    batches = []
+    for i in range(0, len(raw_deltas), batch_size):
+        chunk = raw_deltas[i:i + batch_size]
+        offsets = np.cumsum([0] + [len(d) for d in chunk])
+        batches.append((np.array([row for d in chunk for row in d], dtype=np.float64), offsets))
+
+    return {
+        "validate_input_deltas": measure(engine.validate_input_deltas, raw_deltas),
+        "calculate_raw_pad_scores": measure(engine.calculate_raw_pad_scores, validated),
+        "normalize_to_core_triad": measure(engine.normalize_to_core_triad, raw_scores),
+        "calculate_emotion_proximity_scores": measure(engine.calculate_emotion_proximity_scores, triads),
+        "analyze_pad_profile": measure(engine.analyze_pad_profile, raw_deltas),
+        "analyze_pad_profile_trusted": measure(lambda d: trusted.analyze_pad_profile(d, top_k=6), objects),
+        "analyze_many": measure(lambda b: engine.analyze_many(b[0], b[1]), batches, batch_size),
+    }
+
+
+def bench_http(answer_sets: List[List[tuple]], batch_size: int) -> Dict[str, Dict[str, float]]:
+    from fastapi.testclient import TestClient
+    from app import app
+
+    bodies = [{"answers": [{"question_id": qid, "answer": answer} for qid, answer, _ in answers]} for answers in answer_sets]
+    batch_bodies = [
+        "\n".join(json.dumps(body) for body in bodies[i:i + batch_size])
+        for i in range(0, len(bodies), batch_size)
+    ]
+
+    def post_analyze(body):
+        response = client.post("/analyze", json=body)
+        response.raise_for_status()
+        return response
+
+    def post_batch(body):
+        response = client.post("/analyze/batch", content=body)
+        response.raise_for_status()
+        return response
+
+    def get_questions(_):
+        response = client.get("/questions")
+        response.raise_for_status()
+        return response
+
+    with TestClient(app) as client:
+        return {
+            "GET /questions": measure(get_questions, bodies),
+            "POST /analyze": measure(post_analyze, bodies),
+            "POST /analyze/batch": measure(post_batch, batch_bodies, batch_size),
+        }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print current vs baseline p50 and throughput per benchmark"""
+    print(f"\n{'benchmark':<38} {'p50 base':>10} {'p50 now':>10} {'ratio':>7} {'items/s ratio':>14}")
+    for group in ("engine", "http"):
+        for name, row in current.get(group, {}).items():
+            base = baseline.get(group, {}).get(name)
+            if base is None:
+                continue
+            p50_ratio = row["p50_us"] / base["p50_us"] if base["p50_us"] else float("nan")
+            tput_ratio = row["items_per_s"] / base["items_per_s"] if base["items_per_s"] else float("nan")
+            print(f"{name:<38} {base['p50_us']:>10.1f} {row['p50_us']:>10.1f} {p50_ratio:>7.2f} {tput_ratio:>14.2f}")
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    print(f"{'benchmark':<38} {'p50 us':>9} {'p90 us':>9} {'p99 us':>9} {'items/s':>11} {'B kept':>9} {'B peak':>9}")
+    for group in ("engine", "http"):
+        for name, row in results.get(group, {}).items():
+            print(f"{name:<38} {row['p50_us']:>9.1f} {row['p90_us']:>9.1f} {row['p99_us']:>9.1f} "
+                  f"{row['items_per_s']:>11.0f} {row['retained_bytes_per_call']:>9.0f} {row['peak_bytes_per_call']:>9.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sets", type=int, default=500, help="Synthetic answer sets per benchmark")
+    parser.add_argument("--questions", type=int, default=10, help="Answers per set")
+    parser.add_argument("--batch-size", type=int, default=50, help="Respondents per analyze_many / batch request")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-http", action="store_true", help="Only benchmark the engine")
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="Earlier --output file to compare against")
+    args = parser.parse_args()
+
+    # Production log level: INFO lines are filtered, not formatted
+    logging.disable(logging.INFO)
+
+    answer_sets = make_answer_sets(args.sets, args.questions, args.seed)
+    results: Dict[str, Any] = {
+        "format": RESULT_FORMAT,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"sets": args.sets, "questions": args.questions, "batch_size": args.batch_size, "seed": args.seed},
+        "engine": bench_engine(answer_sets, args.batch_size),
+    }
+    if not args.skip_http:
+        results["http"] = bench_http(answer_sets, args.batch_size)
+
+    print_report(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline.get("params") != results["params"]:
+            print(f"\nNote: baseline params {baseline.get('params')} differ from this run")
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
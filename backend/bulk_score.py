@@ -0,0 +1,341 @@
+"""
+Re-score archived answer submissions offline.
+
+Streams records from NDJSON or CSV, maps answers with the compiled question
+files, scores them in chunks on all cores with PADCoreEngine.analyze_many and
+writes columnar results to an output directory:
+
+    manifest.json      emotion names, settings, finished parts, the input
+                       offset to resume from and the count of skipped lines
+    part-00000.npz     one file per chunk with columns
+                         id               record id (str)
+                         valid            bool, False if nothing could be scored
+                         num_questions    int
+                         raw_scores       float64 (N, 3)
+                         core_triad       float64 (N, 3)
+                         prevalence       uint8 (N, E), columns = manifest emotions
+                         primary          int16 emotion index (-1 if invalid)
+                         secondary        int16 emotion index (-1 if none)
+
+Input formats:
+    NDJSON: one object per line, { "id": ..., "answers": [ { "question_id": 21, "answer": 4 }, ... ] }
+            ("id" is optional; "@<byte offset of the line>" is used instead)
+    CSV:    header with id,question_id,answer; consecutive rows with the same id
+            form one record. Rows must not contain embedded newlines.
+
+Malformed lines (invalid JSON, a line that is not a record object, a missing
+or non-integer question_id, a non-finite numeric answer, a CSV row with too few
+columns) are skipped rather than ending the run; the first few are reported on stderr by byte offset, and the total is
+kept in the manifest.
+
+Re-running with the same output directory resumes after the last finished
+part; use --restart to start over.
+
+Run from the backend directory:
+    python bulk_score.py answers.ndjson results/ [--workers 8] [--chunk-size 20000]
+    python bulk_score.py answers.csv results/ --emotions tuned_emotions.json
+"""
+import argparse
+import csv
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator, List, Tuple, Dict, Any, Optional
+
+import numpy as np
+
+from core import PADCoreEngine, NormalizationMethod
+from questionnaire_store import QuestionnaireStore, QuestionnaireSnapshot
+
+BASE_DIR = Path(__file__).resolve().parent
+MANIFEST_FORMAT = 1
+
+# One record: (record id, [(question_id, answer), ...])
+Record = Tuple[str, List[Tuple[int, Any]]]
+
+# Skipped lines reported individually on stderr per run; the rest are only counted
+MAX_REPORTED_SKIPS = 20
+
+class _SkipReporter:
+    def __init__(self, path: Path):
+        self.path = path
+        self.reported = 0
+
+    def __call__(self, start: int, error: Exception) -> None:
+        if self.reported < MAX_REPORTED_SKIPS:
+            print(f"{self.path}: skipping malformed line at byte {start}: {error}", file=sys.stderr)
+        self.reported += 1
+
+def parse_ndjson_record(line: bytes, start: int) -> Record:
+    """
+    One NDJSON line as a record; start (its byte offset) names records without an "id"
+
+    Raises:
+        ValueError: If the line is not JSON or not a record object, or an answer
+            has a non-integer question_id or a non-finite numeric answer
+    """
+    doc = json.loads(line)
+    if not isinstance(doc, dict):
+        raise ValueError("expected a JSON object")
+    answers = doc.get("answers", [])
+    if not isinstance(answers, list) or not all(isinstance(a, dict) for a in answers):
+        raise ValueError("\"answers\" must be a list of objects")
+    record_id = str(doc.get("id", f"@{start}"))
+    return record_id, [parse_ndjson_answer(a) for a in answers]
+
+def parse_ndjson_answer(item: Dict[str, Any]) -> Tuple[int, Any]:
+    """
+    (question_id, answer) of one answer object; the id is coerced with int(),
+    like the CSV reader and the API's request model do
+
+    Raises:
+        ValueError: For a question_id int() rejects or a non-finite numeric answer
+    """
+    qid, answer = item.get("question_id"), item.get("answer")
+    try:
+        qid = int(qid)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"question_id must be an integer, got {qid!r}")
+    if isinstance(answer, float) and not math.isfinite(answer):
+        raise ValueError(f"answer must be finite, got {answer!r}")
+    return qid, answer
+
+def read_ndjson(path: Path, offset: int) -> Iterator[Tuple[Optional[Record], int]]:
+    """Yield (record, byte offset just past it) starting at offset; record is None for a skipped line"""
+    skip = _SkipReporter(path)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            start = offset
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                record = parse_ndjson_record(line, start)
+            except ValueError as e:  # JSONDecodeError and UnicodeDecodeError included
+                skip(start, e)
+                yield None, offset
+                continue
+            yield record, offset
+
+def read_csv(path: Path, offset: int) -> Iterator[Tuple[Optional[Record], int]]:
+    """
+    Yield (record, byte offset just past it) for runs of rows sharing an id;
+    record is None for a skipped row, which also ends the run before it
+    """
+    skip = _SkipReporter(path)
+    with open(path, "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8-sig")]))
+        columns = {name.strip(): i for i, name in enumerate(header)}
+        try:
+            id_col, qid_col, answer_col = columns["id"], columns["question_id"], columns["answer"]
+        except KeyError as e:
+            raise ValueError(f"{path} needs id, question_id and answer columns (missing {e})")
+        offset = max(offset, f.tell())
+        f.seek(offset)
+
+        current_id: Optional[str] = None
+        answers: List[Tuple[int, Any]] = []
+        for line in f:
+            try:
+                row = next(csv.reader([line.decode("utf-8")]), None)
+                if row:
+                    row_id, qid, answer = row[id_col], int(row[qid_col]), row[answer_col]
+            except (ValueError, IndexError, csv.Error) as e:
+                # Checkpoint offsets never fall inside a record, so end the current one here
+                if current_id is not None:
+                    yield (current_id, answers), offset
+                    current_id, answers = None, []
+                skip(offset, e)
+                offset += len(line)
+                yield None, offset
+                continue
+            if not row:
+                offset += len(line)
+                continue
+            if row_id != current_id and current_id is not None:
+                yield (current_id, answers), offset
+                answers = []
+            current_id = row_id
+            answers.append((qid, answer if answer != "" else None))
+            offset += len(line)
+        if current_id is not None:
+            yield (current_id, answers), offset
+
+def chunked(records: Iterator[Tuple[Optional[Record], int]], size: int) -> Iterator[Tuple[List[Record], int, int]]:
+    """Yield (up to size records, input offset after them, lines skipped among them)"""
+    chunk: List[Record] = []
+    end = skipped = 0
+    for record, end in records:
+        if record is None:
+            skipped += 1
+            continue
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk, end, skipped
+            chunk, skipped = [], 0
+    if chunk or skipped:
+        yield chunk, end, skipped
+
+# Per-process state, set up by _init_worker
+_engine: Optional[PADCoreEngine] = None
+_questionnaire: Optional[QuestionnaireSnapshot] = None
+
+def _init_worker(engine_kwargs: Dict[str, Any], snapshot_path: Path) -> None:
+    global _engine, _questionnaire
+    logging.disable(logging.WARNING)
+    _engine = PADCoreEngine(**engine_kwargs)
+    _questionnaire = QuestionnaireSnapshot(snapshot_path)
+
+def score_chunk(records: List[Record]) -> Dict[str, np.ndarray]:
+    """Map and score one chunk; returns the part's columns"""
+    ids = [record_id for record_id, _ in records]
+    counts = np.zeros(len(records), dtype=np.int64)
+    rows: List[Tuple[float, float, float]] = []
+    for i, (_, answers) in enumerate(records):
+        for delta in _questionnaire.map_answers(answers):
+            rows.append((delta.pleasure, delta.arousal, delta.dominance))
+        counts[i] = len(answers)
+
+    n, e = len(records), len(_engine.emotion_names)
+    columns = {
+        "id": np.array(ids, dtype=str),
+        "valid": counts > 0,
+        "num_questions": counts,
+        "raw_scores": np.full((n, 3), np.nan),
+        "core_triad": np.full((n, 3), np.nan),
+        "prevalence": np.zeros((n, e), dtype=np.uint8),
+        "primary": np.full(n, -1, dtype=np.int16),
+        "secondary": np.full(n, -1, dtype=np.int16),
+    }
+    valid = columns["valid"]
+    if valid.any():
+        offsets = np.concatenate(([0], np.cumsum(counts[valid])))
+        batch = _engine.analyze_many(np.array(rows, dtype=np.float64).reshape(-1, 3), offsets)
+        columns["raw_scores"][valid] = batch.raw_scores
+        columns["core_triad"][valid] = batch.core_triad
+        columns["prevalence"][valid] = batch.prevalence_scores
+        columns["primary"][valid] = batch.ranking[:, 0]
+        if e > 1:
+            columns["secondary"][valid] = batch.ranking[:, 1]
+    return columns
+
+def write_atomic(path: Path, write) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+def load_manifest(out_dir: Path, settings: Dict[str, Any], restart: bool) -> Dict[str, Any]:
+    """The existing manifest to resume from, or a fresh one"""
+    path = out_dir / "manifest.json"
+    if path.exists() and not restart:
+        manifest = json.loads(path.read_text())
+        if manifest.get("settings") != settings:
+            raise SystemExit(f"{out_dir} was written with different settings; use --restart to overwrite it")
+        return manifest
+    for old in out_dir.glob("part-*.npz"):
+        old.unlink()
+    return {"format": MANIFEST_FORMAT, "settings": settings, "parts": [], "records": 0, "skipped": 0,
+            "input_offset": 0, "complete": False}
+
+def save_manifest(out_dir: Path, manifest: Dict[str, Any]) -> None:
+    write_atomic(out_dir / "manifest.json", lambda f: f.write(json.dumps(manifest, indent=2).encode("utf-8")))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", type=Path, help="NDJSON (.ndjson/.jsonl) or CSV (.csv) answer archive")
+    parser.add_argument("output", type=Path, help="Output directory")
+    parser.add_argument("--format", choices=("ndjson", "csv"), help="Input format (default: from the file extension)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=20000, help="Records per chunk / output part")
+    parser.add_argument("--emotions", type=Path, help="JSON emotion catalog {name: [P, A, D]} (default: built-in)")
+    parser.add_argument("--normalization", choices=("question_based", "theoretical_range"), default="question_based")
+    parser.add_argument("--restart", action="store_true", help="Discard existing output instead of resuming")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.input.suffix.lower() == ".csv" else "ndjson")
+    catalog = json.loads(args.emotions.read_text()) if args.emotions else None
+    engine_kwargs = {"normalization_method": NormalizationMethod(args.normalization), "emotion_coordinates": catalog}
+
+    logging.disable(logging.WARNING)
+    store = QuestionnaireStore(
+        BASE_DIR / "question_likert.json",
+        BASE_DIR / "question_scene.json",
+        Path(os.environ.get("PAD_COMPILED_DIR", BASE_DIR / "compiled")),
+    )
+    questionnaire = store.current()
+    engine = PADCoreEngine(**engine_kwargs)
+
+    settings = {
+        "input": str(args.input.resolve()),
+        "input_format": fmt,
+        "chunk_size": args.chunk_size,
+        "normalization": args.normalization,
+        "catalog_version": engine.catalog_version,
+        "questionnaire_version": questionnaire.version,
+    }
+    args.output.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(args.output, settings, args.restart)
+    manifest["emotion_names"] = engine.emotion_names
+    if manifest["complete"]:
+        print(f"{args.output} is already complete ({manifest['records']} records)", file=sys.stderr)
+        return
+
+    total_bytes = args.input.stat().st_size
+    reader = read_csv if fmt == "csv" else read_ndjson
+    chunks = chunked(reader(args.input, manifest["input_offset"]), args.chunk_size)
+    resumed_records = manifest["records"]
+    if manifest["input_offset"]:
+        print(f"Resuming at byte {manifest['input_offset']} after {resumed_records} records", file=sys.stderr)
+
+    start = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(
+        args.workers, initializer=_init_worker, initargs=(engine_kwargs, questionnaire.path)
+    ) as pool:
+        # imap returns parts in input order; the end offset and skipped line count
+        # of each chunk are queued as it is sent so the checkpoint advances with the parts
+        ends: List[Tuple[int, int]] = []
+
+        def feed() -> Iterator[List[Record]]:
+            for records, end, skipped in chunks:
+                ends.append((end, skipped))
+                yield records
+
+        for part_columns in pool.imap(score_chunk, feed()):
+            part = f"part-{len(manifest['parts']):05d}.npz"
+            write_atomic(args.output / part, lambda f: np.savez(f, **part_columns))
+            manifest["parts"].append({"file": part, "records": int(part_columns["id"].size)})
+            manifest["records"] += int(part_columns["id"].size)
+            manifest["input_offset"], skipped = ends.pop(0)
+            manifest["skipped"] = manifest.get("skipped", 0) + skipped
+            save_manifest(args.output, manifest)
+
+            done = manifest["records"] - resumed_records
+            elapsed = time.perf_counter() - start
+            print(f"{manifest['records']:>12} records  {manifest['input_offset'] / max(total_bytes, 1):6.1%}  "
+                  f"{done / elapsed:10.0f} records/s", file=sys.stderr)
+
+    manifest["complete"] = True
+    save_manifest(args.output, manifest)
+    elapsed = time.perf_counter() - start
+    done = manifest["records"] - resumed_records
+    print(f"Scored {done} records in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.0f} records/s, "
+          f"{len(manifest['parts'])} parts total, {manifest.get('skipped', 0)} malformed lines skipped)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from metrics import REGISTRY
+
+T = TypeVar("T")
+
+class RequestCoalescer:
+    """
+    Shares one in-flight computation between concurrent identical requests
+
+    The first caller for a key starts the computation; callers arriving while it
+    runs await the same result (or exception) instead of starting their own.
+    Nothing is kept once it finishes, so this is deduplication, not caching.
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: coalescer label on the pad_coalesced_* counters
+        """
+        self.name = name
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._started = REGISTRY.counter("pad_coalesced_calls_total", "Computations started by a request coalescer", coalescer=name)
+        self._joined = REGISTRY.counter("pad_coalesced_requests_total", "Requests served by joining an in-flight computation", coalescer=name)
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await compute() for key, or join the call already in flight for it
+
+        A caller that is cancelled does not cancel the shared computation.
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(compute())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finished(key, done))
+            self._started.inc()
+        else:
+            self._joined.inc()
+        return await asyncio.shield(future)
+
+    def _finished(self, key: Hashable, future: "asyncio.Future[Any]") -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        # Mark the exception retrieved; every waiter has already been handed it
+        if not future.cancelled():
+            future.exception()
@@ -1,14 +1,29 @@
 import math
 import json
-from typing import List, Tuple, Dict, Any, Optional, Union
-from dataclasses import dataclass, asdict
+import os
+import time
+from types import MappingProxyType
+from typing import List, Tuple, Dict, Any, Optional, Union, Sequence
+from dataclasses import dataclass
 from enum import Enum
 import logging
 
-# Set up logging for debugging and monitoring
-logging.basicConfig(level=logging.INFO)
+import numpy as np
+
+from proximity import build_proximity_index, prevalence_from_distance
+from result_cache import ResultCache, catalog_version, result_key
+from metrics import REGISTRY, Histogram
+from quantile_sketch import PADPopulation
+
+# Handlers are configured by the application (app.py), not on import
 logger = logging.getLogger(__name__)
 
+# Normalization constants shared by the scalar and vectorized pipelines
+MAX_CONTRIBUTION_PER_QUESTION = 0.5  # Assumed max |delta| per question (question-based)
+THEORETICAL_RANGE = 20.0  # ±20 for raw scores (theoretical-range)
+# Default coverage of the bootstrap core triad intervals
+CONFIDENCE_LEVEL = 0.9
+
 class ValidationError(Exception):
     """Custom exception for validation errors"""
     pass
@@ -33,7 +48,7 @@ class PADDelta:
             if not isinstance(value, (int, float)):
                 raise ValidationError(f"{dim_name} must be numeric, got {type(value)}")
             if abs(value) > 2.0:  # Reasonable bounds for deltas
-                logger.warning(f"Large {dim_name} delta detected: {value}")
+                logger.warning("Large %s delta detected: %s", dim_name, value)
 
     def to_tuple(self) -> Tuple[float, float, float]:
         """Convert to tuple format"""
@@ -88,6 +103,123 @@ class EmotionScore:
         if not 0 <= self.prevalence_score <= 100:
             raise ValidationError(f"Prevalence score must be 0-100, got {self.prevalence_score}")
 
+def _build_unchecked(cls, **fields):
+    """Create a dataclass instance without running __init__/__post_init__ validation"""
+    obj = object.__new__(cls)
+    obj.__dict__.update(fields)
+    return obj
+
+# analyze_pad_profile steps timed when the engine is instrumented
+PIPELINE_STAGES = ("validate", "raw_scores", "cache_lookup", "normalize", "proximity", "assemble", "confidence")
+
+class _StageClock:
+    """Times consecutive analyze_pad_profile steps into per-stage histograms"""
+    __slots__ = ("_histograms", "_total", "_start", "_mark")
+
+    def __init__(self, histograms: Dict[str, Histogram], total: Histogram):
+        self._histograms = histograms
+        self._total = total
+        self._start = self._mark = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        """Record the time since the previous lap under stage"""
+        now = time.perf_counter()
+        self._histograms[stage].observe(now - self._mark)
+        self._mark = now
+
+    def stop(self) -> None:
+        """Record the whole analysis"""
+        self._total.observe(time.perf_counter() - self._start)
+
+class _NoClock:
+    """Stand-in for _StageClock when instrumentation is off"""
+    __slots__ = ()
+
+    def lap(self, stage: str) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+_NO_CLOCK = _NoClock()
+
+class LazyEmotionScores(Sequence):
+    """
+    Ranked emotion scores backed by (index, distance, prevalence) tuples
+
+    Behaves like the List[EmotionScore] returned by the validated pipeline, but
+    each EmotionScore is only built the first time it is read.
+    """
+    __slots__ = ("_entries", "_names", "_coordinates", "_materialized")
+
+    def __init__(self, entries: List[Tuple[int, float, int]], names: List[str],
+                 coordinates: Dict[str, Tuple[float, float, float]]):
+        self._entries = entries
+        self._names = names
+        self._coordinates = coordinates
+        self._materialized: List[Optional[EmotionScore]] = [None] * len(entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self._entries)))]
+        score = self._materialized[item]
+        if score is None:
+            index, distance, prevalence_score = self._entries[item]
+            name = self._names[index]
+            score = _build_unchecked(
+                EmotionScore,
+                emotion_name=name,
+                prevalence_score=prevalence_score,
+                euclidean_distance=distance,
+                raw_distance=distance,
+                emotion_coordinates=self._coordinates[name]
+            )
+            self._materialized[item] = score
+        return score
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, LazyEmotionScores)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"LazyEmotionScores({len(self._entries)} emotions)"
+
+    def summary(self, n: int) -> List[Tuple[str, int]]:
+        """(emotion name, prevalence) for the top n, without materializing EmotionScores"""
+        return [(self._names[index], prevalence_score) for index, _, prevalence_score in self._entries[:n]]
+
+    def copy(self) -> "LazyEmotionScores":
+        """The same ranking (never modified) with EmotionScores of its own"""
+        return LazyEmotionScores(self._entries, self._names, self._coordinates)
+
+@dataclass
+class PADConfidence:
+    """How stable an analysis is when its answers are resampled"""
+    samples: int                                  # Bootstrap resamples scored
+    level: float                                  # Coverage of the triad intervals
+    primary_probability: Dict[str, float]         # Share of resamples ranking each emotion first (nonzero only, highest first)
+    primary_agreement: float                      # Share of resamples with the result's primary emotion
+    secondary_agreement: float                    # Share of resamples with the result's secondary emotion
+    triad_interval: Dict[str, Tuple[float, float]]  # Percentile interval of each core triad dimension
+    leave_one_out_agreement: Optional[float]      # Share of single-answer removals keeping the primary (None for one answer)
+    pivotal_answers: List[int]                    # Positions of the answers whose removal changes the primary
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "level": self.level,
+            "primary_probability": self.primary_probability,
+            "primary_agreement": self.primary_agreement,
+            "secondary_agreement": self.secondary_agreement,
+            "triad_interval": {dimension: list(bounds) for dimension, bounds in self.triad_interval.items()},
+            "leave_one_out_agreement": self.leave_one_out_agreement,
+            "pivotal_answers": self.pivotal_answers,
+        }
+
 @dataclass
 class PADAnalysisResult:
     """Complete PAD analysis result"""
@@ -97,6 +229,136 @@ class PADAnalysisResult:
     primary_emotion: str
     secondary_emotion: str
     metadata: Dict[str, Any]
+    confidence: Optional[PADConfidence] = None  # Set by analyze_pad_profile(confidence_samples=...)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Result as plain containers, with the same shape as dataclasses.asdict
+
+        Reads the record fields directly instead of deep-copying them.
+        """
+        raw, triad = self.raw_scores, self.core_triad
+        return {
+            "raw_scores": {
+                "pleasure": raw.pleasure,
+                "arousal": raw.arousal,
+                "dominance": raw.dominance,
+                "num_questions": raw.num_questions,
+            },
+            "core_triad": {
+                "pleasure": triad.pleasure,
+                "arousal": triad.arousal,
+                "dominance": triad.dominance,
+                "normalization_method": triad.normalization_method,
+                "original_range": triad.original_range,
+            },
+            "emotion_scores": [
+                {
+                    "emotion_name": s.emotion_name,
+                    "prevalence_score": s.prevalence_score,
+                    "euclidean_distance": s.euclidean_distance,
+                    "raw_distance": s.raw_distance,
+                    "emotion_coordinates": s.emotion_coordinates,
+                }
+                for s in self.emotion_scores
+            ],
+            "primary_emotion": self.primary_emotion,
+            "secondary_emotion": self.secondary_emotion,
+            "metadata": self.metadata,
+            "confidence": self.confidence.to_dict() if self.confidence is not None else None,
+        }
+
+@dataclass
+class PADBatchResult:
+    """Columnar PAD analysis result for N respondents (row i = respondent i)"""
+    raw_scores: np.ndarray           # (N, 3) summed P, A, D
+    num_questions: np.ndarray        # (N,) answers per respondent
+    core_triad: np.ndarray           # (N, 3) normalized P, A, D in [-1, 1]
+    distances: np.ndarray            # (N, E) Euclidean distance to each emotion
+    prevalence_scores: np.ndarray    # (N, E) 0-100 prevalence per emotion
+    ranking: np.ndarray              # (N, E) emotion indices, highest prevalence first
+    emotion_names: List[str]         # Column labels for distances / prevalence_scores
+    normalization_method: str
+
+    @property
+    def primary_emotions(self) -> List[str]:
+        """Primary emotion name per respondent"""
+        return [self.emotion_names[i] for i in self.ranking[:, 0]]
+
+    @property
+    def secondary_emotions(self) -> List[str]:
+        """Secondary emotion name per respondent"""
+        if self.ranking.shape[1] < 2:
+            return ["None"] * self.ranking.shape[0]
+        return [self.emotion_names[i] for i in self.ranking[:, 1]]
+
+# Maximum possible distance in normalized PAD cube [-1,1]³
+MAX_EUCLIDEAN_DISTANCE = math.sqrt(8)  # sqrt((2)² + (2)² + (2)²)
+
+# Predefined emotion coordinates in PAD space (-1 to +1 normalized)
+DEFAULT_EMOTION_COORDINATES: Dict[str, Tuple[float, float, float]] = {
+    "Anger": (-0.7, 0.8, 0.6),      # Low Pleasure, High Arousal, High Dominance
+    "Happy": (0.9, 0.6, 0.7),       # High Pleasure, Med-High Arousal, High Dominance
+    "Joy": (0.9, 0.8, 0.9),         # High Pleasure, High Arousal, High Dominance
+    "Empathy": (0.7, 0.4, 0.3),     # High Pleasure, Med-Low Arousal, Low-Med Dominance
+    "Trust": (0.8, 0.3, 0.5),       # High Pleasure, Low Arousal, Med Dominance
+    "Grief_Loss": (-0.8, -0.6, -0.7), # Very Low Pleasure, Low Arousal, Very Low Dominance
+    "Sadness": (-0.6, -0.4, -0.5),  # Low Pleasure, Low Arousal, Low Dominance
+    "Regret_Guilt": (-0.6, -0.2, -0.5), # Low Pleasure, Slightly Low Arousal, Low Dominance
+    "Anxiety": (-0.4, 0.7, -0.6),   # Low Pleasure, High Arousal, Low Dominance
+    "Fear": (-0.5, 0.8, -0.7),      # Low Pleasure, High Arousal, Very Low Dominance
+    "Greed": (-0.3, 0.6, 0.8),      # Negative Pleasure, High Arousal, Very High Dominance
+    "Patience_Calm": (0.6, -0.4, 0.4), # High Pleasure, Low Arousal, Med Dominance
+    "Serenity": (0.7, -0.7, 0.2),   # High Pleasure, Very Low Arousal, Low-Med Dominance
+    "Excitement": (0.8, 0.9, 0.6),  # High Pleasure, Very High Arousal, High Dominance
+    "Contempt": (-0.2, 0.3, 0.9),   # Low Pleasure, Med Arousal, Very High Dominance
+    "Disgust": (-0.8, 0.2, 0.4),    # Very Low Pleasure, Low-Med Arousal, Med Dominance
+}
+
+# Validation ranges for different components
+VALIDATION_RANGES = MappingProxyType({
+    "delta_range": (-2.0, 2.0),      # Reasonable range for individual deltas
+    "raw_score_range": (-100.0, 100.0),  # Reasonable range for raw scores
+    "normalized_range": (-1.0, 1.0),     # Normalized range
+})
+
+@dataclass(frozen=True)
+class EmotionCatalog:
+    """
+    Immutable compiled emotion catalog
+
+    Engines built from the same catalog share its coordinate table, matrix and
+    proximity index instead of each compiling its own; version is the content
+    hash, so equal catalogs can be deduplicated. The coordinates stay a plain
+    dict so results referencing it can be pickled (scoring pool workers).
+    """
+    coordinates: Dict[str, Tuple[float, float, float]]     # {name: (P, A, D)}; shared, never modified
+    names: Tuple[str, ...]
+    matrix: np.ndarray                                      # (E, 3), read-only
+    version: str
+    proximity_index: Any
+
+    @classmethod
+    def compile(cls, emotion_coordinates: Dict[str, Tuple[float, float, float]], proximity_backend: str = "auto",
+                proximity_options: Optional[Dict[str, Any]] = None) -> "EmotionCatalog":
+        """
+        Validate a catalog and build its arrays and proximity index
+
+        Raises:
+            ValidationError: If the catalog is empty or a coordinate is not a PAD point in [-1, 1]³
+        """
+        coordinates = PADCoreEngine._validate_emotion_catalog(emotion_coordinates)
+        matrix = np.array(list(coordinates.values()), dtype=np.float64)
+        matrix.setflags(write=False)
+        return cls(
+            coordinates=coordinates,
+            names=tuple(coordinates),
+            matrix=matrix,
+            version=catalog_version(coordinates),
+            proximity_index=build_proximity_index(
+                list(coordinates.values()), MAX_EUCLIDEAN_DISTANCE, proximity_backend, **(proximity_options or {})
+            ),
+        )
 
 class PADCoreEngine:
     """
@@ -110,46 +372,114 @@ class PADCoreEngine:
     5. Provides comprehensive analysis results
     """
 
-    def __init__(self, normalization_method: NormalizationMethod = NormalizationMethod.QUESTION_BASED):
+    def __init__(self, normalization_method: NormalizationMethod = NormalizationMethod.QUESTION_BASED,
+                 emotion_coordinates: Optional[Dict[str, Tuple[float, float, float]]] = None,
+                 proximity_backend: str = "auto",
+                 proximity_options: Optional[Dict[str, Any]] = None,
+                 trusted: bool = False,
+                 result_cache: Optional[ResultCache] = None,
+                 instrumented: bool = False,
+                 population: Optional[PADPopulation] = None,
+                 population_snapshot: Optional[Union[str, os.PathLike]] = None,
+                 catalog: Optional["EmotionCatalog"] = None):
         """
         Initialize the PAD Core Engine
 
         Args:
             normalization_method: Method to use for PAD score normalization
+            emotion_coordinates: Optional custom emotion catalog {name: (P, A, D)} in [-1, 1]³;
+                defaults to the built-in 16 emotions
+            proximity_backend: Nearest-emotion backend name from proximity.PROXIMITY_BACKENDS,
+                or "auto" to pick brute force / k-d tree by catalog size
+            proximity_options: Backend settings, e.g. {"resolution": 201, "cache_dir": ...}
+                for the precomputed "lattice" backend
+            trusted: Fast mode for inputs already validated at the boundary. Deltas
+                (PADDelta objects or numeric triples) are summed without per-item
+                validation, result records skip __post_init__ checks and emotion
+                scores are returned as a LazyEmotionScores sequence
+            result_cache: Optional ResultCache; analyses whose raw PAD sums were seen
+                before skip normalization and proximity scoring
+            instrumented: Time each analyze_pad_profile step into the pad_stage_seconds
+                histograms of metrics.REGISTRY
+            population: PERCENTILE normalization only; the population sketches that
+                scores are ranked against and added to (a new, empty one by default)
+            population_snapshot: PERCENTILE normalization only; a PADPopulation.save()
+                file to start from when population is not given and the file exists
+            catalog: Compiled EmotionCatalog to share with other engines, instead of
+                compiling emotion_coordinates with proximity_backend / proximity_options
         """
         self.normalization_method = normalization_method
+        self.trusted = trusted
+        self.result_cache = result_cache
+        # Per-call pipeline records; trusted engines serve the hot path, so they log them at DEBUG only
+        self._call_log_level = logging.DEBUG if trusted else logging.INFO
+
+        # Population distribution for percentile normalization
+        self.population: Optional[PADPopulation] = None
+        if normalization_method == NormalizationMethod.PERCENTILE:
+            if population is None and population_snapshot is not None and os.path.exists(population_snapshot):
+                population = PADPopulation.load(population_snapshot)
+                logger.info("Loaded PAD population snapshot with %d respondents", population.count)
+            self.population = population or PADPopulation()
+        self._stage_seconds: Optional[Dict[str, Histogram]] = None
+        if instrumented:
+            self._stage_seconds = {
+                stage: REGISTRY.histogram("pad_stage_seconds", "Time spent in each analyze_pad_profile step", stage=stage)
+                for stage in PIPELINE_STAGES
+            }
+            self._analysis_seconds = REGISTRY.histogram("pad_analysis_seconds", "Time per analyze_pad_profile call")
 
-        # Predefined emotion coordinates in PAD space (-1 to +1 normalized)
-        self.emotion_coordinates = {
-            "Anger": (-0.7, 0.8, 0.6),      # Low Pleasure, High Arousal, High Dominance
-            "Happy": (0.9, 0.6, 0.7),       # High Pleasure, Med-High Arousal, High Dominance
-            "Joy": (0.9, 0.8, 0.9),         # High Pleasure, High Arousal, High Dominance
-            "Empathy": (0.7, 0.4, 0.3),     # High Pleasure, Med-Low Arousal, Low-Med Dominance
-            "Trust": (0.8, 0.3, 0.5),       # High Pleasure, Low Arousal, Med Dominance
-            "Grief_Loss": (-0.8, -0.6, -0.7), # Very Low Pleasure, Low Arousal, Very Low Dominance
-            "Sadness": (-0.6, -0.4, -0.5),  # Low Pleasure, Low Arousal, Low Dominance
-            "Regret_Guilt": (-0.6, -0.2, -0.5), # Low Pleasure, Slightly Low Arousal, Low Dominance
-            "Anxiety": (-0.4, 0.7, -0.6),   # Low Pleasure, High Arousal, Low Dominance
-            "Fear": (-0.5, 0.8, -0.7),      # Low Pleasure, High Arousal, Very Low Dominance
-            "Greed": (-0.3, 0.6, 0.8),      # Negative Pleasure, High Arousal, Very High Dominance
-            "Patience_Calm": (0.6, -0.4, 0.4), # High Pleasure, Low Arousal, Med Dominance
-            "Serenity": (0.7, -0.7, 0.2),   # High Pleasure, Very Low Arousal, Low-Med Dominance
-            "Excitement": (0.8, 0.9, 0.6),  # High Pleasure, Very High Arousal, High Dominance
-            "Contempt": (-0.2, 0.3, 0.9),   # Low Pleasure, Med Arousal, Very High Dominance
-            "Disgust": (-0.8, 0.2, 0.4),    # Very Low Pleasure, Low-Med Arousal, Med Dominance
-        }
+        if catalog is None:
+            catalog = EmotionCatalog.compile(
+                DEFAULT_EMOTION_COORDINATES if emotion_coordinates is None else emotion_coordinates,
+                proximity_backend, proximity_options,
+            )
+        elif emotion_coordinates is not None or proximity_options is not None:
+            raise ValueError("Pass either a compiled catalog or emotion_coordinates / proximity_options")
+        self.catalog = catalog
+
+        # Shared, read-only views of the catalog
+        self.emotion_coordinates = catalog.coordinates
+        self.emotion_names = list(catalog.names)
+        self.emotion_matrix = catalog.matrix
+        self.catalog_version = catalog.version
+        self.proximity_index = catalog.proximity_index
 
         # Maximum possible distance in normalized PAD cube [-1,1]³
-        self.max_euclidean_distance = math.sqrt(8)  # sqrt((2)² + (2)² + (2)²)
+        self.max_euclidean_distance = MAX_EUCLIDEAN_DISTANCE
 
         # Validation ranges for different components
-        self.validation_ranges = {
-            "delta_range": (-2.0, 2.0),      # Reasonable range for individual deltas
-            "raw_score_range": (-100.0, 100.0),  # Reasonable range for raw scores
-            "normalized_range": (-1.0, 1.0),     # Normalized range
-        }
+        self.validation_ranges = VALIDATION_RANGES
 
-        logger.info(f"PAD Core Engine initialized with {len(self.emotion_coordinates)} emotions")
+        logger.info("PAD Core Engine initialized with %d emotions", len(self.emotion_coordinates))
+
+    @staticmethod
+    def _validate_emotion_catalog(catalog: Dict[str, Tuple[float, float, float]]) -> Dict[str, Tuple[float, float, float]]:
+        """
+        Validate a custom emotion catalog
+
+        Raises:
+            ValidationError: If the catalog is empty or a coordinate is not a PAD point in [-1, 1]³
+        """
+        if not catalog:
+            raise ValidationError("Emotion catalog cannot be empty")
+
+        validated = {}
+        for name, coords in catalog.items():
+            try:
+                point = tuple(float(c) for c in coords)
+            except (ValueError, TypeError) as e:
+                raise ValidationError(f"Invalid coordinates for emotion {name}: {e}")
+            if len(point) != 3 or not all(-1.0 <= c <= 1.0 for c in point):
+                raise ValidationError(f"Emotion {name} must be a PAD point in [-1, 1]³, got {coords}")
+            validated[name] = point
+        return validated
+
+    def _record(self, cls, **fields):
+        """Build a result record, skipping per-object validation in trusted mode"""
+        if self.trusted:
+            return _build_unchecked(cls, **fields)
+        return cls(**fields)
 
     def validate_input_deltas(self, deltas: List[Union[PADDelta, Tuple[float, float, float]]]) -> List[PADDelta]:
         """
@@ -187,7 +517,7 @@ class PADCoreEngine:
             except (ValueError, TypeError) as e:
                 raise ValidationError(f"Error processing delta at index {i}: {e}")
 
-        logger.info(f"Validated {len(validated_deltas)} input deltas")
+        logger.info("Validated %d input deltas", len(validated_deltas))
         return validated_deltas
 
     def calculate_raw_pad_scores(self, deltas: List[PADDelta]) -> RawPADScore:
@@ -215,17 +545,18 @@ class PADCoreEngine:
         for dim_name, value in [("pleasure", total_pleasure), ("arousal", total_arousal), ("dominance", total_dominance)]:
             min_val, max_val = self.validation_ranges["raw_score_range"]
             if not min_val <= value <= max_val:
-                logger.warning(f"Raw {dim_name} score {value} outside expected range [{min_val}, {max_val}]")
+                logger.warning("Raw %s score %s outside expected range [%s, %s]", dim_name, value, min_val, max_val)
 
-        logger.info(f"Calculated raw PAD scores from {len(deltas)} questions: P={total_pleasure:.2f}, A={total_arousal:.2f}, D={total_dominance:.2f}")
+        logger.info("Calculated raw PAD scores from %d questions: P=%.2f, A=%.2f, D=%.2f", len(deltas), total_pleasure, total_arousal, total_dominance)
         return raw_scores
 
-    def normalize_to_core_triad(self, raw_scores: RawPADScore) -> CorePADTriad:
+    def normalize_to_core_triad(self, raw_scores: RawPADScore, observe: bool = True) -> CorePADTriad:
         """
         Normalize raw PAD scores to Core PAD Triad (-1 to +1 range)
 
         Args:
             raw_scores: Raw PAD scores to normalize
+            observe: PERCENTILE only; add raw_scores to the population after ranking it
 
         Returns:
             CorePADTriad with normalized values
@@ -234,6 +565,8 @@ class PADCoreEngine:
             return self._normalize_question_based(raw_scores)
         elif self.normalization_method == NormalizationMethod.THEORETICAL_RANGE:
             return self._normalize_theoretical_range(raw_scores)
+        elif self.normalization_method == NormalizationMethod.PERCENTILE:
+            return self._normalize_percentile(raw_scores, observe)
         else:
             raise ValidationError(f"Unsupported normalization method: {self.normalization_method}")
 
@@ -244,8 +577,7 @@ class PADCoreEngine:
         Assumes each question can contribute approximately ±0.5 to each dimension
         """
         # Estimate theoretical range based on number of questions
-        max_contribution_per_question = 0.5
-        theoretical_max = raw_scores.num_questions * max_contribution_per_question
+        theoretical_max = raw_scores.num_questions * MAX_CONTRIBUTION_PER_QUESTION
         theoretical_min = -theoretical_max
 
         def normalize_dimension(raw_value: float) -> float:
@@ -262,7 +594,8 @@ class PADCoreEngine:
 
             return normalized
 
-        core_triad = CorePADTriad(
+        core_triad = self._record(
+            CorePADTriad,
             pleasure=normalize_dimension(raw_scores.pleasure),
             arousal=normalize_dimension(raw_scores.arousal),
             dominance=normalize_dimension(raw_scores.dominance),
@@ -270,7 +603,7 @@ class PADCoreEngine:
             original_range=(theoretical_min, theoretical_max)
         )
 
-        logger.info(f"Normalized using question-based method: P={core_triad.pleasure:.3f}, A={core_triad.arousal:.3f}, D={core_triad.dominance:.3f}")
+        logger.log(self._call_log_level, "Normalized using question-based method: P=%.3f, A=%.3f, D=%.3f", core_triad.pleasure, core_triad.arousal, core_triad.dominance)
         return core_triad
 
     def _normalize_theoretical_range(self, raw_scores: RawPADScore) -> CorePADTriad:
@@ -278,7 +611,7 @@ class PADCoreEngine:
         Normalize based on fixed theoretical range
         """
         # Fixed theoretical range (can be adjusted based on empirical data)
-        theoretical_range = 20.0  # ±20 for raw scores
+        theoretical_range = THEORETICAL_RANGE
 
         def normalize_dimension(raw_value: float) -> float:
             # Clamp to theoretical range
@@ -286,7 +619,8 @@ class PADCoreEngine:
             # Normalize to [-1, 1]
             return clamped_value / theoretical_range
 
-        core_triad = CorePADTriad(
+        core_triad = self._record(
+            CorePADTriad,
             pleasure=normalize_dimension(raw_scores.pleasure),
             arousal=normalize_dimension(raw_scores.arousal),
             dominance=normalize_dimension(raw_scores.dominance),
@@ -294,22 +628,69 @@ class PADCoreEngine:
             original_range=(-theoretical_range, theoretical_range)
         )
 
-        logger.info(f"Normalized using theoretical range method: P={core_triad.pleasure:.3f}, A={core_triad.arousal:.3f}, D={core_triad.dominance:.3f}")
+        logger.log(self._call_log_level, "Normalized using theoretical range method: P=%.3f, A=%.3f, D=%.3f", core_triad.pleasure, core_triad.arousal, core_triad.dominance)
+        return core_triad
+
+    def _normalize_percentile(self, raw_scores: RawPADScore, observe: bool) -> CorePADTriad:
+        """
+        Normalize by percentile rank within the population seen so far
+
+        Each dimension's mean delta per answer is ranked against the population
+        sketch (rank 0 -> -1, median -> 0, rank 1 -> +1) and, if observe, then
+        added to it.
+        """
+        n = raw_scores.num_questions
+        means = tuple(value / n if n else 0.0 for value in raw_scores.to_tuple())
+        ranks = self.population.rank_and_add(means) if observe else self.population.rank(means)
+
+        core_triad = self._record(
+            CorePADTriad,
+            pleasure=ranks[0] * 2.0 - 1.0,
+            arousal=ranks[1] * 2.0 - 1.0,
+            dominance=ranks[2] * 2.0 - 1.0,
+            normalization_method="percentile",
+            original_range=(0.0, 1.0)  # percentile ranks
+        )
+
+        logger.log(self._call_log_level, "Normalized using percentile method: P=%.3f, A=%.3f, D=%.3f", core_triad.pleasure, core_triad.arousal, core_triad.dominance)
         return core_triad
 
-    def calculate_emotion_proximity_scores(self, core_triad: CorePADTriad) -> List[EmotionScore]:
+    def calculate_emotion_proximity_scores(self, core_triad: CorePADTriad, top_k: Optional[int] = None) -> List[EmotionScore]:
         """
         Calculate emotion prevalence scores using Euclidean distance
 
         Args:
             core_triad: User's normalized PAD coordinates
+            top_k: Optional number of best emotions to return; uses the proximity
+                index's partial selection instead of scoring and sorting the full catalog
 
         Returns:
             List of EmotionScore objects sorted by prevalence (highest first)
         """
-        emotion_scores = []
         user_coords = core_triad.to_tuple()
 
+        if self.trusted:
+            entries = self.proximity_index.top_k(user_coords, len(self.emotion_names) if top_k is None else top_k)
+            return LazyEmotionScores(entries, self.emotion_names, self.emotion_coordinates)
+
+        if top_k is not None:
+            names = self.emotion_names
+            emotion_scores = [
+                EmotionScore(
+                    emotion_name=names[index],
+                    prevalence_score=prevalence_score,
+                    euclidean_distance=distance,
+                    raw_distance=distance,
+                    emotion_coordinates=self.emotion_coordinates[names[index]]
+                )
+                for index, distance, prevalence_score in self.proximity_index.top_k(user_coords, top_k)
+            ]
+            if emotion_scores:
+                logger.info("Calculated top %d emotion proximity scores. Primary: %s (%d%%)", top_k, emotion_scores[0].emotion_name, emotion_scores[0].prevalence_score)
+            return emotion_scores
+
+        emotion_scores = []
+
         for emotion_name, emotion_coords in self.emotion_coordinates.items():
             # Calculate Euclidean distance
             distance = math.sqrt(
@@ -320,11 +701,7 @@ class PADCoreEngine:
 
             # Convert distance to prevalence score (0-100)
             # Closer distance = higher score
-            # Distance 0 = 100%, Max distance = 0%
-            prevalence_score = round((1 - (distance / self.max_euclidean_distance)) * 100)
-
-            # Ensure score is within bounds
-            prevalence_score = max(0, min(100, prevalence_score))
+            prevalence_score = prevalence_from_distance(distance, self.max_euclidean_distance)
 
             emotion_score = EmotionScore(
                 emotion_name=emotion_name,
@@ -339,45 +716,193 @@ class PADCoreEngine:
         # Sort by prevalence score (highest first)
         emotion_scores.sort(key=lambda x: x.prevalence_score, reverse=True)
 
-        logger.info(f"Calculated emotion proximity scores. Primary: {emotion_scores[0].emotion_name} ({emotion_scores[0].prevalence_score}%)")
+        logger.info("Calculated emotion proximity scores. Primary: %s (%d%%)", emotion_scores[0].emotion_name, emotion_scores[0].prevalence_score)
         return emotion_scores
 
-    def analyze_pad_profile(self, input_deltas: List[Union[PADDelta, Tuple[float, float, float]]]) -> PADAnalysisResult:
+    def prevalence_vector(self, core_triad: CorePADTriad) -> np.ndarray:
+        """
+        Prevalence score of every catalog emotion for a core triad, in emotion_names
+        order (the same values as a row of analyze_many's prevalence_scores)
+        """
+        diff = np.asarray(core_triad.to_tuple(), dtype=np.float64) - self.emotion_matrix
+        distances = np.sqrt(diff[:, 0] ** 2 + diff[:, 1] ** 2 + diff[:, 2] ** 2)
+        return np.clip(np.round((1 - distances / self.max_euclidean_distance) * 100), 0, 100).astype(np.int64)
+
+    def analyze_pad_profile(self, input_deltas: List[Union[PADDelta, Tuple[float, float, float]]],
+                            top_k: Optional[int] = None, confidence_samples: int = 0,
+                            confidence_seed: Optional[int] = None) -> PADAnalysisResult:
         """
         Complete PAD analysis pipeline
 
         Args:
             input_deltas: Raw PAD deltas from user responses
+            top_k: Optional number of emotion scores to keep (all emotions if None)
+            confidence_samples: Bootstrap resamples for result.confidence (0 = none);
+                more samples give steadier estimates for more CPU, see estimate_confidence
+            confidence_seed: Seed for the resampling, for reproducible confidence
 
         Returns:
             PADAnalysisResult with complete analysis
         """
-        logger.info("Starting PAD analysis pipeline")
+        logger.log(self._call_log_level, "Starting PAD analysis pipeline")
+        clock = _NO_CLOCK if self._stage_seconds is None else _StageClock(self._stage_seconds, self._analysis_seconds)
+
+        if self.trusted:
+            # Steps 1-2: Inputs were validated at the boundary; sum them directly
+            raw_scores = self._sum_trusted_deltas(input_deltas)
+        else:
+            # Step 1: Validate input
+            validated_deltas = self.validate_input_deltas(input_deltas)
+            clock.lap("validate")
+
+            # Step 2: Calculate raw PAD scores
+            raw_scores = self.calculate_raw_pad_scores(validated_deltas)
+            input_deltas = validated_deltas
+        clock.lap("raw_scores")
+
+        result = self._analyze_raw(raw_scores, top_k, clock)
+        if confidence_samples > 0:
+            deltas = np.array([d.to_tuple() if type(d) is PADDelta else d for d in input_deltas], dtype=np.float64)
+            result.confidence = self.estimate_confidence(deltas, result, confidence_samples, seed=confidence_seed)
+            clock.lap("confidence")
+        return result
+
+    def estimate_confidence(self, deltas: np.ndarray, result: PADAnalysisResult, samples: int,
+                            level: float = CONFIDENCE_LEVEL, seed: Optional[int] = None) -> PADConfidence:
+        """
+        Bootstrap and leave-one-out stability of an analysis
+
+        Each bootstrap resample draws len(deltas) answers with replacement. Its
+        raw sums are one row of a (samples, n) matrix of draw counts times the
+        (n, 3) deltas, so all resamples, plus the n leave-one-out sums, are scored
+        in a single score_raw_many batch. Cost grows linearly with samples
+        (roughly 1.5 ms per 1000 on one core with the default catalog).
+
+        Args:
+            deltas: (n, 3) deltas the result was computed from
+            result: The analysis of deltas
+            samples: Bootstrap resamples
+            level: Coverage of the core triad intervals
+            seed: Seed for the resampling
+
+        Returns:
+            PADConfidence for result
+
+        Raises:
+            ValidationError: If samples is not positive or level is not in (0, 1)
+        """
+        if samples < 1:
+            raise ValidationError(f"Confidence samples must be positive, got {samples}")
+        if not 0 < level < 1:
+            raise ValidationError(f"Confidence level must be between 0 and 1, got {level}")
+        n = len(deltas)
+        rng = np.random.default_rng(seed)
+        # Draw counts per resample via one bincount (much faster than rng.multinomial)
+        draws = rng.integers(0, n, size=(samples, n)) + np.arange(samples)[:, np.newaxis] * n
+        raw = np.bincount(draws.ravel(), minlength=samples * n).reshape(samples, n) @ deltas
+        counts = np.full(samples, n)
+        if n > 1:
+            # Leave-one-out sums: the total less each answer
+            raw = np.vstack([raw, deltas.sum(axis=0) - deltas])
+            counts = np.concatenate([counts, np.full(n, n - 1)])
+        # Resamples are hypothetical, so they never join a percentile population
+        batch = self.score_raw_many(raw, counts, observe=False)
+
+        names = batch.emotion_names
+        primary_index = names.index(result.primary_emotion)
+        boot_primary = batch.ranking[:samples, 0]
+        frequencies = np.bincount(boot_primary, minlength=len(names)) / samples
+        order = np.argsort(-frequencies, kind="stable")
+        secondary_agreement = 0.0
+        if batch.ranking.shape[1] > 1 and result.secondary_emotion in names:
+            secondary_agreement = float(np.mean(batch.ranking[:samples, 1] == names.index(result.secondary_emotion)))
+
+        bounds = np.quantile(batch.core_triad[:samples], [(1 - level) / 2, (1 + level) / 2], axis=0)
+        loo_agreement, pivotal = None, []
+        if n > 1:
+            loo_primary = batch.ranking[samples:, 0]
+            loo_agreement = float(np.mean(loo_primary == primary_index))
+            pivotal = np.flatnonzero(loo_primary != primary_index).tolist()
+
+        return PADConfidence(
+            samples=samples,
+            level=level,
+            primary_probability={names[i]: float(frequencies[i]) for i in order if frequencies[i] > 0},
+            primary_agreement=float(frequencies[primary_index]),
+            secondary_agreement=secondary_agreement,
+            triad_interval={
+                dimension: (float(bounds[0, i]), float(bounds[1, i]))
+                for i, dimension in enumerate(("pleasure", "arousal", "dominance"))
+            },
+            leave_one_out_agreement=loo_agreement,
+            pivotal_answers=pivotal,
+        )
+
+    def analyze_raw_pad_scores(self, raw_scores: RawPADScore, top_k: Optional[int] = None,
+                               observe: bool = True) -> PADAnalysisResult:
+        """
+        Run the pipeline from already-summed raw scores (steps 3-6)
 
-        # Step 1: Validate input
-        validated_deltas = self.validate_input_deltas(input_deltas)
+        Lets callers that keep a running RawPADScore, such as live scoring
+        sessions, skip re-summing every answer.
 
-        # Step 2: Calculate raw PAD scores
-        raw_scores = self.calculate_raw_pad_scores(validated_deltas)
+        Args:
+            raw_scores: Summed PAD deltas and the number of answers they cover
+            top_k: Optional number of emotion scores to keep (all emotions if None)
+            observe: PERCENTILE only; add raw_scores to the population (pass False
+                for provisional results such as previews)
+
+        Returns:
+            PADAnalysisResult with complete analysis
+
+        Raises:
+            ValidationError: If raw_scores covers no answers
+        """
+        if raw_scores.num_questions <= 0:
+            raise ValidationError("Input deltas cannot be empty")
+        clock = _NO_CLOCK if self._stage_seconds is None else _StageClock(self._stage_seconds, self._analysis_seconds)
+        return self._analyze_raw(raw_scores, top_k, clock, observe)
+
+    def _analyze_raw(self, raw_scores: RawPADScore, top_k: Optional[int],
+                     clock: Union[_StageClock, _NoClock], observe: bool = True) -> PADAnalysisResult:
+        """Steps 3-6 of analyze_pad_profile, with the result cache in front"""
+        # Percentile results depend on the population so far, so they are never cached
+        use_cache = self.result_cache is not None and self.population is None
+        if use_cache:
+            cache_key = result_key(raw_scores.to_tuple(), raw_scores.num_questions,
+                                   self.normalization_method.value, self.catalog_version, top_k)
+            cached = self.result_cache.get(cache_key)
+            clock.lap("cache_lookup")
+            if cached is not None:
+                clock.stop()
+                result = self._copy_result(cached, raw_scores)
+                result.metadata["analysis_timestamp"] = time.time()
+                return result
 
         # Step 3: Normalize to Core PAD Triad
-        core_triad = self.normalize_to_core_triad(raw_scores)
+        core_triad = self.normalize_to_core_triad(raw_scores, observe)
+        clock.lap("normalize")
 
         # Step 4: Calculate emotion proximity scores
-        emotion_scores = self.calculate_emotion_proximity_scores(core_triad)
+        emotion_scores = self.calculate_emotion_proximity_scores(core_triad, top_k)
+        clock.lap("proximity")
 
         # Step 5: Extract primary and secondary emotions
-        primary_emotion = emotion_scores[0].emotion_name
-        secondary_emotion = emotion_scores[1].emotion_name if len(emotion_scores) > 1 else "None"
+        if isinstance(emotion_scores, LazyEmotionScores):
+            top_3_emotions = emotion_scores.summary(3)
+        else:
+            top_3_emotions = [(score.emotion_name, score.prevalence_score) for score in emotion_scores[:3]]
+        primary_emotion = top_3_emotions[0][0]
+        secondary_emotion = top_3_emotions[1][0] if len(top_3_emotions) > 1 else "None"
 
         # Step 6: Compile metadata
         metadata = {
-            "total_questions": len(validated_deltas),
+            "total_questions": raw_scores.num_questions,
             "normalization_method": self.normalization_method.value,
             "max_distance": self.max_euclidean_distance,
             "triad_magnitude": core_triad.magnitude(),
-            "top_3_emotions": [(score.emotion_name, score.prevalence_score) for score in emotion_scores[:3]],
-            "analysis_timestamp": None  # Could add datetime if needed
+            "top_3_emotions": top_3_emotions,
+            "analysis_timestamp": time.time()  # Seconds since the epoch
         }
 
         result = PADAnalysisResult(
@@ -389,9 +914,189 @@ class PADCoreEngine:
             metadata=metadata
         )
 
-        logger.info(f"PAD analysis complete. Primary emotion: {primary_emotion}")
+        if use_cache:
+            # Store a private copy; callers may add to the returned metadata
+            self.result_cache.put(cache_key, self._copy_result(result, raw_scores))
+        clock.lap("assemble")
+        clock.stop()
+
+        logger.log(self._call_log_level, "PAD analysis complete. Primary emotion: %s", primary_emotion)
         return result
 
+    @staticmethod
+    def _copy_result(result: PADAnalysisResult, raw_scores: RawPADScore) -> PADAnalysisResult:
+        """
+        A copy of result with raw_scores that shares nothing mutable with it, so
+        a caller changing a cached result's copy never changes the cache entry
+        """
+        emotion_scores = result.emotion_scores
+        if isinstance(emotion_scores, LazyEmotionScores):
+            emotion_scores = emotion_scores.copy()
+        else:
+            emotion_scores = [_build_unchecked(EmotionScore, **vars(score)) for score in emotion_scores]
+        return PADAnalysisResult(
+            raw_scores=raw_scores,
+            core_triad=_build_unchecked(CorePADTriad, **vars(result.core_triad)),
+            emotion_scores=emotion_scores,
+            primary_emotion=result.primary_emotion,
+            secondary_emotion=result.secondary_emotion,
+            # Values are scalars except top_3_emotions, a list of tuples
+            metadata={key: value.copy() if isinstance(value, (list, dict)) else value
+                      for key, value in result.metadata.items()}
+        )
+
+    def _sum_trusted_deltas(self, deltas: List[Union[PADDelta, Tuple[float, float, float]]]) -> RawPADScore:
+        """
+        Sum pre-validated deltas without building intermediate PADDelta objects
+
+        Uses the same left-to-right order as calculate_raw_pad_scores.
+        """
+        if not deltas:
+            raise ValidationError("Input deltas cannot be empty")
+
+        total_pleasure = total_arousal = total_dominance = 0
+        for delta in deltas:
+            if type(delta) is PADDelta:
+                total_pleasure += delta.pleasure
+                total_arousal += delta.arousal
+                total_dominance += delta.dominance
+            else:
+                total_pleasure += delta[0]
+                total_arousal += delta[1]
+                total_dominance += delta[2]
+
+        return RawPADScore(
+            pleasure=total_pleasure,
+            arousal=total_arousal,
+            dominance=total_dominance,
+            num_questions=len(deltas)
+        )
+
+    def analyze_many(self, deltas: Union[np.ndarray, List[Any]], offsets: Optional[Union[np.ndarray, List[int]]] = None) -> PADBatchResult:
+        """
+        Vectorized PAD analysis pipeline for many respondents at once
+
+        Produces the same scores and rankings as calling analyze_pad_profile per
+        respondent (distances agree to floating-point rounding), but as column
+        arrays instead of N PADAnalysisResult object graphs.
+
+        Args:
+            deltas: Either an (N, Q, 3) array with Q answers per respondent, or,
+                together with offsets, a ragged (M, 3) array of all answers
+                stacked respondent after respondent
+            offsets: Optional (N + 1,) row boundaries into a ragged deltas array;
+                respondent i owns rows offsets[i]:offsets[i + 1]
+
+        Returns:
+            PADBatchResult with per-respondent columns
+
+        Raises:
+            ValidationError: If the arrays are malformed or a respondent has no answers
+        """
+        try:
+            values = np.asarray(deltas, dtype=np.float64)
+        except (ValueError, TypeError) as e:
+            raise ValidationError(f"Deltas must be numeric: {e}")
+
+        if offsets is None:
+            if values.ndim != 3 or values.shape[2] != 3:
+                raise ValidationError(f"Expected an (N, Q, 3) delta array, got shape {values.shape}")
+            if values.shape[1] == 0:
+                raise ValidationError("Input deltas cannot be empty")
+            dense = values
+            counts = np.full(values.shape[0], values.shape[1], dtype=np.int64)
+        else:
+            bounds = np.asarray(offsets, dtype=np.int64)
+            if values.ndim != 2 or values.shape[1] != 3:
+                raise ValidationError(f"Expected an (M, 3) delta array with offsets, got shape {values.shape}")
+            if bounds.ndim != 1 or bounds.size < 1 or bounds[0] != 0 or bounds[-1] != values.shape[0]:
+                raise ValidationError("Offsets must start at 0 and end at the number of delta rows")
+            counts = np.diff(bounds)
+            if (counts <= 0).any():
+                raise ValidationError("Input deltas cannot be empty")
+            # Scatter the ragged rows into a zero-padded (N, Qmax, 3) block
+            dense = np.zeros((counts.size, int(counts.max(initial=0)), 3))
+            rows = np.repeat(np.arange(counts.size), counts)
+            cols = np.arange(values.shape[0]) - np.repeat(bounds[:-1], counts)
+            dense[rows, cols] = values
+
+        # Accumulate answer by answer so every respondent is summed in the same
+        # order as calculate_raw_pad_scores (padding adds exact zeros)
+        raw = np.zeros((dense.shape[0], 3))
+        for j in range(dense.shape[1]):
+            raw += dense[:, j, :]
+
+        batch = self.score_raw_many(raw, counts)
+        logger.info("Vectorized PAD analysis complete for %d respondents", raw.shape[0])
+        return batch
+
+    def score_raw_many(self, raw: np.ndarray, counts: np.ndarray, observe: bool = True) -> PADBatchResult:
+        """
+        Normalize and score already-summed raw PAD scores, e.g. hypothetical totals
+
+        Args:
+            raw: (N, 3) summed P, A, D per respondent
+            counts: (N,) answers behind each sum
+            observe: PERCENTILE normalization only; add the scores to the population
+
+        Returns:
+            PADBatchResult with per-respondent columns
+        """
+        raw = np.asarray(raw, dtype=np.float64)
+        counts = np.asarray(counts, dtype=np.int64)
+        core = self._normalize_many(raw, counts, observe)
+
+        # (N, E) distance matrix, same operation order as the scalar path; built one
+        # dimension at a time in reused buffers rather than through an (N, E, 3)
+        # difference array, from contiguous per-dimension columns
+        columns, emotion_columns = core.T.copy(), self.emotion_matrix.T
+        squared = np.zeros((len(core), len(self.emotion_names)))
+        term = np.empty_like(squared)
+        for i in range(3):
+            np.subtract(columns[i, :, np.newaxis], emotion_columns[i], out=term)
+            np.multiply(term, term, out=term)
+            squared += term
+        distances = np.sqrt(squared, out=squared)
+        prevalence = np.clip(np.round((1 - distances / self.max_euclidean_distance) * 100), 0, 100).astype(np.int64)
+
+        # Catalog order among equal scores, like list.sort(reverse=True): the column index
+        # breaks ties in the key, so the (faster) unstable sort gives the stable order
+        num_emotions = len(self.emotion_names)
+        ranking = np.argsort((100 - prevalence) * num_emotions + np.arange(num_emotions), axis=1)
+
+        return PADBatchResult(
+            raw_scores=raw,
+            num_questions=counts,
+            core_triad=core,
+            distances=distances,
+            prevalence_scores=prevalence,
+            ranking=ranking,
+            emotion_names=list(self.emotion_names),
+            normalization_method=self.normalization_method.value,
+        )
+
+    def _normalize_many(self, raw: np.ndarray, counts: np.ndarray, observe: bool = True) -> np.ndarray:
+        """Vectorized counterpart of normalize_to_core_triad for an (N, 3) raw array"""
+        if self.normalization_method == NormalizationMethod.QUESTION_BASED:
+            theoretical_max = (counts * MAX_CONTRIBUTION_PER_QUESTION)[:, np.newaxis]
+            theoretical_min = -theoretical_max
+            clamped = np.maximum(theoretical_min, np.minimum(theoretical_max, raw))
+            span = theoretical_max - theoretical_min
+            with np.errstate(invalid="ignore", divide="ignore"):
+                normalized = (clamped - theoretical_min) / span
+            normalized = (normalized * 2.0) - 1.0
+            return np.where(span == 0, 0.0, normalized)
+        elif self.normalization_method == NormalizationMethod.THEORETICAL_RANGE:
+            return np.maximum(-THEORETICAL_RANGE, np.minimum(THEORETICAL_RANGE, raw)) / THEORETICAL_RANGE
+        elif self.normalization_method == NormalizationMethod.PERCENTILE:
+            # Every respondent is ranked against the population before the batch is added
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = np.where(counts[:, np.newaxis] > 0, raw / counts[:, np.newaxis], 0.0)
+            ranks = self.population.rank_and_add_many(means) if observe else self.population.rank_many(means)
+            return ranks * 2.0 - 1.0
+        else:
+            raise ValidationError(f"Unsupported normalization method: {self.normalization_method}")
+
     def get_emotion_breakdown(self, result: PADAnalysisResult, top_n: int = 5) -> Dict[str, Any]:
         """
         Get a formatted breakdown of emotion scores
@@ -435,14 +1140,4 @@ class PADCoreEngine:
         Returns:
             JSON string representation
         """
-        # Convert dataclasses to dictionaries for JSON serialization
-        export_data = {
-            "raw_scores": asdict(result.raw_scores),
-            "core_triad": asdict(result.core_triad),
-            "emotion_scores": [asdict(score) for score in result.emotion_scores],
-            "primary_emotion": result.primary_emotion,
-            "secondary_emotion": result.secondary_emotion,
-            "metadata": result.metadata
-        }
-
-        return json.dumps(export_data, indent=2)
+        return json.dumps(result.to_dict(), indent=2)
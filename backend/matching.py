@@ -0,0 +1,426 @@
+import json
+import os
+import secrets
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Tuple, Dict, Any, Optional, Iterable, Union
+
+import numpy as np
+
+INDEX_FORMAT = 1
+INDEX_METRICS = ("euclidean", "cosine")
+# Rows scored per step of a cosine scan; bounds the temporary score array
+COSINE_BLOCK = 1 << 18
+
+# A match: (user id, distance). Cosine distance is 1 - cosine similarity.
+Match = Tuple[str, float]
+
+class ProfileIndex:
+    """
+    Nearest-profile search over users' core PAD triads and emotion vectors
+
+    Profiles live in two segments. The base segment is flat float32 arrays
+    sorted by a uniform grid over [-1, 1]³ with CSR-style cell offsets, so a
+    Euclidean query visits the cells around the query point ring by ring and
+    stops as soon as no unvisited cell can hold a closer profile. The base is
+    never modified in place, which lets a saved index be memory-mapped. New and
+    updated profiles go to a small in-memory delta segment that is scanned
+    directly, and deletes are tombstones; once the delta holds max_delta
+    profiles, both are merged into a new base. Cosine queries over the
+    emotion vectors scan every row in blocks. Thread-safe.
+    """
+
+    def __init__(self, vector_dims: int = 0, profiles_per_cell: int = 64, max_delta: int = 16384):
+        """
+        Args:
+            vector_dims: Length of the emotion vector stored with every profile
+                (e.g. 16 prevalence scores), or 0 for PAD coordinates only
+            profiles_per_cell: Target number of profiles sharing a typical profile's grid
+                cell; sets the grid resolution at each compaction
+            max_delta: Delta size that triggers a compaction; every query scans the delta
+        """
+        self.vector_dims = vector_dims
+        self.profiles_per_cell = profiles_per_cell
+        self.max_delta = max_delta
+        self._lock = threading.RLock()
+
+        self._set_base(np.empty(0, dtype="U1"), np.empty((0, 3), dtype=np.float32),
+                       np.empty((0, vector_dims), dtype=np.float32), 1, np.zeros(2, dtype=np.int64))
+        self._reset_delta()
+        # user id -> (in base, row); built on the first update or lookup by id
+        self._locations: Optional[Dict[str, Tuple[bool, int]]] = None
+        # Adds and removes so far, and how many of them the last save() covered
+        self._changes = 0
+        self._saved_changes = 0
+        self._save_lock = threading.Lock()
+
+    def _set_base(self, ids: np.ndarray, coords: np.ndarray, vectors: np.ndarray,
+                  resolution: int, cell_start: np.ndarray) -> None:
+        self._base_ids = ids
+        self._base_coords = coords
+        self._base_vectors = vectors
+        self._base_alive = np.ones(len(ids), dtype=bool)
+        self._resolution = resolution
+        self._cell_start = cell_start
+        self._tombstones = 0
+
+    def _reset_delta(self, capacity: int = 64) -> None:
+        self._delta_ids: List[str] = []
+        self._delta_coords = np.empty((capacity, 3), dtype=np.float32)
+        self._delta_vectors = np.empty((capacity, self.vector_dims), dtype=np.float32)
+        self._delta_alive = np.zeros(capacity, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self._base_ids) - self._tombstones + int(self._delta_alive[:len(self._delta_ids)].sum())
+
+    def __contains__(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._locate()
+
+    @property
+    def dirty(self) -> bool:
+        """Whether profiles were added or removed since the last save() or load()"""
+        return self._changes != self._saved_changes
+
+    def _locate(self) -> Dict[str, Tuple[bool, int]]:
+        if self._locations is None:
+            locations = {user_id: (True, row) for row, user_id in enumerate(self._base_ids.tolist()) if self._base_alive[row]}
+            for row, user_id in enumerate(self._delta_ids):
+                if self._delta_alive[row]:
+                    locations[user_id] = (False, row)
+            self._locations = locations
+        return self._locations
+
+    def add(self, user_id: str, core_triad: Tuple[float, float, float], vector: Optional[Iterable[float]] = None) -> None:
+        """
+        Insert or replace a profile
+
+        Args:
+            user_id: Profile key
+            core_triad: (pleasure, arousal, dominance) in [-1, 1]
+            vector: Emotion vector of length vector_dims (required when vector_dims > 0)
+
+        Raises:
+            ValueError: If the triad is outside [-1, 1]³ or the vector has the wrong shape
+        """
+        coords = np.asarray(core_triad, dtype=np.float32)
+        if coords.shape != (3,) or not np.all(np.abs(coords) <= 1.0):
+            raise ValueError(f"Core triad must be three values in [-1, 1], got {core_triad}")
+        unit = np.empty(0, dtype=np.float32)
+        if self.vector_dims:
+            if vector is None:
+                raise ValueError(f"An emotion vector of length {self.vector_dims} is required")
+            unit = np.asarray(list(vector), dtype=np.float32)
+            if unit.shape != (self.vector_dims,):
+                raise ValueError(f"Emotion vector must have length {self.vector_dims}, got {unit.shape}")
+            norm = float(np.linalg.norm(unit))
+            # Stored unit-length, so a cosine query is a dot product
+            unit = unit / norm if norm > 0 else unit
+
+        with self._lock:
+            locations = self._locate()
+            self._remove_locked(user_id, locations)
+            row = len(self._delta_ids)
+            if row == len(self._delta_alive):
+                self._grow_delta()
+            self._delta_coords[row] = coords
+            if self.vector_dims:
+                self._delta_vectors[row] = unit
+            self._delta_alive[row] = True
+            self._delta_ids.append(user_id)
+            locations[user_id] = (False, row)
+            self._changes += 1
+            if len(self._delta_ids) >= self.max_delta:
+                self._compact()
+
+    def _grow_delta(self) -> None:
+        capacity = 2 * len(self._delta_alive)
+        for name in ("_delta_coords", "_delta_vectors", "_delta_alive"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def remove(self, user_id: str) -> bool:
+        """Delete a profile; False if it was not indexed"""
+        with self._lock:
+            return self._remove_locked(user_id, self._locate())
+
+    def _remove_locked(self, user_id: str, locations: Dict[str, Tuple[bool, int]]) -> bool:
+        location = locations.pop(user_id, None)
+        if location is None:
+            return False
+        self._changes += 1
+        in_base, row = location
+        if in_base:
+            self._base_alive[row] = False
+            self._tombstones += 1
+        else:
+            self._delta_alive[row] = False
+        return True
+
+    def compact(self) -> None:
+        """Merge the delta segment and drop tombstones now"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self) -> None:
+        size = len(self._delta_ids)
+        delta_alive = self._delta_alive[:size]
+        ids = np.concatenate([self._base_ids[self._base_alive], np.array(self._delta_ids, dtype=str)[delta_alive]])
+        coords = np.concatenate([self._base_coords[self._base_alive], self._delta_coords[:size][delta_alive]])
+        vectors = np.concatenate([self._base_vectors[self._base_alive], self._delta_vectors[:size][delta_alive]])
+
+        resolution = self._grid_resolution(coords)
+        cells = _cells(coords, resolution)
+        order = np.argsort(cells, kind="stable")
+        counts = np.bincount(cells, minlength=resolution ** 3)
+        cell_start = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+        self._set_base(ids[order], coords[order], vectors[order], resolution, cell_start)
+        self._reset_delta()
+        if self._locations is not None:
+            self._locations = {user_id: (True, row) for row, user_id in enumerate(self._base_ids.tolist())}
+
+    def _grid_resolution(self, coords: np.ndarray) -> int:
+        """Cells per axis so a typical profile shares its cell with ~profiles_per_cell others"""
+        resolution = max(1, min(128, round((len(coords) / self.profiles_per_cell) ** (1 / 3))))
+        # Profiles cluster, so refine from the occupancy the average profile actually sees
+        for _ in range(2):
+            if len(coords) == 0:
+                break
+            counts = np.bincount(_cells(coords, resolution))
+            occupancy = float((counts.astype(np.float64) ** 2).sum()) / len(coords)
+            resolution = max(1, min(128, round(resolution * (occupancy / self.profiles_per_cell) ** (1 / 3))))
+        return int(resolution)
+
+    def profile(self, user_id: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(core triad, unit emotion vector) stored for user_id, or None"""
+        with self._lock:
+            location = self._locate().get(user_id)
+            if location is None:
+                return None
+            in_base, row = location
+            if in_base:
+                return np.array(self._base_coords[row]), np.array(self._base_vectors[row])
+            return self._delta_coords[row].copy(), self._delta_vectors[row].copy()
+
+    def similar_to(self, user_id: str, k: int = 10, metric: str = "euclidean") -> Optional[List[Match]]:
+        """The k profiles nearest to user_id's own (excluding it), or None if it is not indexed"""
+        stored = self.profile(user_id)
+        if stored is None:
+            return None
+        coords, vector = stored
+        if metric == "cosine":
+            return self.nearest_cosine(vector, k, exclude=(user_id,))
+        return self.nearest(coords, k, exclude=(user_id,), metric=metric)
+
+    def nearest(self, query: Iterable[float], k: int = 10, exclude: Iterable[str] = (),
+                metric: str = "euclidean") -> List[Match]:
+        """
+        The k nearest profiles to query, closest first
+
+        Args:
+            query: A core triad for "euclidean", an emotion vector for "cosine"
+            k: Number of matches
+            exclude: User ids to leave out (e.g. the user asking)
+            metric: One of INDEX_METRICS
+
+        Raises:
+            ValueError: For an unknown metric
+        """
+        if metric == "cosine":
+            return self.nearest_cosine(query, k, exclude)
+        if metric != "euclidean":
+            raise ValueError(f"Unknown metric {metric!r}; expected one of {INDEX_METRICS}")
+        point = np.asarray(query, dtype=np.float64)
+        exclude = set(exclude)
+        want = k + len(exclude)
+        if k <= 0:
+            return []
+
+        with self._lock:
+            rows, d2 = self._grid_search(point, want)
+            # The delta is small; scan it
+            size = len(self._delta_ids)
+            delta_d2 = ((self._delta_coords[:size] - point) ** 2).sum(axis=1)
+            delta_d2[~self._delta_alive[:size]] = np.inf
+            d2 = np.concatenate([d2, delta_d2])
+            order = np.argsort(d2, kind="stable")[:want]
+            matches = []
+            for i in order:
+                if not np.isfinite(d2[i]):
+                    break
+                user_id = str(self._base_ids[rows[i]]) if i < len(rows) else self._delta_ids[i - len(rows)]
+                if user_id not in exclude:
+                    matches.append((user_id, float(np.sqrt(d2[i]))))
+            return matches[:k]
+
+    def _grid_search(self, point: np.ndarray, want: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Base rows and squared distances containing the want nearest live base profiles"""
+        n = self._resolution
+        width = 2.0 / n
+        center = np.clip(((point + 1.0) / width).astype(np.int64), 0, n - 1)
+        starts = self._cell_start
+        coords = self._base_coords
+
+        rows = np.empty(0, dtype=np.int64)
+        d2 = np.empty(0)
+        for r in range(n):
+            if (2 * r + 1) ** 3 * 8 > n ** 3:
+                # The rings now cover most of the grid; scan everything instead
+                rows = np.arange(len(coords))
+                d2 = ((coords - point) ** 2).sum(axis=1)
+                d2[~self._base_alive] = np.inf
+                break
+            ranges = _shell_ranges(center, r, n, starts)
+            if ranges:
+                found = np.concatenate([np.arange(s, e) for s, e in ranges])
+                found_d2 = ((coords[found] - point) ** 2).sum(axis=1)
+                found_d2[~self._base_alive[found]] = np.inf
+                rows = np.concatenate([rows, found])
+                d2 = np.concatenate([d2, found_d2])
+                if len(d2) > want:
+                    keep = np.argpartition(d2, want - 1)[:want]
+                    rows, d2 = rows[keep], d2[keep]
+            # Anything outside rings 0..r is at least r cell widths away
+            if len(d2) >= want and np.isfinite(d2).all() and d2.max() <= (r * width) ** 2:
+                break
+            if all(c - r <= 0 and c + r >= n - 1 for c in center):
+                break
+        return rows, d2
+
+    def nearest_cosine(self, vector: Iterable[float], k: int = 10, exclude: Iterable[str] = ()) -> List[Match]:
+        """The k profiles with the most similar emotion vectors (distance 1 - cosine), closest first"""
+        if not self.vector_dims:
+            raise ValueError("This index stores no emotion vectors")
+        query = np.asarray(list(vector), dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if query.shape != (self.vector_dims,) or norm == 0:
+            raise ValueError(f"Query must be a non-zero vector of length {self.vector_dims}")
+        query /= norm
+        exclude = set(exclude)
+        want = k + len(exclude)
+        if k <= 0:
+            return []
+
+        with self._lock:
+            size = len(self._delta_ids)
+            segments = [(self._base_vectors, self._base_alive, True), (self._delta_vectors[:size], self._delta_alive[:size], False)]
+            best_rows: List[np.ndarray] = []
+            best_scores: List[np.ndarray] = []
+            best_base: List[np.ndarray] = []
+            for vectors, alive, in_base in segments:
+                for start in range(0, len(vectors), COSINE_BLOCK):
+                    scores = vectors[start:start + COSINE_BLOCK] @ query
+                    scores[~alive[start:start + COSINE_BLOCK]] = -np.inf
+                    top = np.argpartition(-scores, want - 1)[:want] if len(scores) > want else np.arange(len(scores))
+                    best_rows.append(top + start)
+                    best_scores.append(scores[top])
+                    best_base.append(np.full(len(top), in_base))
+            if not best_rows:
+                return []
+            rows, scores, in_base = np.concatenate(best_rows), np.concatenate(best_scores), np.concatenate(best_base)
+            matches = []
+            for i in np.argsort(-scores, kind="stable")[:want]:
+                if not np.isfinite(scores[i]):
+                    break
+                user_id = str(self._base_ids[rows[i]]) if in_base[i] else self._delta_ids[rows[i]]
+                if user_id not in exclude:
+                    matches.append((user_id, float(1.0 - min(1.0, scores[i]))))
+            return matches[:k]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "profiles": len(self),
+                "base": len(self._base_ids),
+                "delta": len(self._delta_ids),
+                "tombstones": self._tombstones,
+                "grid_resolution": self._resolution,
+                "vector_dims": self.vector_dims,
+            }
+
+    def save(self, directory: Union[str, os.PathLike]) -> None:
+        """
+        Compact and write the index to directory
+
+        Arrays go to new .npy files first and profiles.json is swapped in last,
+        so a reader always sees a complete index; files of older saves are removed.
+        Only the compaction holds the index lock: the base it produces is never
+        modified in place, so adds, removes and queries go on while it is written.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._save_lock:
+            token = secrets.token_hex(4)
+            with self._lock:
+                self._compact()
+                changes = self._changes
+                arrays = {"ids": self._base_ids, "coords": self._base_coords,
+                          "vectors": self._base_vectors, "cells": self._cell_start}
+                meta = {"format": INDEX_FORMAT, "token": token, "resolution": self._resolution,
+                        "vector_dims": self.vector_dims, "profiles": len(self._base_ids)}
+            for name, array in arrays.items():
+                np.save(directory / f"profiles-{token}.{name}.npy", array)
+
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=".profiles-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+                os.replace(tmp, directory / "profiles.json")
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+            for old in directory.glob("profiles-*.npy"):
+                if not old.name.startswith(f"profiles-{token}."):
+                    old.unlink()
+            self._saved_changes = changes
+
+    @classmethod
+    def load(cls, directory: Union[str, os.PathLike], **kwargs: Any) -> "ProfileIndex":
+        """
+        Open an index written by save(); its arrays are memory-mapped, not read
+
+        Args:
+            directory: Directory passed to save()
+            **kwargs: Other ProfileIndex settings
+        """
+        directory = Path(directory)
+        with open(directory / "profiles.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != INDEX_FORMAT:
+            raise ValueError(f"{directory} is not a profile index (format {INDEX_FORMAT})")
+        index = cls(vector_dims=meta["vector_dims"], **kwargs)
+        arrays = {name: np.load(directory / f"profiles-{meta['token']}.{name}.npy", mmap_mode="r")
+                  for name in ("ids", "coords", "vectors", "cells")}
+        index._set_base(arrays["ids"], arrays["coords"], arrays["vectors"], meta["resolution"], arrays["cells"])
+        return index
+
+def _cells(coords: np.ndarray, resolution: int) -> np.ndarray:
+    """Flat grid cell of each row, x-major so a run along z is contiguous"""
+    index = np.clip(((coords.astype(np.float64) + 1.0) / (2.0 / resolution)).astype(np.int64), 0, resolution - 1)
+    return (index[:, 0] * resolution + index[:, 1]) * resolution + index[:, 2]
+
+def _shell_ranges(center: np.ndarray, r: int, n: int, starts: np.ndarray) -> List[Tuple[int, int]]:
+    """Row ranges of the cells exactly r cells (Chebyshev) away from center"""
+    cx, cy, cz = (int(c) for c in center)
+    z_low, z_high = max(cz - r, 0), min(cz + r, n - 1)
+    ranges = []
+    for x in range(max(cx - r, 0), min(cx + r, n - 1) + 1):
+        for y in range(max(cy - r, 0), min(cy + r, n - 1) + 1):
+            column = (x * n + y) * n
+            if max(abs(x - cx), abs(y - cy)) == r:
+                runs = [(z_low, z_high)]
+            else:
+                # Interior column: only the two z caps belong to this shell
+                runs = [(z, z) for z in {cz - r, cz + r} if 0 <= z < n]
+            for z0, z1 in runs:
+                s, e = starts[column + z0], starts[column + z1 + 1]
+                if e > s:
+                    ranges.append((int(s), int(e)))
+    return ranges
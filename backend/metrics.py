@@ -0,0 +1,140 @@
+import threading
+from bisect import bisect_left
+from typing import List, Tuple, Dict, Any, Optional, Sequence
+
+# Upper bounds (seconds) for latency histograms: 5 µs .. 1 s
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+# Label pairs identifying one series within a metric, e.g. (("stage", "normalize"),)
+Labels = Tuple[Tuple[str, str], ...]
+
+class Counter:
+    """Monotonic counter"""
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def state(self) -> int:
+        return self.value
+
+class Histogram:
+    """
+    Fixed-bucket histogram
+
+    observe() is a bisect and three additions; nothing is formatted until the
+    registry is rendered.
+    """
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def state(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+class MetricsRegistry:
+    """
+    Named counters and histograms, rendered in the Prometheus text format
+
+    counter() / histogram() return the same series for the same name and labels,
+    so modules can register their metrics at import time.
+    """
+
+    def __init__(self):
+        # name -> (kind, help, buckets or None, {labels: series})
+        self._metrics: Dict[str, Tuple[str, str, Optional[Tuple[float, ...]], Dict[Labels, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, **labels: str) -> Counter:
+        return self._series(name, "counter", help, None, labels, Counter)
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS, **labels: str) -> Histogram:
+        return self._series(name, "histogram", help, tuple(buckets), labels, lambda: Histogram(buckets))
+
+    def _series(self, name, kind, help, buckets, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            metric = self._metrics.setdefault(name, (kind, help, buckets, {}))
+            if metric[0] != kind or metric[2] != buckets:
+                raise ValueError(f"Metric {name} is already registered as a different {metric[0]}")
+            series = metric[3].get(key)
+            if series is None:
+                series = metric[3][key] = factory()
+            return series
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Plain, picklable copy of every series, e.g. to ship from a worker process"""
+        with self._lock:
+            metrics = list(self._metrics.items())
+        return {
+            name: (kind, help, buckets, {labels: series.state() for labels, series in list(all_series.items())})
+            for name, (kind, help, buckets, all_series) in metrics
+        }
+
+    def render(self, *others: Dict[str, Any]) -> str:
+        """
+        Prometheus text exposition of this registry, with the series of any
+        other snapshots (e.g. from worker processes) added in
+        """
+        merged = self.snapshot()
+        for other in others:
+            for name, (kind, help, buckets, all_series) in other.items():
+                mine = merged.setdefault(name, (kind, help, buckets, {}))[3]
+                for labels, state in all_series.items():
+                    if labels not in mine:
+                        mine[labels] = state
+                    elif kind == "counter":
+                        mine[labels] += state
+                    else:
+                        counts, total, count = mine[labels]
+                        mine[labels] = ([a + b for a, b in zip(counts, state[0])], total + state[1], count + state[2])
+
+        lines = []
+        for name in sorted(merged):
+            kind, help, buckets, all_series = merged[name]
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels in sorted(all_series):
+                state = all_series[labels]
+                if kind == "counter":
+                    lines.append(f"{name}{_format_labels(labels)} {state}")
+                    continue
+                counts, total, count = state
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total!r}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+# Process-wide registry served at /metrics
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from typing import List, Tuple, Dict, Any, Iterable
+
+import numpy as np
+
+from core import PADCoreEngine
+from questionnaire_store import QuestionnaireSnapshot
+
+# Candidate lattice steps, coarsest first; the first that represents every delta is used
+QUANTA = (0.1, 0.05, 0.01, 0.001)
+# Largest relative error allowed when snapping a delta to the lattice
+SNAP_TOLERANCE = 1e-9
+
+@dataclass
+class OutcomeDistribution:
+    """Every reachable outcome of one question set, with how many answer combinations reach it"""
+    question_ids: List[int]
+    emotion_names: List[str]
+    quantum: float                # Lattice step the deltas were summed on
+    exact: bool                   # False if some delta had to be rounded to the lattice
+    combinations: int             # Answer combinations covered (product of the option counts)
+    raw_sums: np.ndarray          # (K, 3) distinct reachable raw P, A, D sums
+    weights: np.ndarray           # (K,) combinations reaching each sum (float64, exact below 2**53)
+    core_triads: np.ndarray       # (K, 3) normalized triad of each sum
+    prevalence_scores: np.ndarray  # (K, E) prevalence of every emotion at each sum
+    primary: np.ndarray           # (K,) primary emotion index at each sum
+
+    def emotion_combinations(self) -> np.ndarray:
+        """(E,) answer combinations whose primary emotion is each emotion"""
+        return np.bincount(self.primary, weights=self.weights, minlength=len(self.emotion_names))
+
+    def emotion_probabilities(self) -> np.ndarray:
+        """(E,) share of answer combinations whose primary emotion is each emotion"""
+        return self.emotion_combinations() / self.weights.sum()
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-ready per-emotion reachability, probability and best prevalence"""
+        counts = self.emotion_combinations()
+        reachable = np.bincount(self.primary, minlength=len(self.emotion_names)) > 0
+        best = self.prevalence_scores.max(axis=0)
+        emotions = {
+            name: {
+                "reachable": bool(reachable[i]),
+                "probability": float(counts[i] / self.weights.sum()),
+                "combinations": int(counts[i]),
+                "max_prevalence": int(best[i]),
+            }
+            for i, name in enumerate(self.emotion_names)
+        }
+        return {
+            "question_ids": self.question_ids,
+            "combinations": self.combinations,
+            "distinct_sums": len(self.weights),
+            "quantum": self.quantum,
+            "exact": self.exact,
+            "emotions": emotions,
+            "unreachable": [name for i, name in enumerate(self.emotion_names) if not reachable[i]],
+        }
+
+def _lattice(deltas: np.ndarray) -> Tuple[float, bool]:
+    """The coarsest quantum in QUANTA that every delta is a multiple of, and whether one was found"""
+    for quantum in QUANTA:
+        units = deltas / quantum
+        if np.all(np.abs(units - np.round(units)) <= SNAP_TOLERANCE * np.maximum(1.0, np.abs(units))):
+            return quantum, True
+    return QUANTA[-1], False
+
+def outcome_distribution(engine: PADCoreEngine, questionnaire: QuestionnaireSnapshot, question_ids: Iterable[int],
+                         include_unanswered: bool = False, max_states: int = 2_000_000) -> OutcomeDistribution:
+    """
+    Exact distribution of outcomes over every combination of answers to a question set
+
+    Brute force would score each of the ~5^n answer combinations. Instead the
+    deltas are snapped to an integer lattice and the set of reachable (P, A, D)
+    sums is built one question at a time: each step adds every option to every
+    sum reached so far and merges equal sums, keeping a count of the
+    combinations behind each. Only the distinct sums are then normalized and
+    ranked, in one batch. Every answer is counted as given (as in /analyze), so
+    all sums are normalized for len(question_ids) answers.
+
+    Args:
+        engine: Engine whose normalization and emotion catalog define the outcome;
+            PERCENTILE normalization ranks against its population without adding to it
+        questionnaire: Snapshot the option deltas are read from
+        question_ids: Questions in the set; repeats are ignored
+        include_unanswered: Also count leaving each question unanswered (a zero delta)
+        max_states: Distinct sums allowed at any step before giving up
+
+    Returns:
+        OutcomeDistribution over the distinct reachable sums
+
+    Raises:
+        ValueError: For an empty set, an unknown question id, or more than max_states sums
+    """
+    question_ids = list(dict.fromkeys(int(qid) for qid in question_ids))
+    if not question_ids:
+        raise ValueError("question_ids must name at least one question")
+    row_qids = np.asarray(questionnaire.row_question_ids)
+    row_deltas = np.asarray(questionnaire.row_deltas, dtype=np.float64)
+
+    options = []
+    for qid in question_ids:
+        deltas = row_deltas[row_qids == qid]
+        if len(deltas) == 0:
+            raise ValueError(f"Unknown question id: {qid}")
+        if include_unanswered:
+            deltas = np.vstack([deltas, np.zeros((1, 3))])
+        options.append(deltas)
+
+    quantum, exact = _lattice(np.vstack(options))
+    units = [np.round(deltas / quantum).astype(np.int64) for deltas in options]
+
+    # Shift each question's options to start at zero per dimension, so every partial
+    # sum lies in [0, span] and the three components pack into one additive int64 key
+    lows = [u.min(axis=0) for u in units]
+    span = sum(u.max(axis=0) - low for u, low in zip(units, lows))
+    base = span + 1
+    if float(np.prod(base.astype(np.float64))) >= 2.0 ** 62:
+        raise ValueError("Question set is too large to enumerate")
+    stride = np.array([base[1] * base[2], base[2], 1], dtype=np.int64)
+
+    keys = np.zeros(1, dtype=np.int64)
+    weights = np.ones(1)
+    for u, low in zip(units, lows):
+        option_keys, option_counts = np.unique((u - low) @ stride, return_counts=True)
+        merged, inverse = np.unique((keys[:, np.newaxis] + option_keys).ravel(), return_inverse=True)
+        weights = np.bincount(inverse, weights=(weights[:, np.newaxis] * option_counts).ravel())
+        keys = merged
+        if len(keys) > max_states:
+            raise ValueError(f"Question set reaches more than {max_states} distinct sums")
+
+    offsets = np.column_stack([keys // stride[0], keys % stride[0] // stride[1], keys % stride[1]])
+    raw_sums = (offsets + sum(lows)) * quantum
+    batch = engine.score_raw_many(raw_sums, np.full(len(keys), len(question_ids)), observe=False)
+
+    return OutcomeDistribution(
+        question_ids=question_ids,
+        emotion_names=list(batch.emotion_names),
+        quantum=quantum,
+        exact=exact,
+        combinations=int(np.prod([len(u) for u in units], dtype=object)),
+        raw_sums=raw_sums,
+        weights=weights,
+        core_triads=batch.core_triad,
+        prevalence_scores=batch.prevalence_scores,
+        primary=batch.ranking[:, 0],
+    )
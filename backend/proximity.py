@@ -0,0 +1,357 @@
+import hashlib
+import heapq
+import logging
+import math
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Tuple, Dict, Any, Optional, Type, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# A ranked catalog entry: (emotion index, euclidean distance, prevalence score)
+RankedEmotion = Tuple[int, float, int]
+
+def prevalence_from_distance(distance: float, max_distance: float) -> int:
+    """
+    Convert a PAD distance to a 0-100 prevalence score
+
+    Distance 0 = 100%, max distance = 0%
+    """
+    prevalence_score = round((1 - (distance / max_distance)) * 100)
+    return max(0, min(100, prevalence_score))
+
+def _rank_key(entry: RankedEmotion) -> Tuple[int, int]:
+    """Highest prevalence first, catalog order among equal scores"""
+    return (-entry[2], entry[0])
+
+class ProximityIndex:
+    """
+    Nearest-emotion lookups over a fixed emotion catalog
+
+    Subclasses answer top_k queries; every backend must return exactly the
+    ordering of a full stable sort by prevalence (catalog order breaks ties).
+    """
+
+    def __init__(self, coordinates: List[Tuple[float, float, float]], max_distance: float):
+        """
+        Args:
+            coordinates: Emotion coordinates in catalog order
+            max_distance: Distance that maps to a prevalence of 0
+        """
+        self.coordinates = [tuple(c) for c in coordinates]
+        self.max_distance = max_distance
+
+    def __len__(self) -> int:
+        return len(self.coordinates)
+
+    def distance(self, index: int, point: Tuple[float, float, float]) -> float:
+        """Euclidean distance from point to catalog entry index"""
+        coords = self.coordinates[index]
+        return math.sqrt(
+            (point[0] - coords[0]) ** 2 +
+            (point[1] - coords[1]) ** 2 +
+            (point[2] - coords[2]) ** 2
+        )
+
+    def _entry(self, index: int, point: Tuple[float, float, float]) -> RankedEmotion:
+        distance = self.distance(index, point)
+        return (index, distance, prevalence_from_distance(distance, self.max_distance))
+
+    def top_k(self, point: Tuple[float, float, float], k: int) -> List[RankedEmotion]:
+        """
+        Return the k highest-prevalence emotions for point, best first
+
+        Args:
+            point: Normalized PAD coordinates
+            k: Number of emotions to return (clipped to the catalog size)
+
+        Returns:
+            List of (emotion index, distance, prevalence) tuples
+        """
+        raise NotImplementedError
+
+class BruteForceProximityIndex(ProximityIndex):
+    """Scores every catalog entry; best for small catalogs like the built-in 16"""
+
+    def top_k(self, point: Tuple[float, float, float], k: int) -> List[RankedEmotion]:
+        entries = [self._entry(i, point) for i in range(len(self.coordinates))]
+        if k >= len(entries):
+            entries.sort(key=_rank_key)
+            return entries
+        # Partial selection instead of a full sort
+        return heapq.nsmallest(k, entries, key=_rank_key)
+
+class KDTreeProximityIndex(ProximityIndex):
+    """
+    k-d tree over the catalog for large emotion sets
+
+    A query first finds the k nearest anchors, then collects every anchor that
+    could round to the same prevalence as the k-th one, so ties are ordered
+    exactly like the brute-force backend.
+    """
+
+    # Nodes are stored as parallel lists: catalog index, split axis, children (-1 = none)
+    def __init__(self, coordinates: List[Tuple[float, float, float]], max_distance: float):
+        super().__init__(coordinates, max_distance)
+        self._point: List[int] = []
+        self._axis: List[int] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self._root = self._build(list(range(len(self.coordinates))), 0)
+
+    def _build(self, indices: List[int], depth: int) -> int:
+        if not indices:
+            return -1
+        axis = depth % 3
+        indices.sort(key=lambda i: self.coordinates[i][axis])
+        mid = len(indices) // 2
+
+        node = len(self._point)
+        self._point.append(indices[mid])
+        self._axis.append(axis)
+        self._left.append(-1)
+        self._right.append(-1)
+
+        self._left[node] = self._build(indices[:mid], depth + 1)
+        self._right[node] = self._build(indices[mid + 1:], depth + 1)
+        return node
+
+    def _nearest_distances(self, point: Tuple[float, float, float], k: int) -> float:
+        """Distance to the k-th nearest anchor"""
+        heap: List[float] = []  # max-heap of the k best distances (negated)
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            index = self._point[node]
+            distance = self.distance(index, point)
+            if len(heap) < k:
+                heapq.heappush(heap, -distance)
+            elif distance < -heap[0]:
+                heapq.heapreplace(heap, -distance)
+
+            axis = self._axis[node]
+            offset = point[axis] - self.coordinates[index][axis]
+            near, far = (self._left[node], self._right[node]) if offset < 0 else (self._right[node], self._left[node])
+            # Visit the far side only if it could still hold a closer anchor
+            if len(heap) < k or abs(offset) < -heap[0]:
+                stack.append(far)
+            stack.append(near)
+        return -heap[0]
+
+    def _within(self, point: Tuple[float, float, float], radius: float) -> List[RankedEmotion]:
+        """All anchors within radius of point"""
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            index = self._point[node]
+            entry = self._entry(index, point)
+            if entry[1] <= radius:
+                found.append(entry)
+
+            axis = self._axis[node]
+            offset = point[axis] - self.coordinates[index][axis]
+            if offset - radius <= 0:
+                stack.append(self._left[node])
+            if offset + radius >= 0:
+                stack.append(self._right[node])
+        return found
+
+    def top_k(self, point: Tuple[float, float, float], k: int) -> List[RankedEmotion]:
+        if not self.coordinates or k <= 0:
+            return []
+        k = min(k, len(self.coordinates))
+
+        kth_prevalence = prevalence_from_distance(self._nearest_distances(point, k), self.max_distance)
+        # Largest distance that can still round to kth_prevalence (plus float slack)
+        radius = self.max_distance * (1 - (kth_prevalence - 0.5) / 100) + 1e-9
+        if kth_prevalence <= 0:
+            radius = math.inf
+
+        candidates = [e for e in self._within(point, radius) if e[2] >= kth_prevalence]
+        return heapq.nsmallest(k, candidates, key=_rank_key)
+
+class LatticeProximityIndex(ProximityIndex):
+    """
+    Precomputed candidate emotions over a quantized PAD cube
+
+    The cube [-1, 1]³ is split into resolution³ cells. Inside a cell each
+    emotion's distance moves by at most the cell's half-diagonal, which bounds
+    its prevalence; the build keeps, per cell, every emotion whose best case
+    reaches the depth-th best worst case, i.e. every emotion that can rank in the
+    top `depth` anywhere in the cell. A query with k <= depth ranks only those
+    candidates, so it matches the brute-force ordering exactly at a cost that
+    does not grow with the catalog. Cells with more than `width` candidates
+    (near many-way ties) and larger k use the fallback index.
+
+    Tables are shared between indexes built for the same catalog in one process,
+    and with cache_dir they are saved once and memory-mapped by later processes.
+    """
+
+    # (catalog, max distance, resolution, depth, width) key -> table
+    _tables: Dict[str, np.ndarray] = {}
+    _tables_lock = threading.Lock()
+
+    def __init__(self, coordinates: List[Tuple[float, float, float]], max_distance: float,
+                 resolution: int = 101, depth: int = 8, width: Optional[int] = None,
+                 cache_dir: Optional[Union[str, os.PathLike]] = None):
+        """
+        Args:
+            coordinates: Emotion coordinates in catalog order
+            max_distance: Distance that maps to a prevalence of 0
+            resolution: Cells per axis (101 = 0.02 wide cells, 201 = 0.01)
+            depth: Largest k answered from the table
+            width: Candidates stored per cell (defaults to depth + 4)
+            cache_dir: Optional directory to save / memory-map built tables
+        """
+        super().__init__(coordinates, max_distance)
+        if resolution < 2:
+            raise ValueError(f"Lattice resolution must be at least 2, got {resolution}")
+        self.resolution = resolution
+        self.depth = max(1, min(depth, len(self.coordinates)))
+        self.width = max(self.depth, min(width or self.depth + 4, len(self.coordinates)))
+        self.step = 2.0 / (resolution - 1)
+        self.fallback = build_proximity_index(coordinates, max_distance, "auto")
+
+        # Empty-slot marker; fits the dtype because indices stay below it
+        self._dtype = np.uint8 if len(self.coordinates) < 255 else np.uint16
+        self._empty = int(np.iinfo(self._dtype).max)
+        self.table = self._load_table(cache_dir)
+        self.coverage = float(np.mean(self.table[..., 0] != self._empty))
+
+    def _key(self) -> str:
+        settings = (self.coordinates, self.max_distance, self.resolution, self.depth, self.width)
+        return hashlib.sha256(repr(settings).encode()).hexdigest()[:16]
+
+    def _load_table(self, cache_dir: Optional[Union[str, os.PathLike]]) -> np.ndarray:
+        key = self._key()
+        with self._tables_lock:
+            table = self._tables.get(key)
+            if table is not None:
+                return table
+
+            path = Path(cache_dir) / f"lattice-{key}.npy" if cache_dir is not None else None
+            if path is not None and path.exists():
+                table = np.load(path, mmap_mode="r")
+            else:
+                table = self._build()
+                if path is not None:
+                    self._save(table, path)
+            self._tables[key] = table
+            return table
+
+    @staticmethod
+    def _save(table: np.ndarray, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".lattice-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, table)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _prevalence(self, distances: np.ndarray) -> np.ndarray:
+        # np.round rounds half to even like round() in prevalence_from_distance
+        return np.clip(np.round((1 - distances / self.max_distance) * 100), 0, 100)
+
+    def _build(self) -> np.ndarray:
+        n, count = self.resolution, len(self.coordinates)
+        anchors = np.asarray(self.coordinates, dtype=np.float64)
+        axis = np.linspace(-1.0, 1.0, n)
+        # Farthest a point in a cell can be from its center, plus float slack
+        slack = self.step * math.sqrt(3) / 2 + 1e-9
+
+        table = np.empty((n, n, n, self.width), dtype=self._dtype)
+        a, d = np.meshgrid(axis, axis, indexing="ij")
+        for i, p in enumerate(axis):
+            # One pleasure slab at a time keeps the (n², E) temporaries small
+            centers = np.column_stack([np.full(a.size, p), a.ravel(), d.ravel()])
+            distances = np.sqrt(((centers[:, np.newaxis, :] - anchors[np.newaxis, :, :]) ** 2).sum(axis=2))
+            worst = self._prevalence(distances + slack)
+            best = self._prevalence(np.maximum(distances - slack, 0.0))
+
+            # depth emotions score at least `floor` everywhere in the cell, so an
+            # emotion whose best case is below it can never make the top depth
+            floor = np.partition(worst, count - self.depth, axis=1)[:, count - self.depth]
+            candidate = best >= floor[:, np.newaxis]
+
+            # Candidates first, in their ranking at the cell center
+            order = np.argsort(-self._prevalence(distances), axis=1, kind="stable")
+            first = np.argsort(~np.take_along_axis(candidate, order, axis=1), axis=1, kind="stable")
+            slab = np.take_along_axis(order, first[:, :self.width], axis=1).astype(self._dtype)
+
+            found = candidate.sum(axis=1)
+            slab[np.arange(self.width)[np.newaxis, :] >= found[:, np.newaxis]] = self._empty
+            slab[found > self.width, 0] = self._empty
+            table[i] = slab.reshape(n, n, self.width)
+
+        logger.info("Built %d³ emotion lattice (depth %d, width %d): %.1f%% of cells covered",
+                    n, self.depth, self.width, 100.0 * np.mean(table[..., 0] != self._empty))
+        return table
+
+    def top_k(self, point: Tuple[float, float, float], k: int) -> List[RankedEmotion]:
+        if k > self.depth:
+            return self.fallback.top_k(point, k)
+        if k <= 0:
+            return []
+        cell = []
+        for value in point:
+            if not -1.0 <= value <= 1.0:
+                return self.fallback.top_k(point, k)
+            cell.append(int(round((value + 1.0) / self.step)))
+        candidates = self.table[cell[0], cell[1], cell[2]].tolist()
+        if candidates[0] == self._empty:
+            return self.fallback.top_k(point, k)
+
+        entries = []
+        for index in candidates:
+            if index == self._empty:
+                break
+            entries.append(self._entry(index, point))
+        entries.sort(key=_rank_key)
+        return entries[:k]
+
+# Registered backends by name; add entries here to plug in another implementation
+PROXIMITY_BACKENDS: Dict[str, Type[ProximityIndex]] = {
+    "brute_force": BruteForceProximityIndex,
+    "kdtree": KDTreeProximityIndex,
+    "lattice": LatticeProximityIndex,
+}
+
+# Catalogs up to this size are scored with brute force under "auto"
+AUTO_BRUTE_FORCE_LIMIT = 64
+
+def build_proximity_index(coordinates: List[Tuple[float, float, float]], max_distance: float,
+                          backend: Optional[str] = "auto", **options: Any) -> ProximityIndex:
+    """
+    Build the proximity index for a catalog
+
+    Args:
+        coordinates: Emotion coordinates in catalog order
+        max_distance: Distance that maps to a prevalence of 0
+        backend: A PROXIMITY_BACKENDS name, or "auto" to pick by catalog size
+        **options: Backend-specific settings, e.g. resolution for "lattice"
+
+    Returns:
+        ProximityIndex instance
+    """
+    if backend in (None, "auto"):
+        backend = "brute_force" if len(coordinates) <= AUTO_BRUTE_FORCE_LIMIT else "kdtree"
+    try:
+        index_cls = PROXIMITY_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown proximity backend: {backend}")
+    return index_cls(coordinates, max_distance, **options)
@@ -0,0 +1,216 @@
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Tuple, Dict, Any, Optional
+
+import numpy as np
+
+SNAPSHOT_FORMAT = 1
+
+class QuantileSketch:
+    """
+    Fixed-memory streaming quantile sketch (merging t-digest)
+
+    Values are buffered and periodically merged into at most ~2 * compression
+    weighted centroids. Centroids near the tails stay small, so extreme ranks
+    remain accurate. Rank queries use the merged centroids only, so they are
+    O(log k); the buffer is merged once it holds buffer_size values, or as many
+    values as are already merged while the sketch is young. Not thread-safe;
+    PADPopulation serializes access.
+    """
+
+    def __init__(self, compression: float = 100.0, buffer_size: Optional[int] = None):
+        """
+        Args:
+            compression: Accuracy/size trade-off; more centroids for larger values
+            buffer_size: Values collected before a merge (defaults to 5 * compression)
+        """
+        if compression <= 0:
+            raise ValueError(f"compression must be positive, got {compression}")
+        self.compression = compression
+        self.buffer_size = buffer_size or int(5 * compression)
+
+        self._means: List[float] = []
+        self._weights: List[float] = []
+        self._buffer: List[float] = []
+        self._total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        # Interpolation table for rank queries, rebuilt after each merge
+        self._xp = np.empty(0)
+        self._fp = np.empty(0)
+
+    @property
+    def count(self) -> float:
+        """Number of values added"""
+        return self._total + len(self._buffer)
+
+    def add(self, value: float) -> None:
+        self._buffer.append(value)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(self._buffer) >= self._merge_threshold():
+            self._merge()
+
+    def add_many(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        self._buffer.extend(values.tolist())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if len(self._buffer) >= self._merge_threshold():
+            self._merge()
+
+    def _merge_threshold(self) -> int:
+        # Keeps unmerged values to at most half of the sketch while it fills up
+        return max(1, min(self.buffer_size, int(self._total)))
+
+    def _merge(self) -> None:
+        if not self._buffer:
+            return
+        points = sorted(zip(self._means + self._buffer, self._weights + [1.0] * len(self._buffer)))
+        total = self._total + len(self._buffer)
+
+        means: List[float] = []
+        weights: List[float] = []
+        seen = 0.0
+        cur_mean, cur_weight = points[0]
+        for mean, weight in points[1:]:
+            # Largest weight allowed at this quantile: small at the tails, large at the median
+            q = (seen + cur_weight + weight / 2) / total
+            if cur_weight + weight <= 4 * total * q * (1 - q) / self.compression:
+                cur_weight += weight
+                cur_mean += (mean - cur_mean) * weight / cur_weight
+            else:
+                means.append(cur_mean)
+                weights.append(cur_weight)
+                seen += cur_weight
+                cur_mean, cur_weight = mean, weight
+        means.append(cur_mean)
+        weights.append(cur_weight)
+
+        self._means, self._weights, self._total = means, weights, total
+        self._buffer = []
+        self._build_table()
+
+    def _build_table(self) -> None:
+        # Each centroid sits at the middle of its weight; min and max anchor the ends
+        weights = np.asarray(self._weights)
+        centers = np.cumsum(weights) - weights / 2
+        self._xp = np.concatenate(([self.min], self._means, [self.max]))
+        self._fp = np.concatenate(([0.0], centers, [self._total])) / self._total
+
+    def ranks(self, values: np.ndarray) -> np.ndarray:
+        """Fraction of merged values below each value, in [0, 1] (0.5 while empty)"""
+        values = np.asarray(values, dtype=np.float64)
+        if self._total == 0:
+            return np.full(values.shape, 0.5)
+        if self.max == self.min:
+            return np.where(values < self.min, 0.0, np.where(values > self.max, 1.0, 0.5))
+        # Binary search over the centroids, O(log k) per value
+        return np.interp(values, self._xp, self._fp)
+
+    def rank(self, value: float) -> float:
+        return float(self.ranks(np.array([value]))[0])
+
+    def to_dict(self) -> Dict[str, Any]:
+        self._merge()
+        return {
+            "compression": self.compression,
+            "buffer_size": self.buffer_size,
+            "min": self.min if self._total else None,
+            "max": self.max if self._total else None,
+            "means": self._means,
+            "weights": self._weights,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data["compression"], data.get("buffer_size"))
+        if data["means"]:
+            sketch.min, sketch.max = float(data["min"]), float(data["max"])
+            sketch._means = [float(m) for m in data["means"]]
+            sketch._weights = [float(w) for w in data["weights"]]
+            sketch._total = sum(sketch._weights)
+            sketch._build_table()
+        return sketch
+
+class PADPopulation:
+    """
+    Per-dimension quantile sketches of the population's PAD scores
+
+    Each respondent is recorded as their mean delta per answer (raw sum divided
+    by the number of answers), so respondents with different question counts
+    share one distribution. Thread-safe.
+    """
+
+    def __init__(self, compression: float = 100.0, sketches: Optional[Tuple[QuantileSketch, ...]] = None):
+        """
+        Args:
+            compression: Sketch compression for new, empty sketches
+            sketches: Existing (pleasure, arousal, dominance) sketches, e.g. from a snapshot
+        """
+        self.sketches = sketches or tuple(QuantileSketch(compression) for _ in range(3))
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return int(self.sketches[0].count)
+
+    def rank(self, point: Tuple[float, float, float]) -> Tuple[float, float, float]:
+        """Percentile rank of each dimension against the population, without recording point"""
+        with self._lock:
+            return tuple(sketch.rank(value) for sketch, value in zip(self.sketches, point))
+
+    def rank_and_add(self, point: Tuple[float, float, float]) -> Tuple[float, float, float]:
+        """Percentile rank of each dimension against the population so far, then record point"""
+        with self._lock:
+            ranks = tuple(sketch.rank(value) for sketch, value in zip(self.sketches, point))
+            for sketch, value in zip(self.sketches, point):
+                sketch.add(value)
+        return ranks
+
+    def rank_many(self, points: np.ndarray) -> np.ndarray:
+        """Vectorized rank for an (N, 3) array, without recording the rows"""
+        with self._lock:
+            return np.column_stack([sketch.ranks(points[:, i]) for i, sketch in enumerate(self.sketches)])
+
+    def rank_and_add_many(self, points: np.ndarray) -> np.ndarray:
+        """Vectorized rank_and_add for an (N, 3) array; all rows are ranked before any is recorded"""
+        with self._lock:
+            ranks = np.column_stack([sketch.ranks(points[:, i]) for i, sketch in enumerate(self.sketches)])
+            for i, sketch in enumerate(self.sketches):
+                sketch.add_many(points[:, i])
+        return ranks
+
+    def save(self, path: Path) -> None:
+        """Atomically write the sketches to path as JSON"""
+        path = Path(path)
+        with self._lock:
+            data = {"format": SNAPSHOT_FORMAT, "dimensions": [sketch.to_dict() for sketch in self.sketches]}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".population-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path: Path) -> "PADPopulation":
+        """Restore a population saved with save()"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != SNAPSHOT_FORMAT or len(data.get("dimensions", [])) != 3:
+            raise ValueError(f"{path} is not a PAD population snapshot (format {SNAPSHOT_FORMAT})")
+        return cls(sketches=tuple(QuantileSketch.from_dict(d) for d in data["dimensions"]))
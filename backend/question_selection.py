@@ -0,0 +1,137 @@
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Tuple, Dict, Any, Optional, Collection
+
+import numpy as np
+
+from core import PADCoreEngine
+from questionnaire_store import QuestionnaireSnapshot
+
+@dataclass
+class QuestionChoice:
+    """What to ask next, or why to stop"""
+    question_id: Optional[int]         # None once done
+    question: Optional[Dict[str, Any]]  # Standardized question, as served by /questions
+    done: bool
+    reason: str                        # "informative", "stable", "max_questions" or "exhausted"
+    primary_emotion: Optional[str]     # Primary emotion of the answers so far (None before any)
+
+class QuestionSelector:
+    """
+    Adaptive question order for one questionnaire version
+
+    The tables are built once per snapshot: every question's option deltas,
+    padded to the widest question, and the total spread of those deltas in PAD
+    space. Choosing a question is then one vectorized lookahead: each remaining
+    option is added to the answers so far and all of them are scored in a single
+    batch. The next question is the one with the largest share of options that
+    would change the primary emotion, i.e. whose answer best separates it from
+    its rivals; the wider spread breaks ties. Before any answer there is no
+    primary to separate, so the question with the widest spread goes first.
+    Questioning stops once the primary is stable: at most `stability` of the
+    remaining options would change it.
+    """
+
+    def __init__(self, questionnaire: QuestionnaireSnapshot, min_questions: int = 3, max_questions: int = 10,
+                 stability: float = 0.03):
+        """
+        Args:
+            questionnaire: Snapshot whose questions and option deltas are used
+            min_questions: Answers required before stopping early
+            max_questions: Answers after which questioning always stops
+            stability: Largest share of remaining options that may still change
+                the primary emotion when stopping early
+        """
+        self.version = questionnaire.version
+        self.min_questions = min_questions
+        self.max_questions = max_questions
+        self.stability = stability
+
+        row_qids = np.asarray(questionnaire.row_question_ids)
+        self.question_ids: List[int] = list(dict.fromkeys(int(q) for q in row_qids))
+        widest = max((int((row_qids == qid).sum()) for qid in self.question_ids), default=0)
+
+        # (Q, M, 3) option deltas and (Q, M) mask of real options
+        self.option_deltas = np.zeros((len(self.question_ids), widest, 3))
+        self.option_mask = np.zeros((len(self.question_ids), widest), dtype=bool)
+        for i, qid in enumerate(self.question_ids):
+            options = np.asarray(questionnaire.row_deltas)[row_qids == qid]
+            self.option_deltas[i, :len(options)] = options
+            self.option_mask[i, :len(options)] = True
+
+        # (Q,) total spread: mean squared distance of a question's options from their centroid
+        counts = self.option_mask.sum(axis=1)
+        centroids = self.option_deltas.sum(axis=1) / np.maximum(counts, 1)[:, None]
+        squared = ((self.option_deltas - centroids[:, None]) ** 2).sum(axis=2) * self.option_mask
+        self.spread = squared.sum(axis=1) / np.maximum(counts, 1)
+
+        questions = [json.loads(bytes(blob)) for blob in questionnaire.encoded_questions]
+        self.questions: Dict[int, Dict[str, Any]] = {q["id"]: q for q in questions}
+
+    def choose(self, engine: PADCoreEngine, raw: Tuple[float, float, float], num_answers: int,
+               answered: Collection[int]) -> QuestionChoice:
+        """
+        Pick the next question
+
+        Args:
+            engine: Engine whose normalization and emotion catalog define the result
+            raw: Summed (P, A, D) of the answers so far
+            num_answers: Answers behind raw (unanswered questions count, as in /analyze)
+            answered: Question ids already asked
+
+        Returns:
+            QuestionChoice with the question to ask, or done=True and the reason
+        """
+        remaining = np.flatnonzero([qid not in answered for qid in self.question_ids])
+        if num_answers:
+            current = engine.score_raw_many(np.array([raw], dtype=float), np.array([num_answers]), observe=False)
+            primary = int(current.ranking[0, 0])
+            primary_name = engine.emotion_names[primary]
+        else:
+            primary, primary_name = None, None
+
+        if num_answers >= self.max_questions:
+            return QuestionChoice(None, None, True, "max_questions", primary_name)
+        if len(remaining) == 0:
+            return QuestionChoice(None, None, True, "exhausted", primary_name)
+
+        if primary is None:
+            # Nothing to disambiguate yet: every question ties, so the widest spread wins
+            score = np.zeros(len(remaining))
+        else:
+            # Score every remaining option as the next answer in one batch
+            mask = self.option_mask[remaining]
+            options = self.option_deltas[remaining][mask]
+            outcomes = engine.score_raw_many(np.asarray(raw, dtype=float) + options,
+                                             np.full(len(options), num_answers + 1), observe=False)
+            flips = outcomes.ranking[:, 0] != primary
+            if num_answers >= self.min_questions and flips.mean() <= self.stability:
+                return QuestionChoice(None, None, True, "stable", primary_name)
+            owner = np.repeat(np.arange(len(remaining)), mask.sum(axis=1))
+            score = np.bincount(owner, weights=flips, minlength=len(remaining)) / mask.sum(axis=1)
+
+        tied = np.flatnonzero(score == score.max())
+        best = self.question_ids[int(remaining[tied[np.argmax(self.spread[remaining[tied]])]])]
+        return QuestionChoice(best, self.questions.get(best), False, "informative", primary_name)
+
+# Selectors by questionnaire version; a few are kept so in-flight sessions on an
+# older version keep theirs after a reload
+_selectors: "OrderedDict[Tuple[str, int, int, float], QuestionSelector]" = OrderedDict()
+_selectors_lock = threading.Lock()
+_SELECTORS_KEPT = 4
+
+def selector_for(questionnaire: QuestionnaireSnapshot, min_questions: int = 3, max_questions: int = 10,
+                 stability: float = 0.03) -> QuestionSelector:
+    """The QuestionSelector for a snapshot, built on first use"""
+    key = (questionnaire.version, min_questions, max_questions, stability)
+    with _selectors_lock:
+        selector = _selectors.get(key)
+        if selector is None:
+            selector = _selectors[key] = QuestionSelector(questionnaire, min_questions, max_questions, stability)
+            while len(_selectors) > _SELECTORS_KEPT:
+                _selectors.popitem(last=False)
+        else:
+            _selectors.move_to_end(key)
+        return selector
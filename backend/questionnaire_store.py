@@ -0,0 +1,385 @@
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List, Tuple, Dict, Any, Iterable, Optional
+
+import numpy as np
+
+from core import PADDelta
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_MAP_SECONDS = REGISTRY.histogram("pad_map_answers_seconds", "Time mapping one submission's answers to PAD deltas")
+# Both kinds of answer fall back to a zero delta
+_UNANSWERED = REGISTRY.counter("pad_answers_zero_delta_total", "Answers scored as a zero delta", reason="unanswered")
+_UNMAPPED = REGISTRY.counter("pad_answers_zero_delta_total", "Answers scored as a zero delta", reason="unmapped")
+
+# Compiled file layout (little-endian):
+#   magic "PADQ" | format u32 | header length u64 | header JSON | padding to 8 bytes
+#   followed by the sections listed in the header, each 8-byte aligned:
+#     "qids"      int32[n_rows]          question id per answer row
+#     "deltas"    float64[n_rows * 3]    dP, dA, dD per answer row
+#     "offsets"   int64[n_questions + 1] byte offsets into "questions"
+#     "questions" bytes                  pre-encoded standardized question JSON
+MAGIC = b"PADQ"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<4sIQ")
+
+def load_json_file(path: Path) -> dict:
+    """Read a questionnaire file, returning {} (and logging) if it cannot be parsed"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.exception(f"Failed to load {path}: {e}")
+        return {}
+
+def standardize_questions(likert: List[dict], scene: List[dict]) -> List[Dict[str, Any]]:
+    """
+    Returns a combined, standardized question list where each question is:
+    {
+      "id": <int>,
+      "type": "likert" | "scene",
+      "text": "...",
+      "options": [{ "id": <string|number>, "text": "..." }]
+    }
+    """
+    qlist = []
+    for q in likert:
+        qid = q.get("id")
+        mapping = q.get("mapping", [])
+        # options from mapping: use score + emotion as label
+        options = [
+            {
+                "id": item.get("score"),
+                "text": f"{item.get('score')} — {item.get('emotion', '')}",
+            }
+            for item in mapping
+        ]
+        qlist.append(
+            {"id": qid, "type": "likert", "text": q.get("text"), "options": options}
+        )
+
+    for q in scene:
+        qid = q.get("id")
+        opts = []
+        for opt in q.get("options", []):
+            # scene options have id and text
+            opts.append({"id": opt.get("id"), "text": opt.get("text")})
+        qlist.append({"id": qid, "type": "scene", "text": q.get("text"), "options": opts})
+    return qlist
+
+def encode_question(question: Dict[str, Any]) -> bytes:
+    """JSON-encode a question exactly like FastAPI's JSONResponse does"""
+    return json.dumps(question, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def questionnaire_version(*sources: bytes) -> str:
+    """Content hash identifying one revision of the questionnaire files"""
+    digest = hashlib.sha256()
+    for source in sources:
+        digest.update(len(source).to_bytes(8, "little"))
+        digest.update(source)
+    return digest.hexdigest()[:12]
+
+def compile_questionnaires(likert: List[dict], scene: List[dict], version: str) -> bytes:
+    """
+    Compile both questionnaires into the binary layout described above
+
+    Each answer row lists the keys it answers to: the integer score for likert
+    questions, the option id (as a string) and option text for scene questions.
+    """
+    qids: List[int] = []
+    deltas: List[float] = []
+    rows: List[List[Any]] = []
+    for q in likert:
+        for m in q.get("mapping", []):
+            qids.append(q.get("id"))
+            deltas.extend((float(m.get("dP", 0.0)), float(m.get("dA", 0.0)), float(m.get("dD", 0.0))))
+            rows.append([m.get("score")])
+    for q in scene:
+        for opt in q.get("options", []):
+            qids.append(q.get("id"))
+            deltas.extend((float(opt.get("dP", 0.0)), float(opt.get("dA", 0.0)), float(opt.get("dD", 0.0))))
+            rows.append([str(opt.get("id")), opt.get("text")])
+
+    encoded = [encode_question(q) for q in standardize_questions(likert, scene)]
+    offsets = [0]
+    for blob in encoded:
+        offsets.append(offsets[-1] + len(blob))
+
+    sections = [
+        ("qids", struct.pack(f"<{len(qids)}i", *qids)),
+        ("deltas", struct.pack(f"<{len(deltas)}d", *deltas)),
+        ("offsets", struct.pack(f"<{len(offsets)}q", *offsets)),
+        ("questions", b"".join(encoded)),
+    ]
+
+    # Section offsets depend on the header length, so lay out relative positions first
+    relative: Dict[str, List[int]] = {}
+    position = 0
+    for name, data in sections:
+        relative[name] = [position, len(data)]
+        position += _align(len(data))
+
+    header = {"version": version, "n_rows": len(qids), "n_questions": len(encoded), "rows": rows, "sections": relative}
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    body_start = _align(_PREAMBLE.size + len(header_bytes))
+
+    out = bytearray(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+    out += header_bytes
+    out += b"\0" * (body_start - len(out))
+    for name, data in sections:
+        out += data
+        out += b"\0" * (_align(len(data)) - len(data))
+    return bytes(out)
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+class QuestionnaireSnapshot:
+    """
+    One immutable, memory-mapped questionnaire version
+
+    Handlers should fetch a snapshot once per request and use it throughout, so
+    a concurrent reload never mixes two versions within one analysis.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: Compiled questionnaire file to map
+        """
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, header_len = _PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a compiled questionnaire (format {FORMAT_VERSION})")
+        header = json.loads(self._mmap[_PREAMBLE.size:_PREAMBLE.size + header_len])
+        body_start = _align(_PREAMBLE.size + header_len)
+        sections = {name: (body_start + start, length) for name, (start, length) in header["sections"].items()}
+
+        self.path = path
+        self.version: str = header["version"]
+        self.num_rows: int = header["n_rows"]
+
+        # Shared, read-only views into the mapping
+        view = memoryview(self._mmap)
+        qids_at, _ = sections["qids"]
+        deltas_at, _ = sections["deltas"]
+        offsets_at, _ = sections["offsets"]
+        questions_at, _ = sections["questions"]
+
+        # Columnar answer rows: question id and (dP, dA, dD) per row, zero-copy
+        self.row_question_ids: np.ndarray = np.frombuffer(self._mmap, dtype="<i4", count=self.num_rows, offset=qids_at)
+        self.row_deltas: np.ndarray = np.frombuffer(
+            self._mmap, dtype="<f8", count=self.num_rows * 3, offset=deltas_at
+        ).reshape(self.num_rows, 3)
+        offsets = struct.unpack_from(f"<{header['n_questions'] + 1}q", self._mmap, offsets_at)
+        self.encoded_questions: List[memoryview] = [
+            view[questions_at + start:questions_at + end] for start, end in zip(offsets, offsets[1:])
+        ]
+
+        # (question_id, answer key) -> PADDelta; the first row claiming a key wins,
+        # matching the order the options are listed in the source files
+        self.answer_index: Dict[Tuple[int, Any], PADDelta] = {}
+        for row, keys in enumerate(header["rows"]):
+            qid = int(self.row_question_ids[row])
+            dp, da, dd = (float(v) for v in self.row_deltas[row])
+            delta = PADDelta(dp, da, dd, question_id=str(qid))
+            for key in keys:
+                self.answer_index.setdefault((qid, key), delta)
+
+    def resolve(self, qid: int, answer: Any) -> Optional[PADDelta]:
+        """
+        Look up the PAD delta for a single answer, or None if it does not map.
+
+        Likert scores are tried first (any value int() accepts, e.g. 4 or "4"),
+        then scene option ids / texts.
+        """
+        try:
+            found = self.answer_index.get((qid, int(answer)))
+        except (TypeError, ValueError, OverflowError):  # OverflowError: infinite floats
+            found = None
+        if found is None:
+            found = self.answer_index.get((qid, answer if isinstance(answer, str) else str(answer)))
+        return found
+
+    def map_answers(self, answers: Iterable[Tuple[int, Any]]) -> List[PADDelta]:
+        """
+        Map (question_id, answer) pairs -> PAD deltas, using a zero delta for
+        unanswered or unknown answers.
+        """
+        start = time.perf_counter()
+        pad_deltas = []
+        for qid, a in answers:
+            if a is None:  # ✅ skip unanswered
+                _UNANSWERED.inc()
+                logger.debug("Skipping unanswered question %s", qid)
+                pad_deltas.append(PADDelta(0.0, 0.0, 0.0, question_id=str(qid)))
+                continue
+
+            found = self.resolve(qid, a)
+            if found is not None:
+                pad_deltas.append(found)
+                continue
+
+            # If we couldn't map, append zero delta (safe fallback)
+            _UNMAPPED.inc()
+            logger.warning("No mapping found for question %s answer %s; using zero delta", qid, a)
+            pad_deltas.append(PADDelta(0.0, 0.0, 0.0, question_id=str(qid)))
+        _MAP_SECONDS.observe(time.perf_counter() - start)
+        return pad_deltas
+
+class QuestionnaireStore:
+    """
+    Serves the current questionnaire snapshot and hot-reloads it when the source files change
+
+    Source JSON is compiled to <compiled_dir>/questionnaire-<version>.padq (written
+    atomically, so workers can share it) and memory-mapped. Change detection is a
+    cheap stat() of the source files, done at most once per check_interval seconds
+    from whichever request calls current(); the swap is a single reference
+    assignment, so requests already holding the old snapshot finish on it.
+
+    Given a snapshot_path, the store serves that compiled file as-is: the source
+    files are never read or checked, which keeps them off the startup path of
+    workers deployed with a prebuilt snapshot.
+    """
+
+    def __init__(self, likert_path: Path, scene_path: Path, compiled_dir: Path, check_interval: float = 2.0,
+                 snapshot_path: Optional[Path] = None):
+        """
+        Args:
+            likert_path: Likert questionnaire JSON
+            scene_path: Scene questionnaire JSON
+            compiled_dir: Directory for compiled questionnaire files
+            check_interval: Minimum seconds between source file checks (0 = every call)
+            snapshot_path: Compiled questionnaire to serve instead of the sources, without reloading
+        """
+        self.likert_path = Path(likert_path)
+        self.scene_path = Path(scene_path)
+        self.compiled_dir = Path(compiled_dir)
+        self.pinned = snapshot_path is not None
+        self.check_interval = math.inf if self.pinned else check_interval
+
+        self._reload_lock = threading.Lock()
+        self._next_check = time.monotonic() + self.check_interval
+        if self.pinned:
+            self._source_stamp = None
+            self._snapshot = QuestionnaireSnapshot(Path(snapshot_path))
+        else:
+            self._source_stamp = self._stat_sources()
+            self._snapshot = self._load(strict=False)
+
+    def current(self) -> QuestionnaireSnapshot:
+        """Return the active snapshot, reloading first if the sources changed"""
+        if time.monotonic() >= self._next_check:
+            self.check_for_update()
+        return self._snapshot
+
+    @property
+    def snapshot(self) -> QuestionnaireSnapshot:
+        """The active snapshot, without checking the sources"""
+        return self._snapshot
+
+    def check_due(self) -> bool:
+        """True once check_interval has passed since the last source check"""
+        return time.monotonic() >= self._next_check
+
+    def check_for_update(self) -> bool:
+        """
+        Reload if the source files changed since the last load
+
+        Returns:
+            True if a new version was swapped in
+        """
+        if self.pinned:
+            return False
+        # Only one caller reloads; everyone else keeps serving the current snapshot
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            stamp = self._stat_sources()
+            if stamp == self._source_stamp:
+                return False
+            # Remember the stamp either way, so a broken file is reported once per change
+            self._source_stamp = stamp
+            try:
+                snapshot = self._load(strict=True)
+            except Exception as e:
+                # Keep serving the old version, e.g. while a file is half-written
+                logger.exception(f"Questionnaire reload failed, keeping version {self._snapshot.version}: {e}")
+                return False
+            if snapshot.version == self._snapshot.version:
+                return False
+            logger.info("Questionnaire updated: %s -> %s", self._snapshot.version, snapshot.version)
+            self._snapshot = snapshot
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def _stat_sources(self) -> Tuple[Tuple[int, int], ...]:
+        stamps = []
+        for path in (self.likert_path, self.scene_path):
+            try:
+                st = os.stat(path)
+                stamps.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamps.append((0, 0))
+        return tuple(stamps)
+
+    def _load(self, strict: bool) -> QuestionnaireSnapshot:
+        """Compile the sources if this version has no compiled file yet, then map it"""
+        raw = []
+        for path in (self.likert_path, self.scene_path):
+            try:
+                raw.append(path.read_bytes())
+            except OSError:
+                if strict:
+                    raise
+                logger.exception(f"Failed to load {path}")
+                raw.append(b"{}")
+        version = questionnaire_version(*raw)
+
+        compiled_path = self.compiled_dir / f"questionnaire-{version}.padq"
+        if not compiled_path.exists():
+            if strict:
+                likert, scene = (json.loads(data).get("questionnaire", []) for data in raw)
+            else:
+                likert = load_json_file(self.likert_path).get("questionnaire", [])
+                scene = load_json_file(self.scene_path).get("questionnaire", [])
+            self._write_atomic(compiled_path, compile_questionnaires(likert, scene, version))
+        return QuestionnaireSnapshot(compiled_path)
+
+    def _write_atomic(self, path: Path, data: bytes) -> None:
+        self.compiled_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.compiled_dir, prefix=".questionnaire-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+if __name__ == "__main__":
+    # Build step for PAD_QUESTIONNAIRE_SNAPSHOT: compile the questionnaire next to
+    # this file into its compiled directory and print the snapshot's path
+    import sys
+
+    base_dir = Path(__file__).resolve().parent
+    compiled_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else base_dir / "compiled"
+    store = QuestionnaireStore(base_dir / "question_likert.json", base_dir / "question_scene.json", compiled_dir)
+    print(store.current().path)
@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple, Dict, Any, Hashable, Optional
+
+# Raw PAD sums are rounded to this many decimals before keying, so totals that
+# differ only by float summation order share one entry
+KEY_DECIMALS = 9
+
+def catalog_version(emotion_coordinates: Dict[str, Tuple[float, float, float]]) -> str:
+    """Content hash of an emotion catalog (names, order and coordinates)"""
+    digest = hashlib.sha256()
+    for name, coords in emotion_coordinates.items():
+        digest.update(repr((name, tuple(float(c) for c in coords))).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+def result_key(raw_pad: Tuple[float, float, float], num_questions: int, normalization_method: str,
+               catalog: str, top_k: Optional[int]) -> Tuple[Hashable, ...]:
+    """
+    Canonical cache key for one analysis
+
+    Everything after the raw sums depends only on the quantized totals, the answer
+    count (question-based normalization), the normalization method, the emotion
+    catalog and how many emotions are kept.
+    """
+    return (
+        round(raw_pad[0], KEY_DECIMALS) + 0.0,  # + 0.0 folds -0.0 into 0.0
+        round(raw_pad[1], KEY_DECIMALS) + 0.0,
+        round(raw_pad[2], KEY_DECIMALS) + 0.0,
+        num_questions,
+        normalization_method,
+        catalog,
+        top_k,
+    )
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with an optional TTL for analysis results
+
+    Holds at most max_entries results; the least recently used one is evicted
+    when full. Pickles as an empty cache with the same limits, so an engine sent
+    to another process (e.g. a scoring pool worker) gets a private cache there.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: Optional[float] = None):
+        """
+        Args:
+            max_entries: Most results kept at once
+            ttl: Seconds an entry stays valid after it is stored (None = no expiry)
+        """
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be at least 1, got {max_entries}")
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __reduce__(self):
+        return (ResultCache, (self.max_entries, self.ttl))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires and time.monotonic() >= expires:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store value under key, evicting the least recently used entry if full"""
+        expires = time.monotonic() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Size, limits and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,420 @@
+import json
+import logging
+import os
+import secrets
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List, Tuple, Dict, Any, Optional, Iterator, Union
+
+import numpy as np
+
+from core import PADAnalysisResult
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT = 1
+TRIAD_DIMENSIONS = ("pleasure", "arousal", "dominance")
+
+# On-disk columns of a segment: name -> (dtype, extra shape; "E" is the emotion count)
+COLUMNS = {
+    "timestamp": (np.float64, ()),       # analysis time, seconds since the epoch
+    "triad": (np.float32, (3,)),         # core P, A, D
+    "num_questions": (np.uint16, ()),
+    "primary": (np.uint8, ()),           # index into the store's emotion names
+    "prevalence": (np.uint8, ("E",)),    # prevalence score of every emotion, 0-100
+    "version": (np.uint16, ()),          # index into the store's questionnaire versions
+}
+
+class ResultStore:
+    """
+    Append-only columnar store of analysis results
+
+    New rows go to an in-memory tail, which is sealed once it holds flush_rows
+    rows or its oldest row is flush_seconds old, and written out as a segment
+    (one .npy file per column) by a background flusher thread, so append()
+    never waits on the disk. Every compact_after segments of about the same
+    size are merged into one in the background, up to segment_rows rows.
+    results.json lists the segments in time order and is swapped in
+    atomically, so a reader always sees whole segments. Segments are
+    memory-mapped, and the aggregate queries scan their columns with numpy,
+    one segment at a time, skipping segments outside the requested time range.
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike], emotion_names: List[str], flush_rows: int = 4096,
+                 flush_seconds: float = 60.0, compact_after: int = 8, segment_rows: int = 1 << 20):
+        """
+        Args:
+            directory: Where segments and results.json live; created if missing
+            emotion_names: Emotion catalog, in the order of the prevalence column
+            flush_rows: Tail rows that trigger a flush
+            flush_seconds: Age of the oldest tail row that triggers a flush, checked by the flusher thread
+            compact_after: Segments of one size tier merged together
+            segment_rows: Segments with at least this many rows are left alone by compaction
+
+        Raises:
+            ValueError: If the directory holds a store for a different emotion catalog
+        """
+        if flush_rows < 1:
+            raise ValueError(f"flush_rows must be at least 1, got {flush_rows}")
+        if flush_seconds <= 0:
+            raise ValueError(f"flush_seconds must be positive, got {flush_seconds}")
+        if compact_after < 2:
+            raise ValueError(f"compact_after must be at least 2, got {compact_after}")
+        if len(emotion_names) > np.iinfo(COLUMNS["primary"][0]).max + 1:
+            raise ValueError(f"At most 256 emotions can be stored, got {len(emotion_names)}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.emotion_names = list(emotion_names)
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.compact_after = compact_after
+        self.segment_rows = segment_rows
+
+        self._emotion_index = {name: i for i, name in enumerate(self.emotion_names)}
+        self._versions: List[str] = []
+        self._segments: List[Dict[str, Any]] = []   # {"token", "rows", "start", "end"}, oldest first
+        self._mapped: Dict[str, Dict[str, np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        # Serializes segment writes, so segments are listed in the order their rows arrived
+        self._flush_lock = threading.Lock()
+        self._manifest_lock = threading.Lock()
+        self._load_manifest()
+        self._version_index = {version: i for i, version in enumerate(self._versions)}
+        self._tail = self._empty_columns(flush_rows)
+        self._tail_rows = 0
+        self._tail_since = 0.0   # time.monotonic() of the oldest tail row
+        # Sealed tails waiting for the flusher, oldest first; never modified again
+        self._sealed: List[Dict[str, np.ndarray]] = []
+
+        self._closed = False
+        self._wake = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="result-store-flusher", daemon=True)
+        self._flusher.start()
+
+    def _empty_columns(self, rows: int) -> Dict[str, np.ndarray]:
+        shapes = {name: tuple(len(self.emotion_names) if d == "E" else d for d in extra)
+                  for name, (_, extra) in COLUMNS.items()}
+        return {name: np.zeros((rows,) + shapes[name], dtype=dtype) for name, (dtype, _) in COLUMNS.items()}
+
+    def _load_manifest(self) -> None:
+        path = self.directory / "results.json"
+        if not path.exists():
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != STORE_FORMAT:
+            raise ValueError(f"{self.directory} is not a result store (format {STORE_FORMAT})")
+        if manifest["emotions"] != self.emotion_names:
+            raise ValueError(f"{self.directory} holds results for a different emotion catalog")
+        self._versions = manifest["versions"]
+        self._segments = manifest["segments"]
+        # Segments written by a flush or compaction that never reached the manifest
+        listed = {segment["token"] for segment in self._segments}
+        for path in self.directory.glob("segment-*.npy"):
+            if path.name.split(".")[0][len("segment-"):] not in listed:
+                path.unlink()
+
+    def _write_manifest(self) -> None:
+        """Atomically replace results.json with the current segment list; call without _lock held"""
+        # The list is read under _manifest_lock, so the last file written is never older than another
+        with self._manifest_lock:
+            with self._lock:
+                manifest = {"format": STORE_FORMAT, "emotions": self.emotion_names,
+                            "versions": list(self._versions), "segments": list(self._segments)}
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".results-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(manifest, f)
+                os.replace(tmp, self.directory / "results.json")
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+
+    def _unflushed_rows(self) -> int:
+        """Rows not written to a segment yet; call with _lock held"""
+        return self._tail_rows + sum(len(columns["timestamp"]) for columns in self._sealed)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(segment["rows"] for segment in self._segments) + self._unflushed_rows()
+
+    def append(self, result: PADAnalysisResult, prevalence: np.ndarray) -> None:
+        """
+        Record one result; only copies it into the in-memory tail, so it is cheap
+        enough to call from an event loop
+
+        Args:
+            result: Analysis result; its metadata supplies analysis_timestamp and
+                questionnaire_version when set
+            prevalence: Prevalence score of every emotion, in emotion_names order
+                (PADCoreEngine.prevalence_vector)
+        """
+        timestamp = result.metadata.get("analysis_timestamp") or time.time()
+        version = result.metadata.get("questionnaire_version") or ""
+        with self._lock:
+            code = self._version_index.get(version)
+            if code is None:
+                code = self._version_index[version] = len(self._versions)
+                self._versions.append(version)
+            row = self._tail_rows
+            if row == 0:
+                self._tail_since = time.monotonic()
+            tail = self._tail
+            tail["timestamp"][row] = timestamp
+            tail["triad"][row] = result.core_triad.to_tuple()
+            tail["num_questions"][row] = min(result.raw_scores.num_questions, np.iinfo(np.uint16).max)
+            tail["primary"][row] = self._emotion_index[result.primary_emotion]
+            tail["prevalence"][row] = prevalence
+            tail["version"][row] = code
+            self._tail_rows += 1
+            full = self._tail_rows >= self.flush_rows
+            if full:
+                self._seal()
+        if full:
+            self._wake.set()
+
+    def _seal(self) -> None:
+        """Hand the tail over to the flusher and start a new one; call with _lock held"""
+        if self._tail_rows == 0:
+            return
+        self._sealed.append({name: column[:self._tail_rows] for name, column in self._tail.items()})
+        self._tail = self._empty_columns(self.flush_rows)
+        self._tail_rows = 0
+
+    def _flush_loop(self) -> None:
+        """Flusher thread: seals the tail once its oldest row is flush_seconds old and writes sealed tails out"""
+        while not self._closed:
+            self._wake.clear()
+            with self._lock:
+                if self._tail_rows and time.monotonic() - self._tail_since >= self.flush_seconds:
+                    self._seal()
+                timeout = self._tail_since + self.flush_seconds - time.monotonic() if self._tail_rows else None
+            try:
+                self._write_sealed()
+            except Exception:
+                # Sealed tails stay in memory (and queryable) for the next attempt
+                logger.exception("Writing results to %s failed", self.directory)
+                timeout = self.flush_seconds
+            self._wake.wait(timeout)
+
+    def _write_sealed(self) -> None:
+        """Write every sealed tail out as a segment, oldest first"""
+        compact = False
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._sealed:
+                        break
+                    columns = self._sealed[0]
+                segment = self._write_segment(columns)
+                with self._lock:
+                    # Moved from the sealed tails to the segments in one step, so scans count every row once
+                    self._segments.append(segment)
+                    self._sealed.pop(0)
+                    compact = compact or bool(self._mergeable())
+                self._write_manifest()
+                logger.debug("Flushed %d results to %s", segment["rows"], self.directory)
+        if compact:
+            threading.Thread(target=self.compact, name="result-store-compaction", daemon=True).start()
+
+    def flush(self) -> None:
+        """Write every row recorded so far out as segments, in the calling thread"""
+        with self._lock:
+            self._seal()
+        self._write_sealed()
+
+    def close(self) -> None:
+        """Stop the flusher thread and flush"""
+        self._closed = True
+        self._wake.set()
+        self._flusher.join()
+        self.flush()
+
+    def _write_segment(self, columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        token = secrets.token_hex(6)
+        for name, column in columns.items():
+            np.save(self.directory / f"segment-{token}.{name}.npy", column)
+        timestamps = columns["timestamp"]
+        return {"token": token, "rows": len(timestamps),
+                "start": float(timestamps.min()), "end": float(timestamps.max())}
+
+    def _level(self, rows: int) -> int:
+        """Size tier of a segment: each tier holds compact_after times more rows than the one below"""
+        level, size = 0, self.flush_rows * self.compact_after
+        while rows >= size:
+            level, size = level + 1, size * self.compact_after
+        return level
+
+    def _mergeable(self) -> List[Dict[str, Any]]:
+        """The newest run of compact_after same-tier segments below segment_rows; call with _lock held"""
+        run: List[Dict[str, Any]] = []
+        for segment in reversed(self._segments):
+            if segment["rows"] >= self.segment_rows or (run and self._level(segment["rows"]) != self._level(run[0]["rows"])):
+                break
+            run.insert(0, segment)
+        return run if len(run) >= self.compact_after else []
+
+    def compact(self) -> None:
+        """
+        Merge runs of small segments of the same size tier, newest first
+
+        Appends and queries continue meanwhile: each merged segment is written
+        first and swapped for the segments it replaces in one manifest update.
+        Merging a run at a time keeps every result from being rewritten more
+        than about log(segment_rows / flush_rows) / log(compact_after) times.
+        """
+        if not self._compact_lock.acquire(blocking=False):
+            return  # Already running
+        try:
+            while True:
+                with self._lock:
+                    merging = self._mergeable()
+                    parts = [self._columns(segment) for segment in merging]
+                if not merging:
+                    return
+                merged = self._write_segment({name: np.concatenate([part[name] for part in parts]) for name in COLUMNS})
+                tokens = [segment["token"] for segment in merging]
+                with self._lock:
+                    # Segments flushed since are newer, so the run is still contiguous
+                    first = next(i for i, s in enumerate(self._segments) if s["token"] == tokens[0])
+                    self._segments[first:first + len(tokens)] = [merged]
+                    for token in tokens:
+                        self._mapped.pop(token, None)
+                self._write_manifest()
+                # Open memory maps stay valid after their files are unlinked
+                for token in tokens:
+                    for name in COLUMNS:
+                        (self.directory / f"segment-{token}.{name}.npy").unlink(missing_ok=True)
+                logger.info("Compacted %d result segments into one of %d rows", len(merging), merged["rows"])
+        finally:
+            self._compact_lock.release()
+
+    def _columns(self, segment: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """Memory-mapped columns of a segment"""
+        mapped = self._mapped.get(segment["token"])
+        if mapped is None:
+            mapped = {name: np.load(self.directory / f"segment-{segment['token']}.{name}.npy", mmap_mode="r")
+                      for name in COLUMNS}
+            self._mapped[segment["token"]] = mapped
+        return mapped
+
+    def _scan(self, start: Optional[float], end: Optional[float],
+              version: Optional[str]) -> Iterator[Tuple[Dict[str, np.ndarray], np.ndarray]]:
+        """
+        Columns of each segment (and the unflushed rows) overlapping [start, end),
+        with the mask of their rows that match the filters
+        """
+        with self._lock:
+            segments = list(self._segments)
+            unflushed = self._sealed + [{name: column[:self._tail_rows].copy() for name, column in self._tail.items()}]
+            code = self._version_index.get(version) if version is not None else None
+            parts = [self._columns(s) for s in segments
+                     if (start is None or s["end"] >= start) and (end is None or s["start"] < end)]
+        if version is not None and code is None:
+            return
+        for columns in parts + unflushed:
+            timestamps = columns["timestamp"]
+            mask = np.ones(len(timestamps), dtype=bool)
+            if start is not None:
+                mask &= timestamps >= start
+            if end is not None:
+                mask &= timestamps < end
+            if code is not None:
+                mask &= columns["version"] == code
+            if mask.any():
+                yield columns, mask
+
+    def primary_distribution(self, start: Optional[float] = None, end: Optional[float] = None,
+                             version: Optional[str] = None) -> Dict[str, int]:
+        """
+        Number of results per primary emotion
+
+        Args:
+            start: Only results analyzed at or after this time (epoch seconds)
+            end: Only results analyzed before this time
+            version: Only results scored against this questionnaire version
+
+        Returns:
+            Count per emotion name, in catalog order
+        """
+        counts = np.zeros(len(self.emotion_names), dtype=np.int64)
+        for columns, mask in self._scan(start, end, version):
+            counts += np.bincount(columns["primary"][mask], minlength=len(self.emotion_names))
+        return dict(zip(self.emotion_names, counts.tolist()))
+
+    def mean_triad(self, window: float, start: Optional[float] = None, end: Optional[float] = None,
+                   version: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Mean core triad per time window
+
+        Args:
+            window: Window length in seconds; windows are aligned to multiples of it
+            start, end, version: Filters, as in primary_distribution
+
+        Returns:
+            One entry per non-empty window, oldest first: window_start, count and
+            the mean pleasure, arousal and dominance
+        """
+        if window <= 0:
+            raise ValueError(f"window must be positive, got {window}")
+        sums: Dict[int, np.ndarray] = {}
+        for columns, mask in self._scan(start, end, version):
+            buckets = np.floor(columns["timestamp"][mask] / window).astype(np.int64)
+            keys, inverse = np.unique(buckets, return_inverse=True)
+            triad = columns["triad"][mask].astype(np.float64)
+            totals = np.column_stack([np.bincount(inverse, minlength=len(keys))] +
+                                     [np.bincount(inverse, weights=triad[:, i], minlength=len(keys)) for i in range(3)])
+            for key, total in zip(keys.tolist(), totals):
+                sums[key] = sums[key] + total if key in sums else total
+        windows = []
+        for key in sorted(sums):
+            count, *totals = sums[key]
+            entry = {"window_start": key * window, "count": int(count)}
+            entry.update({dim: float(total / count) for dim, total in zip(TRIAD_DIMENSIONS, totals)})
+            windows.append(entry)
+        return windows
+
+    def histogram(self, dimension: str, bins: int = 20, start: Optional[float] = None, end: Optional[float] = None,
+                  version: Optional[str] = None) -> Dict[str, List[float]]:
+        """
+        Histogram of one triad dimension (over [-1, 1]) or one emotion's prevalence (over [0, 100])
+
+        Args:
+            dimension: "pleasure", "arousal", "dominance" or an emotion name
+            bins: Equal-width bins
+            start, end, version: Filters, as in primary_distribution
+
+        Returns:
+            "edges" (bins + 1 values) and "counts" (bins values)
+
+        Raises:
+            ValueError: For an unknown dimension or fewer than one bin
+        """
+        if bins < 1:
+            raise ValueError(f"bins must be at least 1, got {bins}")
+        if dimension in TRIAD_DIMENSIONS:
+            column, index, value_range = "triad", TRIAD_DIMENSIONS.index(dimension), (-1.0, 1.0)
+        elif dimension in self._emotion_index:
+            column, index, value_range = "prevalence", self._emotion_index[dimension], (0.0, 100.0)
+        else:
+            raise ValueError(f"Unknown dimension: {dimension}")
+        edges = np.linspace(value_range[0], value_range[1], bins + 1)
+        counts = np.zeros(bins, dtype=np.int64)
+        for columns, mask in self._scan(start, end, version):
+            counts += np.histogram(columns[column][:, index][mask], bins=edges)[0]
+        return {"edges": edges.tolist(), "counts": counts.tolist()}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "results": sum(s["rows"] for s in self._segments) + self._unflushed_rows(),
+                "segments": len(self._segments),
+                "unflushed": self._unflushed_rows(),
+                "questionnaire_versions": len(self._versions),
+            }
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Tuple, Dict, Any, Deque, Optional, Set
+
+from core import PADCoreEngine, PADAnalysisResult, NormalizationMethod
+from questionnaire_store import QuestionnaireSnapshot
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# One submission as sent to a worker: (question_id, answer) pairs
+Submission = List[Tuple[int, Any]]
+
+# Per-process state, set up by _init_worker in each pool process
+_worker_engine: Optional[PADCoreEngine] = None
+_worker_snapshot: Optional[QuestionnaireSnapshot] = None
+
+def _init_worker(engine_kwargs: Dict[str, Any], snapshot_path: Path) -> None:
+    """Build the engine and map the current questionnaire once per worker process"""
+    global _worker_engine, _worker_snapshot
+    _worker_engine = PADCoreEngine(**engine_kwargs)
+    _worker_snapshot = QuestionnaireSnapshot(snapshot_path)
+
+def _worker_questionnaire(snapshot_path: Path) -> QuestionnaireSnapshot:
+    """The snapshot for snapshot_path, remapping it after a questionnaire reload"""
+    global _worker_snapshot
+    if _worker_snapshot is None or _worker_snapshot.path != snapshot_path:
+        _worker_snapshot = QuestionnaireSnapshot(snapshot_path)
+    return _worker_snapshot
+
+def _score_batch(snapshot_path: Path, submissions: List[Submission],
+                 top_k: Optional[int]) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    Score a micro-batch inside a worker
+
+    Returns:
+        (one PADAnalysisResult or exception per submission, worker report with the
+        pid, seconds spent scoring, result cache stats and metrics snapshot)
+    """
+    start = time.perf_counter()
+    questionnaire = _worker_questionnaire(snapshot_path)
+    results: List[Any] = []
+    for answers in submissions:
+        try:
+            result = _worker_engine.analyze_pad_profile(questionnaire.map_answers(answers), top_k=top_k)
+            result.metadata["questionnaire_version"] = questionnaire.version
+            results.append(result)
+        except Exception as e:
+            # Reported to the caller of that submission only
+            results.append(e)
+    cache = _worker_engine.result_cache
+    report = {
+        "pid": os.getpid(),
+        "busy_seconds": time.perf_counter() - start,
+        "result_cache": cache.stats() if cache is not None else None,
+        "metrics": REGISTRY.snapshot(),
+    }
+    return results, report
+
+class ScoringPool:
+    """
+    Process pool for CPU-bound scoring behind the async app
+
+    Each worker builds its own PADCoreEngine and maps the compiled questionnaire
+    at startup. Submissions wait in a queue until a worker is free; the
+    dispatcher then sends up to max_batch of them (waiting at most max_wait
+    seconds to fill a batch) in one call, so pickling and IPC costs are paid per
+    batch rather than per request. At most one batch is in flight per worker,
+    which keeps the backlog visible as queue_depth in stats().
+
+    Percentile normalization is refused: each worker would rank against and
+    update a population of its own, which the parent never sees or saves.
+    """
+
+    def __init__(self, workers: int, snapshot_path: Path, engine_kwargs: Optional[Dict[str, Any]] = None,
+                 top_k: Optional[int] = None, max_batch: int = 32, max_wait: float = 0.002):
+        """
+        Args:
+            workers: Number of worker processes
+            snapshot_path: Compiled questionnaire file to preload in every worker
+            engine_kwargs: Keyword arguments for each worker's PADCoreEngine
+            top_k: Number of emotion scores kept per result (all emotions if None)
+            max_batch: Most submissions sent to a worker in one call
+            max_wait: Longest time (seconds) a batch is held open waiting for more submissions
+
+        Raises:
+            ValueError: For invalid sizes or percentile normalization in engine_kwargs
+        """
+        if workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}")
+        if (engine_kwargs or {}).get("normalization_method") == NormalizationMethod.PERCENTILE:
+            raise ValueError("Percentile normalization needs one shared population and cannot be "
+                             "used with scoring workers; score inline (PAD_SCORING_WORKERS=0) instead")
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be at least 1, got {max_batch}")
+        self.workers = workers
+        self.top_k = top_k
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        # spawn, not fork: the parent is running an event loop and server threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(engine_kwargs or {}, snapshot_path),
+        )
+        self._pending: Deque[Tuple[Path, Submission, asyncio.Future]] = deque()
+        self._batch_tasks: Set[asyncio.Task] = set()
+        self._arrived: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        # Counters reported by stats()
+        self._started = time.monotonic()
+        self._busy_workers = 0
+        self._busy_seconds = 0.0
+        self._batches = 0
+        self._submissions = 0
+        # Latest result cache stats reported by each worker, by pid
+        self._worker_cache_stats: Dict[int, Dict[str, Any]] = {}
+        # Latest metrics registry snapshot from each worker, by pid
+        self._worker_metrics: Dict[int, Dict[str, Any]] = {}
+
+    async def score(self, snapshot: QuestionnaireSnapshot, answers: Submission) -> PADAnalysisResult:
+        """
+        Score one submission against snapshot in the pool
+
+        Raises:
+            Whatever analyze_pad_profile raised for this submission
+        """
+        if self._dispatcher is None:
+            self._start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((snapshot.path, answers, future))
+        self._arrived.set()
+        return await future
+
+    def _start(self) -> None:
+        # Created on first use so they bind to the server's event loop
+        self._arrived = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def _wait_for_submissions(self, timeout: Optional[float] = None) -> None:
+        self._arrived.clear()
+        await asyncio.wait_for(self._arrived.wait(), timeout)
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            while not self._pending:
+                await self._wait_for_submissions()
+
+            # Hold the batch open briefly so concurrent requests share one call
+            deadline = loop.time() + self.max_wait
+            while len(self._pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    await self._wait_for_submissions(timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            # A batch never mixes questionnaire versions across a reload
+            path = self._pending[0][0]
+            batch = []
+            while self._pending and len(batch) < self.max_batch and self._pending[0][0] == path:
+                batch.append(self._pending.popleft())
+
+            task = loop.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[Path, Submission, asyncio.Future]]) -> None:
+        self._busy_workers += 1
+        try:
+            results, report = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _score_batch, batch[0][0], [answers for _, answers, _ in batch], self.top_k
+            )
+            self._busy_seconds += report["busy_seconds"]
+            self._worker_metrics[report["pid"]] = report["metrics"]
+            if report["result_cache"] is not None:
+                self._worker_cache_stats[report["pid"]] = report["result_cache"]
+        except Exception as e:
+            # The pool itself failed (e.g. a worker died); fail the whole batch
+            logger.exception(f"Scoring batch of {len(batch)} failed: {e}")
+            results = [e] * len(batch)
+        finally:
+            self._busy_workers -= 1
+            self._slots.release()
+        self._batches += 1
+        self._submissions += len(batch)
+
+        for (_, _, future), result in zip(batch, results):
+            if future.done():  # caller went away
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def worker_metrics(self) -> List[Dict[str, Any]]:
+        """Metrics snapshots of the workers, as of each one's last batch"""
+        return list(self._worker_metrics.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Pool sizing figures
+
+        queue_depth counts submissions waiting for a worker; utilization is the
+        share of total worker time spent scoring since the pool started.
+        result_cache sums the per-worker caches as of each worker's last batch.
+        """
+        uptime = time.monotonic() - self._started
+        result_cache = None
+        if self._worker_cache_stats:
+            result_cache = {
+                name: sum(worker[name] for worker in self._worker_cache_stats.values())
+                for name in ("entries", "max_entries", "hits", "misses", "evictions", "expirations")
+            }
+            lookups = result_cache["hits"] + result_cache["misses"]
+            result_cache["hit_rate"] = result_cache["hits"] / lookups if lookups else 0.0
+        return {
+            "workers": self.workers,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": len(self._pending),
+            "busy_workers": self._busy_workers,
+            "utilization": self._busy_seconds / (uptime * self.workers) if uptime > 0 else 0.0,
+            "busy_seconds": self._busy_seconds,
+            "batches": self._batches,
+            "submissions": self._submissions,
+            "mean_batch_size": self._submissions / self._batches if self._batches else 0.0,
+            "result_cache": result_cache,
+        }
+
+    async def close(self) -> None:
+        """Stop dispatching and shut the worker processes down"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
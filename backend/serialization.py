@@ -0,0 +1,86 @@
+import json
+from typing import List, Tuple, Dict, Any, Optional
+
+from core import PADAnalysisResult, LazyEmotionScores
+
+# Optional accelerators: orjson for JSON, msgpack for the binary format.
+# Without them JSON falls back to the standard library and msgpack is not offered.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+def top_emotions(result: PADAnalysisResult, n: int) -> List[Tuple[str, int]]:
+    """(emotion name, prevalence) for the top n, without materializing lazy EmotionScores"""
+    scores = result.emotion_scores
+    if isinstance(scores, LazyEmotionScores):
+        return scores.summary(n)
+    return [(s.emotion_name, s.prevalence_score) for s in scores[:n]]
+
+def result_payload(result: PADAnalysisResult, top_n: int) -> Dict[str, Any]:
+    """The /analyze response body for result, built from its fields without copying them"""
+    triad = result.core_triad
+    payload = {
+        "primary_emotion": result.primary_emotion,
+        "secondary_emotion": result.secondary_emotion,
+        "core_triad": {
+            "pleasure": triad.pleasure,
+            "arousal": triad.arousal,
+            "dominance": triad.dominance,
+        },
+        "top_emotions": [{"name": name, "score": score} for name, score in top_emotions(result, top_n)],
+        "metadata": result.metadata,
+    }
+    if result.confidence is not None:
+        payload["confidence"] = result.confidence.to_dict()
+    return payload
+
+def dumps_json(payload: Any) -> bytes:
+    """Compact UTF-8 JSON, encoded like FastAPI's JSONResponse"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def dumps_msgpack(payload: Any) -> bytes:
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    return msgpack.packb(payload, use_bin_type=True)
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Pick the response media type for an Accept header
+
+    MessagePack is chosen only when msgpack is installed and the client ranks
+    it above JSON; anything else gets JSON.
+    """
+    if not accept or msgpack is None:
+        return JSON_MEDIA_TYPE
+    best, best_q = JSON_MEDIA_TYPE, -1.0
+    for part in accept.split(","):
+        media_type, *params = (p.strip() for p in part.split(";"))
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type in MSGPACK_MEDIA_TYPES and q > best_q:
+            best, best_q = MSGPACK_MEDIA_TYPES[0], q
+        elif media_type in (JSON_MEDIA_TYPE, "application/*", "*/*") and q > best_q:
+            best, best_q = JSON_MEDIA_TYPE, q
+    return best if best_q > 0 else JSON_MEDIA_TYPE
+
+def encode(payload: Any, media_type: str) -> bytes:
+    """Encode payload for a media type returned by negotiate()"""
+    if media_type == JSON_MEDIA_TYPE:
+        return dumps_json(payload)
+    return dumps_msgpack(payload)
@@ -0,0 +1,175 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple, Dict, Any, Optional, FrozenSet
+
+from core import PADCoreEngine, PADAnalysisResult, PADDelta, RawPADScore
+from questionnaire_store import QuestionnaireSnapshot
+
+class ScoringSession:
+    """
+    Running PAD totals for one respondent answering question by question
+
+    Answers are kept in the order first given, like the answers list of one
+    /analyze request. A new answer is added to the totals in O(1); changing or
+    retracting one re-sums the stored deltas (at most one per question) so the
+    totals stay exactly what /analyze would compute for the same answers.
+    """
+    __slots__ = ("session_id", "questionnaire", "adaptive", "tenant", "deltas", "pleasure", "arousal", "dominance",
+                 "last_seen", "_lock")
+
+    def __init__(self, session_id: str, questionnaire: QuestionnaireSnapshot, adaptive: bool = False,
+                 tenant: Optional[str] = None):
+        """
+        Args:
+            session_id: Opaque id handed to the client
+            questionnaire: Snapshot every answer in this session is mapped with
+            adaptive: Whether previews suggest the next question (see question_selection.py)
+            tenant: Tenant whose engine scores the session (see tenants.py); None for the default one
+        """
+        self.session_id = session_id
+        self.questionnaire = questionnaire
+        self.adaptive = adaptive
+        self.tenant = tenant
+        self.deltas: Dict[int, Tuple[float, float, float]] = {}
+        self.pleasure = self.arousal = self.dominance = 0.0
+        self.last_seen = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_answer(self, qid: int, delta: PADDelta) -> None:
+        """Record or replace the answer to question qid"""
+        triple = (delta.pleasure, delta.arousal, delta.dominance)
+        with self._lock:
+            if qid in self.deltas:
+                self.deltas[qid] = triple
+                self._resum()
+                return
+            self.deltas[qid] = triple
+            self.pleasure += triple[0]
+            self.arousal += triple[1]
+            self.dominance += triple[2]
+
+    def retract_answer(self, qid: int) -> bool:
+        """
+        Remove the answer to question qid
+
+        Returns:
+            False if the question had not been answered
+        """
+        with self._lock:
+            if self.deltas.pop(qid, None) is None:
+                return False
+            self._resum()
+            return True
+
+    def _resum(self) -> None:
+        # Left to right from zero, the same order as the engine's own sum
+        self.pleasure = self.arousal = self.dominance = 0.0
+        for dp, da, dd in self.deltas.values():
+            self.pleasure += dp
+            self.arousal += da
+            self.dominance += dd
+
+    def raw_scores(self) -> RawPADScore:
+        """The running totals as a RawPADScore"""
+        with self._lock:
+            return RawPADScore(self.pleasure, self.arousal, self.dominance, len(self.deltas))
+
+    def progress(self) -> Tuple[RawPADScore, FrozenSet[int]]:
+        """The running totals and the ids of the questions answered, taken together"""
+        with self._lock:
+            return (RawPADScore(self.pleasure, self.arousal, self.dominance, len(self.deltas)),
+                    frozenset(self.deltas))
+
+    def analyze(self, engine: PADCoreEngine, top_k: Optional[int] = None) -> Optional[PADAnalysisResult]:
+        """
+        Score the running totals, or None before the first answer
+
+        Previews are provisional, so they are not added to a percentile population.
+        """
+        raw_scores = self.raw_scores()
+        if raw_scores.num_questions == 0:
+            return None
+        result = engine.analyze_raw_pad_scores(raw_scores, top_k=top_k, observe=False)
+        result.metadata["questionnaire_version"] = self.questionnaire.version
+        return result
+
+class SessionStore:
+    """
+    Thread-safe in-memory store of scoring sessions
+
+    Sessions idle for longer than idle_timeout seconds are dropped, and the
+    least recently used session is evicted once max_sessions is reached.
+    """
+
+    def __init__(self, max_sessions: int = 10000, idle_timeout: float = 900.0):
+        """
+        Args:
+            max_sessions: Most sessions kept at once
+            idle_timeout: Seconds without activity after which a session expires
+        """
+        if max_sessions < 1:
+            raise ValueError(f"max_sessions must be at least 1, got {max_sessions}")
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+
+        # Least recently used first
+        self._sessions: "OrderedDict[str, ScoringSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self, questionnaire: QuestionnaireSnapshot, adaptive: bool = False,
+               tenant: Optional[str] = None) -> ScoringSession:
+        """Start a session pinned to questionnaire and tenant"""
+        session = ScoringSession(secrets.token_urlsafe(16), questionnaire, adaptive, tenant)
+        with self._lock:
+            self._expire(session.last_seen)
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+            self._sessions[session.session_id] = session
+            self.created += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[ScoringSession]:
+        """Return the session and mark it active, or None if unknown or expired"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_seen = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def close(self, session_id: str) -> bool:
+        """End a session; False if it did not exist"""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _expire(self, now: float) -> None:
+        # Oldest activity is at the front, so stop at the first live session
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen < self.idle_timeout:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Live session count, limits and lifecycle counters"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_timeout_seconds": self.idle_timeout,
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Tuple, Dict, Any, Optional, Union
+
+from core import PADCoreEngine, EmotionCatalog, NormalizationMethod
+from questionnaire_store import QuestionnaireStore
+from result_cache import catalog_version
+
+logger = logging.getLogger(__name__)
+
+# Tenant served when a request names none
+DEFAULT_TENANT = "default"
+
+@dataclass
+class Tenant:
+    """One brand / locale configuration: the engine and questionnaire its requests use"""
+    name: str
+    engine: PADCoreEngine
+    questionnaires: QuestionnaireStore
+
+@dataclass(frozen=True)
+class _TenantSpec:
+    normalization_method: NormalizationMethod
+    catalog: EmotionCatalog
+    questionnaires: QuestionnaireStore
+
+class EngineRegistry:
+    """
+    Per-tenant engines sharing immutable compiled tables
+
+    A tenant's emotion catalog is the default one unless its configuration
+    replaces it ("emotions") or overrides part of it ("emotion_overrides",
+    "remove_emotions"). Overrides are applied to a copy, so the base catalog is
+    never modified, and every catalog is compiled once per content hash: tenants
+    with equal catalogs share one coordinate table, matrix and proximity index.
+    Questionnaire stores are shared by source files; tenants without their own
+    files use the default questionnaire. Engines hold only per-tenant settings
+    (normalization, population) on top of the shared tables, are built on a
+    tenant's first request and then reused.
+    """
+
+    def __init__(self, default: Tenant, engine_options: Optional[Dict[str, Any]] = None,
+                 compiled_dir: Optional[Union[str, os.PathLike]] = None, proximity_backend: str = "auto",
+                 proximity_options: Optional[Dict[str, Any]] = None, check_interval: float = 2.0):
+        """
+        Args:
+            default: Tenant served when a request names none; its catalog is the base for overrides
+            engine_options: PADCoreEngine settings shared by every tenant engine,
+                e.g. trusted, result_cache, instrumented
+            compiled_dir: Compiled questionnaires for tenant question files, and
+                tenants/population-<name>.json snapshots for percentile tenants
+            proximity_backend: Backend for tenant catalogs, as in PADCoreEngine
+            proximity_options: Backend settings for tenant catalogs
+            check_interval: Source check interval for tenant questionnaire stores
+        """
+        self.default = default
+        self.engine_options = dict(engine_options or {})
+        self.compiled_dir = Path(compiled_dir) if compiled_dir is not None else None
+        self.proximity_backend = proximity_backend
+        self.proximity_options = proximity_options
+        self.check_interval = check_interval
+
+        self._specs: Dict[str, _TenantSpec] = {}
+        self._tenants: Dict[str, Tenant] = {DEFAULT_TENANT: default}
+        self._catalogs: Dict[str, EmotionCatalog] = {default.engine.catalog_version: default.engine.catalog}
+        self._stores: Dict[Tuple[Path, Path], QuestionnaireStore] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._specs) + 1
+
+    def names(self) -> List[str]:
+        return [DEFAULT_TENANT] + sorted(self._specs)
+
+    def add(self, name: str, normalization: Optional[str] = None,
+            emotions: Optional[Dict[str, Tuple[float, float, float]]] = None,
+            emotion_overrides: Optional[Dict[str, Tuple[float, float, float]]] = None,
+            remove_emotions: Optional[List[str]] = None, likert_path: Optional[Union[str, os.PathLike]] = None,
+            scene_path: Optional[Union[str, os.PathLike]] = None) -> None:
+        """
+        Register or replace a tenant
+
+        Args:
+            name: Tenant id, as sent in requests
+            normalization: NormalizationMethod value; defaults to the default tenant's
+            emotions: Complete catalog {name: (P, A, D)} replacing the default one
+            emotion_overrides: Emotions to add or move in the base catalog
+            remove_emotions: Emotions to drop from the base catalog
+            likert_path: Likert questionnaire JSON; both paths or neither
+            scene_path: Scene questionnaire JSON
+
+        Raises:
+            ValueError: For the default tenant's name, an unknown normalization, an
+                invalid catalog or only one questionnaire path
+        """
+        if name == DEFAULT_TENANT:
+            raise ValueError(f"'{DEFAULT_TENANT}' is the built-in tenant and cannot be configured")
+        method = NormalizationMethod(normalization) if normalization else self.default.engine.normalization_method
+        if (likert_path is None) != (scene_path is None):
+            raise ValueError(f"Tenant {name}: give both likert and scene questionnaire files, or neither")
+
+        coordinates = emotions if emotions is not None else self.default.engine.emotion_coordinates
+        if emotion_overrides or remove_emotions:
+            coordinates = dict(coordinates)
+            coordinates.update({emotion: tuple(point) for emotion, point in (emotion_overrides or {}).items()})
+            for emotion in remove_emotions or []:
+                if coordinates.pop(emotion, None) is None:
+                    raise ValueError(f"Tenant {name}: cannot remove unknown emotion {emotion}")
+
+        spec = _TenantSpec(method, self._catalog(name, coordinates), self._store(likert_path, scene_path))
+        with self._lock:
+            self._specs[name] = spec
+            self._tenants.pop(name, None)
+
+    def _catalog(self, name: str, coordinates: Dict[str, Tuple[float, float, float]]) -> EmotionCatalog:
+        """The compiled catalog for these coordinates, compiling it only if no tenant has it yet"""
+        try:
+            version = catalog_version(coordinates)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Tenant {name}: invalid emotion catalog: {e}")
+        with self._lock:
+            catalog = self._catalogs.get(version)
+        if catalog is None:
+            try:
+                catalog = EmotionCatalog.compile(coordinates, self.proximity_backend, self.proximity_options)
+            except Exception as e:
+                raise ValueError(f"Tenant {name}: invalid emotion catalog: {e}")
+            with self._lock:
+                catalog = self._catalogs.setdefault(version, catalog)
+        return catalog
+
+    def _store(self, likert_path: Optional[Union[str, os.PathLike]],
+               scene_path: Optional[Union[str, os.PathLike]]) -> QuestionnaireStore:
+        """The questionnaire store for these source files, shared by every tenant using them"""
+        if likert_path is None:
+            return self.default.questionnaires
+        key = (Path(likert_path).resolve(), Path(scene_path).resolve())
+        default_key = (self.default.questionnaires.likert_path.resolve(), self.default.questionnaires.scene_path.resolve())
+        if key == default_key:
+            return self.default.questionnaires
+        with self._lock:
+            store = self._stores.get(key)
+            if store is None:
+                # Compiled files are named by content hash, so equal files in two
+                # places map the same compiled file
+                compiled_dir = self.compiled_dir or self.default.questionnaires.compiled_dir
+                store = self._stores[key] = QuestionnaireStore(key[0], key[1], compiled_dir, self.check_interval)
+            return store
+
+    def load(self, path: Union[str, os.PathLike]) -> None:
+        """
+        Register the tenants of a JSON configuration file
+
+        Format: {"tenants": {"<name>": {"normalization": ..., "emotions": {...},
+        "emotion_overrides": {...}, "remove_emotions": [...],
+        "questionnaire": {"likert": ..., "scene": ...}}}}, every key optional.
+        Questionnaire paths are relative to the configuration file.
+
+        Raises:
+            ValueError: If the file is malformed or a tenant is invalid
+        """
+        path = Path(path)
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        tenants = config.get("tenants")
+        if not isinstance(tenants, dict):
+            raise ValueError(f"{path} must have a \"tenants\" object")
+        for name, settings in tenants.items():
+            questionnaire = settings.get("questionnaire") or {}
+            self.add(
+                name,
+                normalization=settings.get("normalization"),
+                emotions=settings.get("emotions"),
+                emotion_overrides=settings.get("emotion_overrides"),
+                remove_emotions=settings.get("remove_emotions"),
+                likert_path=path.parent / questionnaire["likert"] if "likert" in questionnaire else None,
+                scene_path=path.parent / questionnaire["scene"] if "scene" in questionnaire else None,
+            )
+        logger.info("Loaded %d tenants sharing %d emotion catalogs from %s", len(tenants), len(self._catalogs), path)
+
+    def get(self, name: Optional[str] = None) -> Tenant:
+        """
+        The tenant for a request, building its engine on first use
+
+        Raises:
+            KeyError: If no tenant has this name
+        """
+        if name is None or name == DEFAULT_TENANT:
+            return self.default
+        tenant = self._tenants.get(name)
+        if tenant is not None:
+            return tenant
+        with self._lock:
+            tenant = self._tenants.get(name)
+            if tenant is None:
+                spec = self._specs[name]
+                tenant = self._tenants[name] = Tenant(name, self._build_engine(name, spec), spec.questionnaires)
+            return tenant
+
+    def _build_engine(self, name: str, spec: _TenantSpec) -> PADCoreEngine:
+        options = dict(self.engine_options)
+        if spec.normalization_method == NormalizationMethod.PERCENTILE and self.compiled_dir is not None:
+            options["population_snapshot"] = self._population_path(name)
+        return PADCoreEngine(normalization_method=spec.normalization_method, catalog=spec.catalog, **options)
+
+    def _population_path(self, name: str) -> Path:
+        return self.compiled_dir / "tenants" / f"population-{name}.json"
+
+    def save_populations(self) -> None:
+        """Save the percentile population of every tenant engine built so far"""
+        if self.compiled_dir is None:
+            return
+        with self._lock:
+            tenants = [tenant for name, tenant in self._tenants.items() if name != DEFAULT_TENANT]
+        for tenant in tenants:
+            if tenant.engine.population is not None:
+                path = self._population_path(tenant.name)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tenant.engine.population.save(path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tenants": len(self._specs) + 1,
+                "engines_built": len(self._tenants),
+                "emotion_catalogs": len(self._catalogs),
+                "questionnaires": len(self._stores) + 1,
+            }
@@ -0,0 +1,47 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import bulk_score  # noqa: E402
+
+GOOD = {"id": "good", "answers": [{"question_id": 21, "answer": 4}, {"question_id": "3", "answer": "3b"}]}
+MALFORMED = [
+    b"{not json\n",
+    b"[1, 2]\n",
+    b'{"answers": [1]}\n',
+    b'{"id": "list-id", "answers": [{"question_id": [21], "answer": 4}]}\n',
+    b'{"id": "no-id", "answers": [{"answer": 4}]}\n',
+    b'{"id": "infinite", "answers": [{"question_id": 21, "answer": 1e999}]}\n',
+]
+
+
+def run(monkeypatch, tmp_path: Path, lines) -> dict:
+    source = tmp_path / "in.ndjson"
+    source.write_bytes(b"".join(lines))
+    out = tmp_path / "out"
+    monkeypatch.setenv("PAD_COMPILED_DIR", str(tmp_path / "compiled"))
+    monkeypatch.setattr(sys, "argv", ["bulk_score.py", str(source), str(out), "--workers", "1"])
+    bulk_score.main()
+    return json.loads((out / "manifest.json").read_text()), out
+
+
+def test_malformed_lines_are_skipped_and_counted(monkeypatch, tmp_path):
+    good = json.dumps(GOOD).encode() + b"\n"
+    manifest, out = run(monkeypatch, tmp_path, [good, *MALFORMED, good])
+
+    assert manifest["complete"]
+    assert manifest["records"] == 2
+    assert manifest["skipped"] == len(MALFORMED)
+    part = np.load(out / manifest["parts"][0]["file"])
+    assert part["id"].tolist() == ["good", "good"]
+    assert part["valid"].all()
+
+
+def test_parse_ndjson_record_coerces_question_ids():
+    record_id, answers = bulk_score.parse_ndjson_record(json.dumps(GOOD).encode(), 0)
+    assert record_id == "good"
+    assert answers == [(21, 4), (3, "3b")]
@@ -0,0 +1,20 @@
+// src/app/api/analyze/batch/route.ts
+import { NextResponse } from "next/server";
+import { backendFetch, relay, forwardedHeaders } from "../../../../lib/backend";
+
+// Pipes the upload to the backend and its NDJSON results back without buffering either side.
+export async function POST(request: Request) {
+  try {
+    const backendRes = await backendFetch("/analyze/batch", {
+      method: "POST",
+      headers: {
+        "Content-Type": request.headers.get("content-type") ?? "application/x-ndjson",
+        ...forwardedHeaders(request),
+      },
+      body: request.body,
+    });
+    return relay(backendRes, "application/x-ndjson");
+  } catch (err) {
+    return NextResponse.json({ error: "Failed to analyze answers" }, { status: 500 });
+  }
+}
@@ -1,16 +1,18 @@
 // src/app/api/analyze/route.ts
 import { NextResponse } from "next/server";
+import { backendFetch, relay, forwardedHeaders } from "../../../lib/backend";
 
 export async function POST(request: Request) {
   try {
-    const body = await request.json();
-    const backendRes = await fetch("http://localhost:8000/analyze", {
+    // The body is forwarded and the result relayed as bytes; the backend validates both.
+    // ?confidence=<samples> is passed through for bootstrap confidence estimates
+    const { search } = new URL(request.url);
+    const backendRes = await backendFetch(`/analyze${search}`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(body),
+      headers: { "Content-Type": "application/json", ...forwardedHeaders(request) },
+      body: await request.text(),
     });
-    const data = await backendRes.json();
-    return NextResponse.json(data);
+    return relay(backendRes);
   } catch (err) {
     return NextResponse.json({ error: "Failed to analyze answers" }, { status: 500 });
   }
@@ -0,0 +1,18 @@
+// src/app/api/profiles/[userId]/matches/route.ts
+import { NextResponse } from "next/server";
+import { backendFetch, relay, forwardedHeaders } from "../../../../../lib/backend";
+
+type Params = { params: Promise<{ userId: string }> };
+
+// Query: ?k=10&metric=euclidean|cosine
+export async function GET(request: Request, { params }: Params) {
+  const { userId } = await params;
+  const query = new URL(request.url).search;
+  try {
+    return relay(await backendFetch(`/profiles/${encodeURIComponent(userId)}/matches${query}`, {
+      headers: forwardedHeaders(request),
+    }));
+  } catch (err) {
+    return NextResponse.json({ error: "Failed to find matches" }, { status: 500 });
+  }
+}
@@ -0,0 +1,31 @@
+// src/app/api/profiles/[userId]/route.ts
+import { NextResponse } from "next/server";
+import { backendFetch, relay, forwardedHeaders } from "../../../../lib/backend";
+
+type Params = { params: Promise<{ userId: string }> };
+
+async function forward(request: Request, method: string, userId: string, body?: string) {
+  try {
+    const backendRes = await backendFetch(`/profiles/${encodeURIComponent(userId)}`, {
+      method,
+      headers: body === undefined
+        ? forwardedHeaders(request)
+        : { "Content-Type": "application/json", ...forwardedHeaders(request) },
+      body,
+    });
+    return relay(backendRes);
+  } catch (err) {
+    return NextResponse.json({ error: "Failed to update profile" }, { status: 500 });
+  }
+}
+
+// Body: the /analyze body, { "answers": [ { "question_id": 21, "answer": 4 }, ... ] }
+export async function PUT(request: Request, { params }: Params) {
+  const { userId } = await params;
+  return forward(request, "PUT", userId, await request.text());
+}
+
+export async function DELETE(request: Request, { params }: Params) {
+  const { userId } = await params;
+  return forward(request, "DELETE", userId);
+}
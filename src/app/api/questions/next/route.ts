@@ -0,0 +1,16 @@
+// src/app/api/questions/next/route.ts
+import { NextResponse } from "next/server";
+import { backendFetch, relay, forwardedHeaders } from "../../../../lib/backend";
+
+export async function POST(request: Request) {
+  try {
+    const backendRes = await backendFetch("/questions/next", {
+      method: "POST",
+      headers: { "Content-Type": "application/json", ...forwardedHeaders(request) },
+      body: await request.text(),
+    });
+    return relay(backendRes);
+  } catch (err) {
+    return NextResponse.json({ error: "Failed to choose next question" }, { status: 500 });
+  }
+}
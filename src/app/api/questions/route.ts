@@ -1,11 +1,12 @@
 // src/app/api/questions/route.ts
 import { NextResponse } from "next/server";
+import { backendFetch, relay, forwardedHeaders } from "../../../lib/backend";
 
-export async function GET() {
+export async function GET(request: Request) {
   try {
-    const res = await fetch("http://localhost:8000/questions");
-    const data = await res.json();
-    return NextResponse.json(data);
+    // ?seed=<value> is passed through for a deterministic sample
+    const { search } = new URL(request.url);
+    return relay(await backendFetch(`/questions${search}`, { headers: forwardedHeaders(request) }));
   } catch (err) {
     return NextResponse.json({ error: "Failed to fetch questions" }, { status: 500 });
   }
@@ -0,0 +1,34 @@
+// src/app/api/sessions/[sessionId]/answers/[questionId]/route.ts
+import { NextResponse } from "next/server";
+import { backendFetch, relay, forwardedHeaders } from "../../../../../../lib/backend";
+
+type Params = { params: Promise<{ sessionId: string; questionId: string }> };
+
+async function forward(request: Request, method: string, sessionId: string, questionId: string, body?: string) {
+  try {
+    const backendRes = await backendFetch(
+      `/sessions/${encodeURIComponent(sessionId)}/answers/${encodeURIComponent(questionId)}`,
+      {
+        method,
+        headers: body === undefined
+          ? forwardedHeaders(request)
+          : { "Content-Type": "application/json", ...forwardedHeaders(request) },
+        body,
+      }
+    );
+    return relay(backendRes);
+  } catch (err) {
+    return NextResponse.json({ error: "Failed to update session" }, { status: 500 });
+  }
+}
+
+// Body: { "answer": 4 } or { "answer": "3b" }
+export async function PUT(request: Request, { params }: Params) {
+  const { sessionId, questionId } = await params;
+  return forward(request, "PUT", sessionId, questionId, await request.text());
+}
+
+export async function DELETE(request: Request, { params }: Params) {
+  const { sessionId, questionId } = await params;
+  return forward(request, "DELETE", sessionId, questionId);
+}
@@ -0,0 +1,26 @@
+// src/app/api/sessions/[sessionId]/route.ts
+import { NextResponse } from "next/server";
+import { backendFetch, relay, forwardedHeaders } from "../../../../lib/backend";
+
+type Params = { params: Promise<{ sessionId: string }> };
+
+async function forward(request: Request, method: string, sessionId: string) {
+  try {
+    return relay(await backendFetch(`/sessions/${encodeURIComponent(sessionId)}`, {
+      method,
+      headers: forwardedHeaders(request),
+    }));
+  } catch (err) {
+    return NextResponse.json({ error: "Failed to reach session" }, { status: 500 });
+  }
+}
+
+export async function GET(request: Request, { params }: Params) {
+  const { sessionId } = await params;
+  return forward(request, "GET", sessionId);
+}
+
+export async function DELETE(request: Request, { params }: Params) {
+  const { sessionId } = await params;
+  return forward(request, "DELETE", sessionId);
+}
@@ -0,0 +1,14 @@
+// src/app/api/sessions/route.ts
+import { NextResponse } from "next/server";
+import { backendFetch, relay, forwardedHeaders } from "../../../lib/backend";
+
+export async function POST(request: Request) {
+  try {
+    // ?adaptive=true is passed through: previews then name the next question
+    const { search } = new URL(request.url);
+    // The session keeps the tenant (X-PAD-Tenant) it is started for
+    return relay(await backendFetch(`/sessions${search}`, { method: "POST", headers: forwardedHeaders(request) }));
+  } catch (err) {
+    return NextResponse.json({ error: "Failed to start session" }, { status: 500 });
+  }
+}
@@ -0,0 +1,85 @@
+// src/lib/backend.ts
+import http from "node:http";
+import { Readable } from "node:stream";
+import type { ReadableStream as NodeReadableStream } from "node:stream/web";
+
+// Where the FastAPI backend listens. Set PAD_BACKEND_SOCKET to a Unix socket path
+// (uvicorn app:app --uds /tmp/pad.sock) to skip TCP for the proxy hop entirely.
+const BACKEND_URL = new URL(process.env.PAD_BACKEND_URL ?? "http://localhost:8000");
+const BACKEND_SOCKET = process.env.PAD_BACKEND_SOCKET;
+
+// One keep-alive pool shared by every proxy route, so requests reuse open
+// connections instead of paying a connect per call
+const agent = new http.Agent({
+  keepAlive: true,
+  maxSockets: Number(process.env.PAD_BACKEND_MAX_SOCKETS ?? 64),
+});
+
+type BackendInit = {
+  method?: string;
+  headers?: Record<string, string>;
+  // Strings and bytes are sent as-is; a stream is piped through without buffering
+  body?: string | Uint8Array | ReadableStream<Uint8Array> | null;
+};
+
+// fetch()-style request to the backend over the pooled transport
+export function backendFetch(path: string, init: BackendInit = {}): Promise<Response> {
+  return new Promise((resolve, reject) => {
+    const target = BACKEND_SOCKET
+      ? { socketPath: BACKEND_SOCKET }
+      : { host: BACKEND_URL.hostname, port: BACKEND_URL.port || 80 };
+    const req = http.request(
+      {
+        ...target,
+        agent,
+        method: init.method ?? "GET",
+        path: BACKEND_URL.pathname.replace(/\/$/, "") + path,
+        headers: init.headers,
+      },
+      (res) => {
+        const headers = new Headers();
+        for (const [name, value] of Object.entries(res.headers)) {
+          for (const item of Array.isArray(value) ? value : value === undefined ? [] : [value]) {
+            headers.append(name, item);
+          }
+        }
+        const status = res.statusCode ?? 502;
+        const body = status === 204 || status === 304 ? null : (Readable.toWeb(res) as ReadableStream<Uint8Array>);
+        resolve(new Response(body, { status, headers }));
+      }
+    );
+    req.on("error", reject);
+
+    const body = init.body;
+    if (body == null) {
+      req.end();
+    } else if (typeof body === "string" || body instanceof Uint8Array) {
+      req.end(body);
+    } else {
+      const upload = Readable.fromWeb(body as NodeReadableStream<Uint8Array>);
+      upload.on("error", (err) => req.destroy(err));
+      upload.pipe(req);
+    }
+  });
+}
+
+// Client headers the backend acts on: tenant (brand / locale), admission priority and deadline
+const FORWARDED_HEADERS = ["X-PAD-Tenant", "X-PAD-Priority", "X-PAD-Deadline-Ms"];
+
+export function forwardedHeaders(request: Request): Record<string, string> {
+  const headers: Record<string, string> = {};
+  for (const name of FORWARDED_HEADERS) {
+    const value = request.headers.get(name);
+    if (value) headers[name] = value;
+  }
+  return headers;
+}
+
+// Relay a backend response to the client without decoding and re-encoding its body
+export function relay(backendRes: Response, contentType = "application/json"): Response {
+  const headers: Record<string, string> = { "Content-Type": backendRes.headers.get("content-type") ?? contentType };
+  // Shed requests (503) say when to retry
+  const retryAfter = backendRes.headers.get("retry-after");
+  if (retryAfter) headers["Retry-After"] = retryAfter;
+  return new Response(backendRes.body, { status: backendRes.status, headers });
+}